@@ -0,0 +1,85 @@
+"""
+Import-time benchmark for the Streamlit pages and the processors, based on `python -X importtime`.
+
+Each target is imported in a fresh interpreter. A page target runs only the page's module-level
+import statements (what every Streamlit rerun of the page pays, without rendering anything); a
+processor target imports the processor module (what a job pays when it starts). The report shows
+the cumulative import time of each target (the fastest of --repeat runs) and which of the heavy
+dependencies it loaded.
+
+Importing a processor is still expensive (about 1 s, mostly openai and gspread): every job needs
+both from its first step, so they are imported with the processor instead of inside its functions.
+Only the pages are expected to stay free of heavy dependencies, and only they fail --check.
+
+Examples:
+    python benchmark_startup.py
+    python benchmark_startup.py --repeat 5 --check
+
+Exit status: 0, or 1 with --check when a page loads one of the heavy dependencies.
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_FILES = ("pages/App_interface_with_LLM.py", "pages/App_interface_with_Scraping_and_LLM.py")
+PROCESSOR_MODULES = ("core_processors.core_processor_llm_only", "core_processors.core_processor_scrap_llm")
+# Dependencies a page should never load at import; they belong to the job that needs them.
+HEAVY_MODULES = ("openai", "gspread", "httpx", "selenium.webdriver", "webdriver_manager", "transformers", "sentencepiece")
+
+
+def page_import_code(page_path: str) -> str:
+    """The module-level import statements of a page, as a program of their own."""
+    with open(os.path.join(ROOT_DIR, page_path), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=page_path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure_imports(code: str) -> Tuple[float, Set[str]]:
+    """Runs `code` under -X importtime and returns (cumulative import seconds, modules imported)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    total_microseconds = 0
+    imported_modules: Set[str] = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported_modules.add(name.strip())
+        # Top-level imports are not indented; their cumulative times add up to the total.
+        if not name[1:].startswith(" "):
+            total_microseconds += int(cumulative)
+    return total_microseconds / 1_000_000, imported_modules
+
+
+def heavy_modules_in(imported_modules: Set[str]) -> List[str]:
+    return [module for module in HEAVY_MODULES if module in imported_modules]
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the fastest is reported (default: 3).")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a page loads a heavy dependency.")
+    args = parser.parse_args(argv)
+
+    targets: Dict[str, Tuple[str, bool]] = {page_path: (page_import_code(page_path), True) for page_path in PAGE_FILES}
+    targets.update({module_name: (f"import {module_name}", False) for module_name in PROCESSOR_MODULES})
+
+    heavy_page_imports = False
+    for target_name, (code, is_page) in targets.items():
+        runs = [measure_imports(code) for _ in range(max(1, args.repeat))]
+        seconds = min(run_seconds for run_seconds, _ in runs)
+        heavy_modules = heavy_modules_in(runs[-1][1])
+        expected_note = "" if is_page else " (expected: loaded when a job starts)"
+        print(f"{target_name}: {seconds * 1000:.0f} ms, heavy dependencies: {', '.join(heavy_modules) or 'none'}{expected_note}")
+        heavy_page_imports = heavy_page_imports or (is_page and bool(heavy_modules))
+    return 1 if args.check and heavy_page_imports else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
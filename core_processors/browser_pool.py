@@ -0,0 +1,184 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+# selenium.webdriver and webdriver-manager take a few hundred ms to import; they are only
+# loaded once the pool starts its first browser.
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+DEFAULT_SELENIUM_POOL_SIZE = 2
+DEFAULT_SELENIUM_MAX_PAGES_PER_DRIVER = 50
+
+_driver_path_lock = threading.Lock()
+_resolved_driver_path: Optional[str] = None
+
+
+def resolve_chromedriver_path() -> str:
+    """
+    Resolves (and on first use downloads) ChromeDriver through webdriver-manager.
+    The result is reused for the rest of the process, so restarting or adding browsers
+    never reinstalls the driver.
+    """
+    global _resolved_driver_path
+    with _driver_path_lock:
+        if _resolved_driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _resolved_driver_path = ChromeDriverManager().install()
+        return _resolved_driver_path
+
+
+def build_chrome_options() -> "Options":
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+    return chrome_options
+
+
+class BrowserPool:
+    """
+    Pool of up to `size` long-lived headless Chrome WebDrivers that worker threads borrow and return.
+
+    Browsers are started lazily on first demand. A borrowed driver is health-checked before it
+    is handed out, and drivers are recycled (quit and replaced on next demand) after
+    `max_pages_per_driver` pages or after a WebDriver/timeout error, which keeps Chrome's memory
+    growth in check. If Chrome cannot be started at all the pool marks itself unavailable so
+    callers can skip the Selenium fallback.
+    """
+
+    def __init__(
+        self,
+        log_callback: Callable[[str], None],
+        size: int = DEFAULT_SELENIUM_POOL_SIZE,
+        max_pages_per_driver: int = DEFAULT_SELENIUM_MAX_PAGES_PER_DRIVER,
+        page_load_timeout: int = 20
+    ):
+        self.log_callback = log_callback
+        self.size = max(1, size)
+        self.max_pages_per_driver = max(1, max_pages_per_driver)
+        self.page_load_timeout = page_load_timeout
+        self.available = True
+        self._idle: "queue.LifoQueue[webdriver.Chrome]" = queue.LifoQueue()
+        self._pages_served: Dict[int, int] = {}
+        self._live_drivers = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def borrow(self) -> Iterator["webdriver.Chrome"]:
+        """
+        Borrows a driver for one page render. WebDriver and timeout errors raised inside
+        the block are re-raised after the driver has been retired from the pool.
+        """
+        driver = self._acquire()
+        healthy = True
+        try:
+            yield driver
+        except (WebDriverException, TimeoutException):
+            healthy = False
+            raise
+        finally:
+            self._release(driver, healthy)
+
+    def close(self) -> None:
+        """Quits every idle driver. Drivers still borrowed are quit when they are returned."""
+        with self._lock:
+            self._closed = True
+        closed_count = 0
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+            closed_count += 1
+        if closed_count:
+            self.log_callback(f"✅ Closed {closed_count} pooled Selenium WebDriver(s).")
+
+    def _acquire(self) -> "webdriver.Chrome":
+        while True:
+            if not self.available:
+                raise WebDriverException("Selenium browser pool is unavailable.")
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = None
+                with self._lock:
+                    may_start_new = self._live_drivers < self.size
+                    if may_start_new:
+                        self._live_drivers += 1
+                if may_start_new:
+                    return self._start_driver()
+                try:
+                    # Wake up periodically: a retired driver frees a slot without being put back.
+                    driver = self._idle.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+
+            if self._is_healthy(driver):
+                return driver
+            self.log_callback("⚠️ Pooled Selenium WebDriver failed its health check. Replacing it.")
+            self._retire(driver)
+
+    def _release(self, driver: "webdriver.Chrome", healthy: bool) -> None:
+        pages_served = self._pages_served.get(id(driver), 0) + 1
+        self._pages_served[id(driver)] = pages_served
+        with self._lock:
+            closed = self._closed
+        if closed or not healthy:
+            self._retire(driver)
+        elif pages_served >= self.max_pages_per_driver:
+            self.log_callback(f"♻️ Recycling Selenium WebDriver after {pages_served} pages.")
+            self._retire(driver)
+        else:
+            self._idle.put(driver)
+
+    def _start_driver(self) -> "webdriver.Chrome":
+        try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.service import Service as ChromeService
+
+            service = ChromeService(resolve_chromedriver_path())
+            driver = webdriver.Chrome(service=service, options=build_chrome_options())
+            driver.set_page_load_timeout(self.page_load_timeout)
+            self.log_callback("✅ Started a pooled Selenium WebDriver.")
+            return driver
+        except Exception as e:
+            with self._lock:
+                self._live_drivers -= 1
+                no_driver_running = self._live_drivers == 0
+            self.log_callback(f"❌ ERROR starting Selenium WebDriver with webdriver-manager: {e}")
+            if no_driver_running:
+                self.log_callback("Ensure you have an internet connection for the first run to download ChromeDriver, or that ChromeDriver is in your PATH. Selenium fallback is disabled for this run.")
+                self.available = False
+            raise WebDriverException(f"Could not start Selenium WebDriver: {e}") from e
+
+    def _retire(self, driver: "webdriver.Chrome") -> None:
+        self._pages_served.pop(id(driver), None)
+        self._quit(driver)
+        with self._lock:
+            self._live_drivers -= 1
+
+    @staticmethod
+    def _is_healthy(driver: "webdriver.Chrome") -> bool:
+        try:
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver: "webdriver.Chrome") -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
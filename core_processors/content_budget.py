@@ -0,0 +1,113 @@
+import functools
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from core_processors.html_text import DESCRIPTION_PREFIX, HEADING_PREFIX, TITLE_PREFIX
+
+# Page text tokens sent to the LLM per row, unless the handler's config sets "content_token_budget".
+DEFAULT_CONTENT_TOKEN_BUDGET = 2500
+# Without tiktoken, tokens are estimated at about 4 characters each.
+CHARS_PER_TOKEN = 4
+# A section is only cut to fit when at least this many tokens of budget are left for it.
+MIN_PARTIAL_SECTION_TOKENS = 40
+# Sections whose heading says what the company is or sells are kept before the rest of the page.
+INFORMATIVE_HEADING_PATTERN = re.compile(
+    r"\b(about|who we are|what we do|our (?:company|story|mission)|company|mission|products?|services?|solutions?|"
+    r"offer(?:ing)?s?|portfolio|industries|capabilities|über uns|unternehmen|produkte|leistungen|"
+    r"o nas|o firmie|produkty|usługi|oferta|rozwiązania)\b",
+    re.IGNORECASE
+)
+
+
+def tiktoken_available() -> bool:
+    """Exact token counts need the optional 'tiktoken' package (`uv sync --extra tiktoken`)."""
+    return _encoding_for_model("gpt-4o-mini") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding_for_model(model_name: str) -> Optional[Any]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    encoding = _encoding_for_model(model_name)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model_name: str) -> str:
+    encoding = _encoding_for_model(model_name)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def split_sections(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Splits extracted page text into its metadata lines (title, meta description) and sections.
+    A section is a heading line with the text up to the next heading; text before the first
+    heading is a section of its own. Whitespace is normalised within each line.
+    """
+    metadata_lines: List[str] = []
+    sections: List[List[str]] = []
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            continue
+        if line.startswith((TITLE_PREFIX, DESCRIPTION_PREFIX)) and not sections:
+            metadata_lines.append(line)
+        elif line.startswith(HEADING_PREFIX) or not sections:
+            sections.append([line])
+        else:
+            sections[-1].append(line)
+    return metadata_lines, ["\n".join(section_lines) for section_lines in sections]
+
+
+def select_page_content(text: str, token_budget: int, model_name: str) -> str:
+    """
+    Cuts extracted page text down to about `token_budget` tokens, keeping the most informative
+    parts first: the title and meta description, the opening section, then sections whose
+    heading points at what the company does (about, products, services, ...), then the
+    remaining sections in page order. The kept parts are returned in their original order.
+    """
+    metadata_lines, sections = split_sections(text)
+    normalised_text = "\n".join(metadata_lines + sections)
+    if count_tokens(normalised_text, model_name) <= token_budget:
+        return normalised_text
+
+    remaining_tokens = token_budget
+    kept_metadata: List[str] = []
+    for line in metadata_lines:
+        line = truncate_to_tokens(line, remaining_tokens, model_name)
+        kept_metadata.append(line)
+        remaining_tokens -= count_tokens(line, model_name)
+        if remaining_tokens <= 0:
+            return "\n".join(kept_metadata)
+
+    informative = [
+        index for index, section in enumerate(sections)
+        if index > 0 and section.startswith(HEADING_PREFIX) and INFORMATIVE_HEADING_PATTERN.search(section.split("\n", 1)[0])
+    ]
+    informative_set = set(informative)
+    priority_order = ([0] if sections else []) + informative + [index for index in range(1, len(sections)) if index not in informative_set]
+    kept_sections: Dict[int, str] = {}
+    for index in priority_order:
+        section_tokens = count_tokens(sections[index], model_name)
+        if section_tokens <= remaining_tokens:
+            kept_sections[index] = sections[index]
+            remaining_tokens -= section_tokens
+        elif remaining_tokens >= MIN_PARTIAL_SECTION_TOKENS:
+            kept_sections[index] = truncate_to_tokens(sections[index], remaining_tokens, model_name)
+            remaining_tokens = 0
+        if remaining_tokens < MIN_PARTIAL_SECTION_TOKENS:
+            break
+    return "\n".join(kept_metadata + [kept_sections[index] for index in sorted(kept_sections)])
@@ -0,0 +1,94 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from core_processors.html_text import TEXT_EXTRACTION_VERSION
+
+DEFAULT_SCRAPE_CACHE_PATH = os.path.join(".cache", "scrape_cache.sqlite3")
+DEFAULT_SCRAPE_CACHE_TTL_HOURS = 24 * 7
+
+
+def extraction_settings_key(backend: str, max_download_bytes: int, max_text_chars: int) -> str:
+    """Identifies the settings that shape the extracted text, so text from other settings is not reused."""
+    return f"v{TEXT_EXTRACTION_VERSION}/{backend}/{max_download_bytes}/{max_text_chars}"
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL so that trivially different spellings of the same page share a cache entry:
+    adds a missing https:// scheme, lowercases scheme and host, drops default ports,
+    fragments and a trailing slash on the path.
+    """
+    url = url.strip()
+    if not re.match(r"^[a-zA-Z]+://", url):
+        url = "https://" + url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
+
+class ScrapeCache:
+    """
+    Persistent SQLite cache of cleaned website text keyed by normalized URL and by
+    `extraction_settings` (see extraction_settings_key), so a run with another parser backend,
+    size cap or extraction version does not reuse text extracted differently.
+    Each entry records when it was fetched and how (Requests or Selenium); entries older than
+    `ttl_hours` are treated as missing. Safe to share between worker threads.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_SCRAPE_CACHE_PATH, ttl_hours: float = DEFAULT_SCRAPE_CACHE_TTL_HOURS, extraction_settings: str = ""):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_hours * 3600
+        self.extraction_settings = extraction_settings
+        self.hits = 0
+        self.misses = 0
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # Entries of the earlier url-only table (scraped_pages) are not reused: their settings are unknown.
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS extracted_pages ("
+                " url TEXT NOT NULL,"
+                " extraction_settings TEXT NOT NULL,"
+                " text_content TEXT NOT NULL,"
+                " fetch_method TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (url, extraction_settings))"
+            )
+
+    def get(self, url: str) -> Optional[Tuple[str, str, float]]:
+        """Returns (text_content, fetch_method, fetched_at) for a fresh entry, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text_content, fetch_method, fetched_at FROM extracted_pages WHERE url = ? AND extraction_settings = ?",
+                (normalize_url(url), self.extraction_settings)
+            ).fetchone()
+            if row is None or (self.ttl_seconds > 0 and time.time() - row[2] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0], row[1], row[2]
+
+    def put(self, url: str, text_content: str, fetch_method: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO extracted_pages (url, extraction_settings, text_content, fetch_method, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_url(url), self.extraction_settings, text_content, fetch_method, time.time())
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
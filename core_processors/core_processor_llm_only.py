@@ -1,14 +1,37 @@
 import os
+import asyncio
+import threading
 import time
-from typing import Dict, Type, Callable, Tuple, List, Any, Optional
+from typing import Dict, Type, Callable, Tuple, List, Any, Optional, Iterator, Set
 
 import gspread
-from openai import OpenAI, OpenAIError
+from openai import OpenAI, AsyncOpenAI, OpenAIError
 
 from prompt_handlers.base_handler import BasePromptHandler
+from core_processors.incremental import select_incremental_rows, incremental_summary_line, INCREMENTAL_MODES, INCREMENTAL_OFF, ROW_STATE_DONE
+from core_processors.job_journal import JobJournal, make_job_id, handler_error_markers, outputs_indicate_failure, DEFAULT_JOB_JOURNAL_PATH
+from core_processors.rate_limiter import (
+    RateLimiter, estimate_message_tokens, DEFAULT_EXPECTED_COMPLETION_TOKENS,
+    DEFAULT_OPENAI_REQUESTS_PER_MINUTE, DEFAULT_OPENAI_TOKENS_PER_MINUTE, DEFAULT_SHEETS_READS_PER_MINUTE, DEFAULT_SHEETS_WRITES_PER_MINUTE
+)
+from core_processors.llm_pricing import prompt_fingerprint, prompt_changed_on_disk, PROMPT_CACHE_MIN_TOKENS
+from core_processors.llm_cache import LLMResponseCache, DEFAULT_LLM_CACHE_PATH, DEFAULT_LLM_CACHE_MAX_ENTRIES
+from core_processors.openai_batch import run_chat_batch, DEFAULT_BATCH_POLL_INTERVAL_SECONDS
+from core_processors.row_packing import (
+    build_packed_user_message, chunk_items, item_id_for_row, parse_packed_response,
+    DEFAULT_ROWS_PER_REQUEST, PACKED_CACHE_KEY_PREFIX, PACKED_RESPONSE_FORMAT
+)
+from core_processors.retry_policy import RetryPolicy, CircuitOpenError, call_with_retries, async_call_with_retries, DEFAULT_MAX_RETRIES
+from core_processors.run_metrics import RunMetrics, STAGE_LLM, STAGE_PARSE, STAGE_WRITE
+from core_processors.structured_output import handler_outputs, schema_request_options
+from core_processors.sheets_utils import (
+    iter_column_chunks, read_columns, BufferedSheetWriter,
+    DEFAULT_READ_CHUNK_SIZE, DEFAULT_FLUSH_MAX_CELLS, DEFAULT_FLUSH_INTERVAL_SECONDS
+)
 
 LLM_MODEL_NAME = "gpt-4o-mini"
 LLM_REQUEST_TIMEOUT = 180 
+EXECUTION_MODES = ("serial", "async", "batch")
 
 def get_col_index(col_str: str) -> int:
     if not col_str or not col_str.isalpha():
@@ -31,9 +54,70 @@ def run_core_logic(
     first_output_column: str,
     second_output_column: str,
     third_output_column: str, 
-    log_callback: Callable[[str], None]
-):
+    log_callback: Callable[[str], None],
+    execution_mode: str = "serial",
+    max_concurrent_requests: int = 10,
+    rows_per_request: int = DEFAULT_ROWS_PER_REQUEST,
+    openai_requests_per_minute: int = DEFAULT_OPENAI_REQUESTS_PER_MINUTE,
+    openai_tokens_per_minute: int = DEFAULT_OPENAI_TOKENS_PER_MINUTE,
+    sheets_reads_per_minute: int = DEFAULT_SHEETS_READS_PER_MINUTE,
+    sheets_writes_per_minute: int = DEFAULT_SHEETS_WRITES_PER_MINUTE,
+    openai_max_retries: int = DEFAULT_MAX_RETRIES,
+    openai_base_url: Optional[str] = None,
+    batch_poll_interval_seconds: float = DEFAULT_BATCH_POLL_INTERVAL_SECONDS,
+    openai_batch_ids: Optional[List[str]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    read_chunk_size: int = DEFAULT_READ_CHUNK_SIZE,
+    sheets_flush_max_cells: int = DEFAULT_FLUSH_MAX_CELLS,
+    sheets_flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    use_llm_cache: bool = True,
+    llm_cache_path: Optional[str] = DEFAULT_LLM_CACHE_PATH,
+    llm_cache_max_entries: int = DEFAULT_LLM_CACHE_MAX_ENTRIES,
+    resume: bool = False,
+    incremental_mode: str = INCREMENTAL_OFF,
+    job_journal_path: Optional[str] = DEFAULT_JOB_JOURNAL_PATH,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Sends each input row to the LLM and writes the handler's outputs back to the sheet.
+    `execution_mode` is "serial", "async" (concurrent requests) or "batch" (one OpenAI Batch API
+    job for all rows; slower to finish but cheaper and outside the synchronous rate limits).
+    `openai_batch_ids` collects the results of batches an earlier run submitted (their IDs are
+    logged if the run loses track of them) instead of submitting the rows again.
+    With `rows_per_request` > 1 (serial and async modes) that many inputs share one request and
+    one copy of the system prompt; inputs missing from a packed reply are sent again on their own.
+    `openai_base_url` points the OpenAI clients at another server, e.g. a local stand-in.
+    If the handler's config declares a 'response_schema', single-row requests in every mode ask
+    for schema-constrained structured output and the handler gets the parsed object.
+    `progress_callback(rows_completed, rows_total)` is called on this thread after every row.
+    Setting `cancel_event` stops the run; rows that already completed are still written.
+    `incremental_mode` "new_and_failed" reads the input and output columns in one read and only
+    processes rows without outputs or with error outputs (the handler's error markers);
+    "failed_only" re-drives only the latter. Rows with a result and empty inputs are left alone.
+    Returns a run summary: rows_total, rows_completed, rows_failed, rows_already_done,
+    rows_restored, rows_up_to_date, unwritten_cells, cancelled, prompt_fingerprint, plus the per-stage timing and token summary
+    under "metrics" and the per-row records under "row_metrics".
+    """
+    run_summary: Dict[str, Any] = {
+        "rows_total": 0, "rows_completed": 0, "rows_failed": 0,
+        "rows_already_done": 0, "rows_restored": 0, "rows_up_to_date": 0, "unwritten_cells": 0, "cancelled": False
+    }
+    run_metrics = RunMetrics(model_name=LLM_MODEL_NAME)
+    # Adaptive per-backend limiters: they slow down on 429 responses and speed back up as calls succeed.
+    openai_rate_limiter = RateLimiter(openai_requests_per_minute, max_tokens_per_minute=openai_tokens_per_minute)
+    sheets_read_rate_limiter = RateLimiter(sheets_reads_per_minute)
+    sheets_write_rate_limiter = RateLimiter(sheets_writes_per_minute)
+    # Transient OpenAI failures are retried with backoff; a circuit breaker stops calling a dead API.
+    openai_retry_policy = RetryPolicy(max_retries=openai_max_retries)
     log_callback("Initializing core logic.")
+    if execution_mode not in EXECUTION_MODES:
+        log_callback(f"❌ ERROR: Unknown execution mode '{execution_mode}'. Expected one of: {EXECUTION_MODES}.")
+        raise ValueError(f"Unknown execution mode '{execution_mode}'.")
+    if incremental_mode not in INCREMENTAL_MODES:
+        log_callback(f"❌ ERROR: Unknown incremental mode '{incremental_mode}'. Expected one of: {INCREMENTAL_MODES}.")
+        raise ValueError(f"Unknown incremental mode '{incremental_mode}'.")
+    if rows_per_request > 1 and execution_mode == "batch":
+        log_callback("⚠️ WARNING: Packing several rows per request is not used in batch mode; each row is sent as its own batch request.")
 
     log_callback("Initializing clients and loading resources...")
     creds_file = os.getenv("CREDS_FILE")
@@ -59,7 +143,8 @@ def run_core_logic(
         # Pass timeout directly to the client constructor if it's a global timeout for all requests,
         # or to individual request methods if it's per-request.
         # For chat.completions.create, timeout can be passed per request.
-        openai_client = OpenAI(api_key=openai_api_key) 
+        # Retries are handled by openai_retry_policy and openai_rate_limiter so they can adapt to failures.
+        openai_client = OpenAI(api_key=openai_api_key, base_url=openai_base_url, max_retries=0)
         log_callback(f"OpenAI client initialized for model {LLM_MODEL_NAME}.")
     except Exception as e:
         log_callback(f"❌ ERROR: Could not initialize OpenAI client: {type(e).__name__} - {e}")
@@ -70,6 +155,15 @@ def run_core_logic(
         raise ValueError(f"Handler '{prompt_handler_key}' unavailable.")
     handler_class: Type[BasePromptHandler] = available_handlers[prompt_handler_key]
     log_callback(f"Using prompt handler: {handler_class.__name__}")
+    handler_config = handler_class.get_config()
+    error_markers = handler_error_markers(handler_config)
+    # Handlers that declare a JSON schema get schema-constrained output instead of free text to parse.
+    structured_request_options = schema_request_options(handler_config, handler_class.get_prompt_key())
+    structured_output = bool(structured_request_options)
+    if structured_output:
+        log_callback(f"Structured output: responses must match the '{handler_class.get_prompt_key()}' JSON schema.")
+    # Answers are cached and reused, so every request asks for the deterministic one.
+    request_options: Dict[str, Any] = {"temperature": 0, **structured_request_options}
 
     try:
         with open(prompt_full_path, 'r', encoding='utf-8') as f:
@@ -78,6 +172,21 @@ def run_core_logic(
     except Exception as e:
         log_callback(f"❌ ERROR: Could not read prompt file '{prompt_full_path}': {type(e).__name__} - {e}")
         raise
+    # The prompt is frozen for the whole job: every request starts with the identical system
+    # message, so OpenAI can serve it from its prompt cache, and edits only apply to the next job.
+    run_summary["prompt_fingerprint"] = prompt_fingerprint(prompt_system_content)
+    log_callback(f"Prompt frozen for this job (fingerprint {run_summary['prompt_fingerprint']}, about {len(prompt_system_content) // 4} tokens).")
+    if len(prompt_system_content) // 4 < PROMPT_CACHE_MIN_TOKENS:
+        log_callback(f"Note: the prompt is shorter than the {PROMPT_CACHE_MIN_TOKENS} tokens OpenAI needs before it caches a prompt prefix.")
+
+    llm_cache: Optional[LLMResponseCache] = None
+    if use_llm_cache:
+        try:
+            llm_cache = LLMResponseCache(llm_cache_path, max_entries=llm_cache_max_entries)
+            log_callback(f"LLM response cache enabled ({llm_cache_path or 'in-memory only'}, up to {llm_cache_max_entries} entries).")
+        except Exception as e:
+            log_callback(f"⚠️ WARNING: Could not open LLM response cache '{llm_cache_path}': {type(e).__name__} - {e}. Continuing without cache.")
+            llm_cache = None
 
     output_column_letters_map: List[str] = []
     if num_expected_outputs >= 1 and first_output_column: output_column_letters_map.append(first_output_column)
@@ -90,69 +199,83 @@ def run_core_logic(
 
     output_col_indices = [get_col_index(col_letter) for col_letter in actual_output_column_letters]
     company_input_col_idx = get_col_index(company_input_column)
+    company_input_column = company_input_column.upper()
 
     log_callback(f"Input column: {company_input_column} (index {company_input_col_idx}). Output columns: {actual_output_column_letters} (indexes {output_col_indices}).")
-    log_callback("--- Starting row processing ---")
 
-    for current_row_index in range(start_row, end_row + 1):
-        log_callback(f"\nProcessing row {current_row_index}...")
-        outputs_for_sheet: Tuple[str, ...] = tuple([""] * num_expected_outputs)
+    def build_user_message(domain_or_formula: str) -> str:
+        return f"Please process the following input based on your instructions: {domain_or_formula}"
 
-        try:
-            domain_or_formula = worksheet.cell(current_row_index, company_input_col_idx).value
-            if not domain_or_formula or not str(domain_or_formula).strip():
-                log_callback(f"Row {current_row_index}, Col {company_input_column}: Empty input. Skipping.")
-                time.sleep(0.1)
-                continue
-            
-            domain_or_formula = str(domain_or_formula).strip()
-            log_callback(f"Row {current_row_index}, Col {company_input_column}: Read '{domain_or_formula}'.")
-            
-            user_message_content = f"Please process the following input based on your instructions: {domain_or_formula}"
-            
-            messages_for_llm = [
-                {"role": "system", "content": prompt_system_content},
-                {"role": "user", "content": user_message_content}
-            ]
+    def build_messages(domain_or_formula: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": prompt_system_content},
+            {"role": "user", "content": build_user_message(domain_or_formula)}
+        ]
 
-            log_callback(f"Sending request for '{domain_or_formula}' to LLM (model: {LLM_MODEL_NAME})...")
-            try:
-                completion = openai_client.chat.completions.create(
-                    model=LLM_MODEL_NAME,
-                    messages=messages_for_llm,
-                    timeout=LLM_REQUEST_TIMEOUT 
-                )
-                
-                llm_response_str = ""
-                if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
-                    llm_response_str = completion.choices[0].message.content.strip()
-                else:
-                    log_callback(f"⚠️ WARNING: LLM response structure not as expected or content is empty for '{domain_or_formula}'. Response: {completion}")
-
-                if not llm_response_str:
-                     log_callback(f"⚠️ WARNING: LLM returned empty content for '{domain_or_formula}'.")
-                     llm_response_str = "" 
-
-                log_callback(f"Received LLM response. Processing with handler '{handler_class.__name__}'...")
-                outputs_for_sheet = handler_class.process_llm_response(
-                    llm_response_str, num_expected_outputs, log_callback
-                )
-
-            except OpenAIError as e: 
-                error_detail = str(e)
-                if hasattr(e, 'response') and e.response is not None and hasattr(e.response, 'text'):
-                    error_detail = f"{e} - API Response: {e.response.text}"
-                log_callback(f"❌ OpenAI API Error for '{domain_or_formula}': {type(e).__name__} - {error_detail}")
-                outputs_for_sheet = tuple([f"LLM Error: {type(e).__name__}"] * num_expected_outputs)
-            except Exception as e: 
-                log_callback(f"❌ Unexpected error during LLM call or handler processing for '{domain_or_formula}': {type(e).__name__} - {e}")
-                outputs_for_sheet = tuple([f"Processing error: {type(e).__name__}"] * num_expected_outputs)
-        
-        except Exception as e_row_setup:
-            log_callback(f"❌ Error setting up data for row {current_row_index} (input: '{domain_or_formula if 'domain_or_formula' in locals() else 'N/A'}'): {type(e_row_setup).__name__} - {e_row_setup}")
-            outputs_for_sheet = tuple([f"Row setup error: {type(e_row_setup).__name__}"] * num_expected_outputs)
+    def build_packed_messages(items: List[Tuple[int, str]]) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": prompt_system_content},
+            {"role": "user", "content": build_packed_user_message(items)}
+        ]
+
+    packed_requests = rows_per_request > 1 and execution_mode != "batch"
+
+    def cache_user_message(domain_or_formula: str, packed: bool = False) -> str:
+        user_message = build_user_message(domain_or_formula)
+        return PACKED_CACHE_KEY_PREFIX + user_message if packed else user_message
+
+    def cached_outputs(current_row_index: int, domain_or_formula: str) -> Optional[Tuple[str, ...]]:
+        if not llm_cache:
+            return None
+        # Packed runs also reuse answers cached by single-row requests; either key counts as one lookup.
+        cache_keys = [cache_user_message(domain_or_formula)]
+        if packed_requests:
+            cache_keys.append(cache_user_message(domain_or_formula, packed=True))
+        cached_response = llm_cache.get_first(LLM_MODEL_NAME, prompt_system_content, cache_keys)
+        if cached_response is None:
+            return None
+        log_callback(f"💾 Using cached LLM response for '{domain_or_formula}'. Processing with handler '{handler_class.__name__}'...")
+        with run_metrics.stage(current_row_index, STAGE_PARSE):
+            return handler_outputs(handler_class, cached_response, num_expected_outputs, log_callback, structured_output)
+
+    def outputs_from_completion(current_row_index: int, completion: Any, domain_or_formula: str, batch: bool = False) -> Tuple[str, ...]:
+        run_metrics.record_usage(current_row_index, completion, batch=batch)
+        with run_metrics.stage(current_row_index, STAGE_PARSE):
+            return parse_completion(completion, domain_or_formula)
+
+    def outputs_from_packed_response(current_row_index: int, llm_response_str: str, domain_or_formula: str) -> Tuple[str, ...]:
+        with run_metrics.stage(current_row_index, STAGE_PARSE):
+            return outputs_from_response_text(llm_response_str.strip(), domain_or_formula, packed=True)
+
+    def parse_completion(completion: Any, domain_or_formula: str) -> Tuple[str, ...]:
+        llm_response_str = ""
+        if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
+            llm_response_str = completion.choices[0].message.content.strip()
+        elif completion.choices and completion.choices[0].message and getattr(completion.choices[0].message, "refusal", None):
+            log_callback(f"⚠️ WARNING: The model refused to answer for '{domain_or_formula}': {completion.choices[0].message.refusal}")
+        else:
+            log_callback(f"⚠️ WARNING: LLM response structure not as expected or content is empty for '{domain_or_formula}'. Response: {completion}")
+        return outputs_from_response_text(llm_response_str, domain_or_formula)
+
+    def outputs_from_response_text(llm_response_str: str, domain_or_formula: str, packed: bool = False) -> Tuple[str, ...]:
+        if not llm_response_str:
+             log_callback(f"⚠️ WARNING: LLM returned empty content for '{domain_or_formula}'.")
+             llm_response_str = "" 
+
+        if llm_cache and llm_response_str:
+            llm_cache.put(LLM_MODEL_NAME, prompt_system_content, cache_user_message(domain_or_formula, packed), llm_response_str)
+
+        log_callback(f"Received LLM response. Processing with handler '{handler_class.__name__}'...")
+        return handler_outputs(handler_class, llm_response_str, num_expected_outputs, log_callback, structured_output)
 
+    def outputs_from_openai_error(e: Exception, domain_or_formula: str) -> Tuple[str, ...]:
+        error_detail = str(e)
+        if hasattr(e, 'response') and e.response is not None and hasattr(e.response, 'text'):
+            error_detail = f"{e} - API Response: {e.response.text}"
+        log_callback(f"❌ OpenAI API Error for '{domain_or_formula}': {type(e).__name__} - {error_detail}")
+        return tuple([f"LLM Error: {type(e).__name__}"] * num_expected_outputs)
 
+    def write_row_outputs(current_row_index: int, outputs_for_sheet: Tuple[str, ...]) -> None:
         if len(outputs_for_sheet) != num_expected_outputs:
              log_callback(f"⚠️ WARNING: Handler returned {len(outputs_for_sheet)} values, expected {num_expected_outputs}. Padding/truncating.")
              outputs_for_sheet = (list(outputs_for_sheet) + [""] * num_expected_outputs)[:num_expected_outputs]
@@ -165,13 +288,616 @@ def run_core_logic(
                     cells_to_update.append(gspread.Cell(row=current_row_index, col=col_idx, value=str(cell_value if cell_value is not None else "")))
             
             if cells_to_update:
-                worksheet.update_cells(cells_to_update, value_input_option='USER_ENTERED')
-                log_callback(f"Row {current_row_index}: Sheet updated with results.")
+                sheet_writer.add(cells_to_update)
+                log_callback(f"Row {current_row_index}: Results queued for the sheet ({sheet_writer.buffered_cell_count} cell(s) buffered).")
         
         except Exception as e_sheet_update: 
             log_callback(f"❌ Error updating sheet for row {current_row_index}: {type(e_sheet_update).__name__} - {e_sheet_update}")
+
+    # Rows are checkpointed so a crashed or stopped run can be resumed without redoing finished rows.
+    job_journal: Optional[JobJournal] = None
+    if job_journal_path:
+        try:
+            job_id = make_job_id(
+                gsheet_name, worksheet_name, company_input_column, actual_output_column_letters,
+                os.path.basename(prompt_full_path), prompt_handler_key, LLM_MODEL_NAME
+            )
+            job_journal = JobJournal(job_id, description=f"{gsheet_name} / {worksheet_name} / {prompt_handler_key}", db_path=job_journal_path, error_markers=error_markers)
+            previous_counts = job_journal.begin(resume)
+            if resume:
+                log_callback(f"Resuming job {job_id} (journal: {sum(previous_counts.values())} row(s) recorded so far).")
+            else:
+                log_callback(f"Job {job_id} journaled to {job_journal_path}.")
+        except Exception as e:
+            log_callback(f"⚠️ WARNING: Could not open job journal '{job_journal_path}': {type(e).__name__} - {e}. Continuing without checkpoints.")
+            job_journal = None
+    if resume and not job_journal:
+        log_callback("⚠️ WARNING: Resume requested but no job journal is available. All rows will be processed.")
+
+    completed_rows: Set[int] = set()
+    restored_outputs: Dict[int, Tuple[str, ...]] = {}
+    if resume and job_journal:
+        completed_rows, restored_outputs = job_journal.resume_plan(start_row, end_row)
+        run_summary["rows_already_done"] = len(completed_rows)
+        run_summary["rows_restored"] = len(restored_outputs)
+        log_callback(f"Resume: {len(completed_rows)} row(s) already done, {len(restored_outputs)} row(s) restored from the journal.")
+
+    def mark_row_started(current_row_index: int, domain_or_formula: Any) -> None:
+        if job_journal:
+            job_journal.row_started(current_row_index, domain_or_formula)
+
+    def record_and_write_row_outputs(current_row_index: int, outputs_for_sheet: Optional[Tuple[str, ...]]) -> None:
+        # None means the row had no input and nothing is written for it.
+        if job_journal:
+            job_journal.record_row(current_row_index, outputs_for_sheet)
+        if outputs_for_sheet is not None:
+            with run_metrics.stage(current_row_index, STAGE_WRITE):
+                write_row_outputs(current_row_index, outputs_for_sheet)
+        run_metrics.row_completed()
+        run_summary["rows_completed"] += 1
+        if outputs_for_sheet is not None and outputs_indicate_failure(outputs_for_sheet, error_markers):
+            run_summary["rows_failed"] += 1
+        if progress_callback:
+            progress_callback(run_summary["rows_completed"], run_summary["rows_total"])
+
+    def without_finished_rows(chunks: Iterator[List[Tuple[int, Any]]]) -> Iterator[List[Tuple[int, Any]]]:
+        for row_input_chunk in chunks:
+            remaining_rows = [
+                (current_row_index, domain_or_formula) for current_row_index, domain_or_formula in row_input_chunk
+                if current_row_index not in completed_rows and current_row_index not in restored_outputs
+            ]
+            if remaining_rows:
+                yield remaining_rows
+
+    if incremental_mode == INCREMENTAL_OFF:
+        run_summary["rows_total"] = max(0, end_row - start_row + 1 - len(completed_rows) - len(restored_outputs))
+        row_input_chunks = without_finished_rows(
+            iter_column_chunks(worksheet, company_input_column, start_row, end_row, chunk_size=read_chunk_size, rate_limiter=sheets_read_rate_limiter)
+        )
+    else:
+        # One read of the input and output columns decides which rows still need work.
+        sheet_rows = read_columns(
+            worksheet, [company_input_column, *actual_output_column_letters], start_row, end_row, rate_limiter=sheets_read_rate_limiter
+        ) if end_row >= start_row else []
+        incremental_rows, row_counts = select_incremental_rows(sheet_rows, incremental_mode, error_markers)
+        run_summary["rows_up_to_date"] = row_counts[ROW_STATE_DONE]
+        log_callback(f"Incremental mode '{incremental_mode}': {incremental_summary_line(row_counts, len(incremental_rows))}.")
+        run_summary["rows_total"] = sum(
+            1 for current_row_index, _ in incremental_rows
+            if current_row_index not in completed_rows and current_row_index not in restored_outputs
+        )
+        row_input_chunks = without_finished_rows(
+            incremental_rows[chunk_start:chunk_start + max(1, read_chunk_size)]
+            for chunk_start in range(0, len(incremental_rows), max(1, read_chunk_size))
+        )
+
+    def on_sheet_flush(flushed_rows: List[int]) -> None:
+        run_metrics.record_flush(flushed_rows, sheet_writer.last_flush_seconds)
+        if job_journal:
+            job_journal.mark_written(flushed_rows)
+
+    sheet_writer = BufferedSheetWriter(
+        worksheet,
+        log_callback,
+        max_buffered_cells=sheets_flush_max_cells,
+        flush_interval_seconds=sheets_flush_interval_seconds,
+        rate_limiter=sheets_write_rate_limiter,
+        on_flush=on_sheet_flush
+    )
+
+    # Buffered cells are flushed on exit, even if processing stops with an error.
+    with sheet_writer:
+        for current_row_index, outputs_for_sheet in sorted(restored_outputs.items()):
+            write_row_outputs(current_row_index, outputs_for_sheet)
+
+        if rows_per_request > 1 and execution_mode != "batch":
+            concurrent_packs = max_concurrent_requests if execution_mode == "async" else 1
+            log_callback(f"--- Starting row processing ({rows_per_request} rows per request, up to {concurrent_packs} request(s) in flight) ---")
+            asyncio.run(_run_rows_packed(
+                row_input_chunks=row_input_chunks,
+                build_messages=build_messages,
+                build_packed_messages=build_packed_messages,
+                cached_outputs=cached_outputs,
+                outputs_from_completion=outputs_from_completion,
+                outputs_from_packed_response=outputs_from_packed_response,
+                outputs_from_openai_error=outputs_from_openai_error,
+                write_row_outputs=record_and_write_row_outputs,
+                row_started=mark_row_started,
+                run_metrics=run_metrics,
+                openai_rate_limiter=openai_rate_limiter,
+                openai_retry_policy=openai_retry_policy,
+                openai_api_key=openai_api_key,
+                openai_base_url=openai_base_url,
+                request_options=request_options,
+                num_expected_outputs=num_expected_outputs,
+                rows_per_request=rows_per_request,
+                max_concurrent_requests=concurrent_packs,
+                cancel_event=cancel_event,
+                log_callback=log_callback
+            ))
+        elif execution_mode == "async":
+            log_callback(f"--- Starting row processing (async engine, up to {max_concurrent_requests} requests in flight) ---")
+            asyncio.run(_run_rows_async(
+                row_input_chunks=row_input_chunks,
+                build_messages=build_messages,
+                cached_outputs=cached_outputs,
+                outputs_from_completion=outputs_from_completion,
+                outputs_from_openai_error=outputs_from_openai_error,
+                write_row_outputs=record_and_write_row_outputs,
+                row_started=mark_row_started,
+                run_metrics=run_metrics,
+                openai_rate_limiter=openai_rate_limiter,
+                openai_retry_policy=openai_retry_policy,
+                openai_api_key=openai_api_key,
+                openai_base_url=openai_base_url,
+                request_options=request_options,
+                num_expected_outputs=num_expected_outputs,
+                max_concurrent_requests=max_concurrent_requests,
+                cancel_event=cancel_event,
+                log_callback=log_callback
+            ))
+        elif execution_mode == "batch":
+            log_callback("--- Starting row processing (OpenAI Batch API) ---")
+            _run_rows_batch(
+                row_input_chunks=row_input_chunks,
+                build_messages=build_messages,
+                cached_outputs=cached_outputs,
+                outputs_from_completion=outputs_from_completion,
+                write_row_outputs=record_and_write_row_outputs,
+                row_started=mark_row_started,
+                sheet_writer=sheet_writer,
+                openai_client=openai_client,
+                request_options=request_options,
+                openai_retry_policy=openai_retry_policy,
+                batch_ids=openai_batch_ids,
+                num_expected_outputs=num_expected_outputs,
+                poll_interval_seconds=batch_poll_interval_seconds,
+                cancel_event=cancel_event,
+                log_callback=log_callback
+            )
+        else:
+            log_callback("--- Starting row processing ---")
+
+            for row_input_chunk in row_input_chunks:
+                log_callback(f"Fetched input rows {row_input_chunk[0][0]}-{row_input_chunk[-1][0]} from column {company_input_column} in one read.")
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+
+                for current_row_index, domain_or_formula in row_input_chunk:
+                    if cancel_event is not None and cancel_event.is_set():
+                        log_callback(f"⏹️ Cancellation requested. Stopping before row {current_row_index}.")
+                        break
+
+                    log_callback(f"\nProcessing row {current_row_index}...")
+                    mark_row_started(current_row_index, domain_or_formula)
+                    outputs_for_sheet: Tuple[str, ...] = tuple([""] * num_expected_outputs)
+
+                    try:
+                        if not domain_or_formula or not str(domain_or_formula).strip():
+                            log_callback(f"Row {current_row_index}, Col {company_input_column}: Empty input. Skipping.")
+                            record_and_write_row_outputs(current_row_index, None)
+                            continue
+                
+                        domain_or_formula = str(domain_or_formula).strip()
+                        log_callback(f"Row {current_row_index}, Col {company_input_column}: Read '{domain_or_formula}'.")
+                
+                        outputs_from_cache = cached_outputs(current_row_index, domain_or_formula)
+                        if outputs_from_cache is not None:
+                            record_and_write_row_outputs(current_row_index, outputs_from_cache)
+                            continue
+
+                        messages_for_llm = build_messages(domain_or_formula)
+
+                        log_callback(f"Sending request for '{domain_or_formula}' to LLM (model: {LLM_MODEL_NAME})...")
+                        try:
+                            with run_metrics.stage(current_row_index, STAGE_LLM):
+                                completion = call_with_retries(
+                                    lambda: openai_client.chat.completions.create(
+                                        model=LLM_MODEL_NAME,
+                                        messages=messages_for_llm,
+                                        timeout=LLM_REQUEST_TIMEOUT,
+                                        **request_options
+                                    ),
+                                    openai_retry_policy,
+                                    rate_limiter=openai_rate_limiter,
+                                    tokens=estimate_message_tokens(messages_for_llm),
+                                    on_retry=lambda attempt, error: run_metrics.record_retry(current_row_index),
+                                    log_callback=log_callback
+                                )
+                            outputs_for_sheet = outputs_from_completion(current_row_index, completion, domain_or_formula)
+
+                        except (OpenAIError, CircuitOpenError) as e: 
+                            outputs_for_sheet = outputs_from_openai_error(e, domain_or_formula)
+                        except Exception as e: 
+                            log_callback(f"❌ Unexpected error during LLM call or handler processing for '{domain_or_formula}': {type(e).__name__} - {e}")
+                            outputs_for_sheet = tuple([f"Processing error: {type(e).__name__}"] * num_expected_outputs)
+            
+                    except Exception as e_row_setup:
+                        log_callback(f"❌ Error setting up data for row {current_row_index} (input: '{domain_or_formula}'): {type(e_row_setup).__name__} - {e_row_setup}")
+                        outputs_for_sheet = tuple([f"Row setup error: {type(e_row_setup).__name__}"] * num_expected_outputs)
+
+                    record_and_write_row_outputs(current_row_index, outputs_for_sheet)
+                    log_callback(f"Finished processing row {current_row_index}.")
+
+    run_summary["unwritten_cells"] = sheet_writer.unwritten_cell_count
+    run_summary["cancelled"] = cancel_event is not None and cancel_event.is_set()
+    run_summary["metrics"] = run_metrics.summary()
+    run_summary["row_metrics"] = run_metrics.rows()
+
+    for metrics_line in run_metrics.summary_lines(run_summary["metrics"]):
+        log_callback(f"Timing: {metrics_line}")
+    if prompt_changed_on_disk(prompt_full_path, run_summary["prompt_fingerprint"]):
+        log_callback(f"⚠️ WARNING: '{prompt_full_path}' was edited during the job. This job used the prompt as loaded at the start; the edits apply to the next job.")
+    log_callback(f"OpenAI rate limiter: {openai_rate_limiter.stats_line()}.")
+    log_callback(f"OpenAI retries: {openai_retry_policy.stats_line()}.")
+    if job_journal:
+        log_callback(f"Job journal: {job_journal.summary_line()}.")
+        job_journal.close()
+    if llm_cache:
+        log_callback(f"LLM response cache: {llm_cache.stats_line()}.")
+        llm_cache.close()
+
+    log_callback("\n--- All rows processed. Core logic finished. ---")
+    return run_summary
+
+
+def _run_rows_batch(
+    row_input_chunks: Iterator[List[Tuple[int, Any]]],
+    build_messages: Callable[[str], List[Dict[str, str]]],
+    cached_outputs: Callable[[int, str], Optional[Tuple[str, ...]]],
+    outputs_from_completion: Callable[..., Tuple[str, ...]],
+    write_row_outputs: Callable[[int, Optional[Tuple[str, ...]]], None],
+    row_started: Callable[[int, Any], None],
+    sheet_writer: BufferedSheetWriter,
+    openai_client: OpenAI,
+    request_options: Dict[str, Any],
+    openai_retry_policy: RetryPolicy,
+    batch_ids: Optional[List[str]],
+    num_expected_outputs: int,
+    poll_interval_seconds: float,
+    cancel_event: Optional[threading.Event],
+    log_callback: Callable[[str], None]
+) -> None:
+    """
+    Collects every row that needs the LLM into one OpenAI Batch API job and maps the results back
+    through the handler. Empty and cached rows are written straight away; rows whose request
+    failed or never finished get "LLM Error" values, so a resumed job sends them again.
+    """
+    requests_by_row: Dict[int, List[Dict[str, str]]] = {}
+    inputs_by_row: Dict[int, str] = {}
+    for row_input_chunk in row_input_chunks:
+        log_callback(f"Fetched input rows {row_input_chunk[0][0]}-{row_input_chunk[-1][0]} in one read.")
+        for current_row_index, domain_or_formula in row_input_chunk:
+            row_started(current_row_index, domain_or_formula)
+            if not domain_or_formula or not str(domain_or_formula).strip():
+                write_row_outputs(current_row_index, None)
+                continue
+            domain_or_formula = str(domain_or_formula).strip()
+            outputs_from_cache = cached_outputs(current_row_index, domain_or_formula)
+            if outputs_from_cache is not None:
+                write_row_outputs(current_row_index, outputs_from_cache)
+                continue
+            inputs_by_row[current_row_index] = domain_or_formula
+            requests_by_row[current_row_index] = build_messages(domain_or_formula)
+
+    if not requests_by_row:
+        log_callback("No rows left for the batch.")
+        return
+    if cancel_event is not None and cancel_event.is_set():
+        log_callback("⏹️ Cancellation requested. The batch was not submitted.")
+        return
+    # Rows answered from the cache reach the sheet before the (possibly long) wait for the batch.
+    sheet_writer.flush()
+
+    try:
+        batch_results = run_chat_batch(
+            openai_client, requests_by_row, LLM_MODEL_NAME, log_callback,
+            request_options=request_options,
+            poll_interval_seconds=poll_interval_seconds, cancel_event=cancel_event,
+            retry_policy=openai_retry_policy, batch_ids=batch_ids
+        )
+    except (OpenAIError, CircuitOpenError) as e:
+        log_callback(f"❌ OpenAI Batch API Error: {type(e).__name__} - {e}")
+        batch_results = {current_row_index: (None, type(e).__name__) for current_row_index in requests_by_row}
+    for current_row_index, (completion, error) in sorted(batch_results.items()):
+        domain_or_formula = inputs_by_row.get(current_row_index)
+        if domain_or_formula is None:
+            log_callback(f"⚠️ WARNING: Ignoring a batch result for row {current_row_index}, which is not part of this run.")
+            continue
+        if completion is not None:
+            try:
+                outputs_for_sheet = outputs_from_completion(current_row_index, completion, domain_or_formula, batch=True)
+            except Exception as e:
+                log_callback(f"❌ Unexpected error while processing the batch result for row {current_row_index} (input: '{domain_or_formula}'): {type(e).__name__} - {e}")
+                outputs_for_sheet = tuple([f"Processing error: {type(e).__name__}"] * num_expected_outputs)
+        else:
+            log_callback(f"❌ Batch request for row {current_row_index} ('{domain_or_formula}') failed: {error}")
+            outputs_for_sheet = tuple([f"LLM Error: {error}"] * num_expected_outputs)
+        write_row_outputs(current_row_index, outputs_for_sheet)
+
+
+async def _run_rows_packed(
+    row_input_chunks: Iterator[List[Tuple[int, Any]]],
+    build_messages: Callable[[str], List[Dict[str, str]]],
+    build_packed_messages: Callable[[List[Tuple[int, str]]], List[Dict[str, str]]],
+    cached_outputs: Callable[[int, str], Optional[Tuple[str, ...]]],
+    outputs_from_completion: Callable[[int, Any, str], Tuple[str, ...]],
+    outputs_from_packed_response: Callable[[int, str, str], Tuple[str, ...]],
+    outputs_from_openai_error: Callable[[Exception, str], Tuple[str, ...]],
+    write_row_outputs: Callable[[int, Optional[Tuple[str, ...]]], None],
+    row_started: Callable[[int, Any], None],
+    run_metrics: RunMetrics,
+    openai_rate_limiter: RateLimiter,
+    openai_retry_policy: RetryPolicy,
+    openai_api_key: str,
+    openai_base_url: Optional[str],
+    request_options: Dict[str, Any],
+    num_expected_outputs: int,
+    rows_per_request: int,
+    max_concurrent_requests: int,
+    cancel_event: Optional[threading.Event],
+    log_callback: Callable[[str], None]
+) -> None:
+    """
+    Sends up to `rows_per_request` inputs per OpenAI request and splits the JSON reply back into
+    rows by item ID, so the system prompt is paid for once per pack instead of once per row.
+    Each item's response goes through the handler exactly like a single-row reply. Items missing
+    from the reply are sent again as single requests; a pack that fails after its retries marks
+    all of its rows with the error. Each input chunk is processed before the next one is read,
+    with at most `max_concurrent_requests` packs in flight.
+    """
+    async_openai_client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url, max_retries=0)
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_requests))
+
+    async def request_completion(row_indexes: List[int], messages: List[Dict[str, str]], **request_options: Any) -> Any:
+        def record_retry(attempt: int, error: BaseException) -> None:
+            for current_row_index in row_indexes:
+                run_metrics.record_retry(current_row_index)
+
+        request_started_at = time.perf_counter()
+        try:
+            return await async_call_with_retries(
+                lambda: asyncio.wait_for(
+                    async_openai_client.chat.completions.create(model=LLM_MODEL_NAME, messages=messages, **request_options),
+                    timeout=LLM_REQUEST_TIMEOUT
+                ),
+                openai_retry_policy,
+                rate_limiter=openai_rate_limiter,
+                tokens=estimate_message_tokens(messages, expected_completion_tokens=DEFAULT_EXPECTED_COMPLETION_TOKENS * len(row_indexes)),
+                on_retry=record_retry,
+                log_callback=log_callback
+            )
         finally:
-            log_callback(f"Finished processing row {current_row_index}. Waiting 1 sec...")
-            time.sleep(1) 
+            run_metrics.record_shared(row_indexes, STAGE_LLM, time.perf_counter() - request_started_at)
+
+    async def process_single_row(current_row_index: int, domain_or_formula: str) -> Tuple[str, ...]:
+        try:
+            completion = await request_completion([current_row_index], build_messages(domain_or_formula), **request_options)
+            return outputs_from_completion(current_row_index, completion, domain_or_formula)
+        except asyncio.TimeoutError:
+            log_callback(f"❌ OpenAI request for '{domain_or_formula}' timed out after {LLM_REQUEST_TIMEOUT} s.")
+            return tuple(["LLM Error: Timeout"] * num_expected_outputs)
+        except (OpenAIError, CircuitOpenError) as e:
+            return outputs_from_openai_error(e, domain_or_formula)
+
+    async def process_pack(pack: List[Tuple[int, str]]) -> List[Tuple[int, Tuple[str, ...]]]:
+        async with semaphore:
+            if cancel_event is not None and cancel_event.is_set():
+                raise asyncio.CancelledError()
+            row_indexes = [current_row_index for current_row_index, _ in pack]
+            log_callback(f"Rows {row_indexes[0]}-{row_indexes[-1]}: Sending {len(pack)} input(s) to LLM in one request (model: {LLM_MODEL_NAME})...")
+            try:
+                completion = await request_completion(row_indexes, build_packed_messages(pack), **{**request_options, "response_format": PACKED_RESPONSE_FORMAT})
+            except asyncio.TimeoutError:
+                log_callback(f"❌ Packed OpenAI request for rows {row_indexes[0]}-{row_indexes[-1]} timed out after {LLM_REQUEST_TIMEOUT} s.")
+                return [(current_row_index, tuple(["LLM Error: Timeout"] * num_expected_outputs)) for current_row_index in row_indexes]
+            except (OpenAIError, CircuitOpenError) as e:
+                outputs_for_sheet = outputs_from_openai_error(e, f"rows {row_indexes[0]}-{row_indexes[-1]}")
+                return [(current_row_index, outputs_for_sheet) for current_row_index in row_indexes]
+
+            for current_row_index in row_indexes:
+                run_metrics.record_usage(current_row_index, completion, share=1.0 / len(row_indexes))
+            response_text = ""
+            if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
+                response_text = completion.choices[0].message.content
+            item_responses = parse_packed_response(response_text, [item_id_for_row(current_row_index) for current_row_index in row_indexes])
+
+            results: List[Tuple[int, Tuple[str, ...]]] = []
+            missing_items: List[Tuple[int, str]] = []
+            for current_row_index, domain_or_formula in pack:
+                item_response = item_responses.get(item_id_for_row(current_row_index))
+                if item_response is None:
+                    missing_items.append((current_row_index, domain_or_formula))
+                    continue
+                try:
+                    results.append((current_row_index, outputs_from_packed_response(current_row_index, item_response, domain_or_formula)))
+                except Exception as e:
+                    log_callback(f"❌ Unexpected error while processing row {current_row_index} (input: '{domain_or_formula}'): {type(e).__name__} - {e}")
+                    results.append((current_row_index, tuple([f"Processing error: {type(e).__name__}"] * num_expected_outputs)))
+            if missing_items:
+                log_callback(f"⚠️ WARNING: {len(missing_items)} of {len(pack)} input(s) missing from the packed response. Sending them as single requests.")
+            for current_row_index, domain_or_formula in missing_items:
+                results.append((current_row_index, await process_single_row(current_row_index, domain_or_formula)))
+            return results
+
+    pending_tasks: Set[asyncio.Task] = set()
+    try:
+        for row_input_chunk in row_input_chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                log_callback("⏹️ Cancellation requested. Stopping before the next input chunk.")
+                break
+            log_callback(f"Fetched input rows {row_input_chunk[0][0]}-{row_input_chunk[-1][0]} in one read.")
+
+            items_to_send: List[Tuple[int, str]] = []
+            for current_row_index, domain_or_formula in row_input_chunk:
+                row_started(current_row_index, domain_or_formula)
+                if not domain_or_formula or not str(domain_or_formula).strip():
+                    log_callback(f"Row {current_row_index}: Empty input. Skipping.")
+                    write_row_outputs(current_row_index, None)
+                    continue
+                domain_or_formula = str(domain_or_formula).strip()
+                outputs_from_cache = cached_outputs(current_row_index, domain_or_formula)
+                if outputs_from_cache is not None:
+                    write_row_outputs(current_row_index, outputs_from_cache)
+                    continue
+                items_to_send.append((current_row_index, domain_or_formula))
+
+            pending_tasks = {asyncio.create_task(process_pack(pack)) for pack in chunk_items(items_to_send, rows_per_request)}
+            while pending_tasks:
+                done_tasks, pending_tasks = await asyncio.wait(pending_tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done_tasks:
+                    if task.cancelled():
+                        continue
+                    for current_row_index, outputs_for_sheet in task.result():
+                        write_row_outputs(current_row_index, outputs_for_sheet)
+    finally:
+        for task in pending_tasks:
+            task.cancel()
+        await asyncio.gather(*pending_tasks, return_exceptions=True)
+        await async_openai_client.close()
+
+
+async def _run_rows_async(
+    row_input_chunks: Iterator[List[Tuple[int, Any]]],
+    build_messages: Callable[[str], List[Dict[str, str]]],
+    cached_outputs: Callable[[int, str], Optional[Tuple[str, ...]]],
+    outputs_from_completion: Callable[[int, Any, str], Tuple[str, ...]],
+    outputs_from_openai_error: Callable[[Exception, str], Tuple[str, ...]],
+    write_row_outputs: Callable[[int, Optional[Tuple[str, ...]]], None],
+    row_started: Callable[[int, Any], None],
+    run_metrics: RunMetrics,
+    openai_rate_limiter: RateLimiter,
+    openai_retry_policy: RetryPolicy,
+    openai_api_key: str,
+    openai_base_url: Optional[str],
+    request_options: Dict[str, Any],
+    num_expected_outputs: int,
+    max_concurrent_requests: int,
+    cancel_event: Optional[threading.Event],
+    log_callback: Callable[[str], None]
+) -> None:
+    """
+    Processes rows concurrently with the async OpenAI client. At most `max_concurrent_requests`
+    rows are in flight at once, requests are paced by `openai_rate_limiter`, transient failures are
+    retried under `openai_retry_policy` and every attempt is bounded by LLM_REQUEST_TIMEOUT.
+    Input chunks are read in a background thread while earlier rows are still being processed,
+    and the next chunk is only fetched once the backlog of scheduled rows runs low.
+    Results are written to the sheet as soon as each row completes, so cancelling the run
+    (cancel_event, KeyboardInterrupt or task cancellation) never loses rows that already finished.
+    """
+    async_openai_client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url, max_retries=0)
+    max_concurrent_requests = max(1, max_concurrent_requests)
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+    written_rows: Set[int] = set()
+
+    async def process_row_async(current_row_index: int, domain_or_formula: Any) -> Tuple[int, Optional[Tuple[str, ...]]]:
+        row_started(current_row_index, domain_or_formula)
+        try:
+            return current_row_index, await answer_row(current_row_index, domain_or_formula)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_callback(f"❌ Unexpected error while processing row {current_row_index} (input: '{domain_or_formula}'): {type(e).__name__} - {e}")
+            return current_row_index, tuple([f"Processing error: {type(e).__name__}"] * num_expected_outputs)
+
+    async def answer_row(current_row_index: int, domain_or_formula: Any) -> Optional[Tuple[str, ...]]:
+        if domain_or_formula and str(domain_or_formula).strip():
+            # Cached rows are answered without taking an in-flight request slot.
+            outputs_from_cache = cached_outputs(current_row_index, str(domain_or_formula).strip())
+            if outputs_from_cache is not None:
+                return outputs_from_cache
+
+        async with semaphore:
+            if cancel_event is not None and cancel_event.is_set():
+                raise asyncio.CancelledError()
+            if not domain_or_formula or not str(domain_or_formula).strip():
+                log_callback(f"Row {current_row_index}: Empty input. Skipping.")
+                return None
+
+            domain_or_formula = str(domain_or_formula).strip()
+            log_callback(f"Row {current_row_index}: Sending '{domain_or_formula}' to LLM (model: {LLM_MODEL_NAME})...")
+            try:
+                messages_for_llm = build_messages(domain_or_formula)
+                with run_metrics.stage(current_row_index, STAGE_LLM):
+                    completion = await async_call_with_retries(
+                        lambda: asyncio.wait_for(
+                            async_openai_client.chat.completions.create(
+                                model=LLM_MODEL_NAME,
+                                messages=messages_for_llm,
+                                **request_options
+                            ),
+                            timeout=LLM_REQUEST_TIMEOUT
+                        ),
+                        openai_retry_policy,
+                        rate_limiter=openai_rate_limiter,
+                        tokens=estimate_message_tokens(messages_for_llm),
+                        on_retry=lambda attempt, error: run_metrics.record_retry(current_row_index),
+                        log_callback=log_callback
+                    )
+                return outputs_from_completion(current_row_index, completion, domain_or_formula)
+            except asyncio.TimeoutError:
+                log_callback(f"❌ OpenAI request for '{domain_or_formula}' timed out after {LLM_REQUEST_TIMEOUT} s.")
+                return tuple(["LLM Error: Timeout"] * num_expected_outputs)
+            except (OpenAIError, CircuitOpenError) as e:
+                return outputs_from_openai_error(e, domain_or_formula)
+
+    def write_completed(current_row_index: int, outputs_for_sheet: Optional[Tuple[str, ...]]) -> None:
+        if current_row_index in written_rows:
+            return
+        written_rows.add(current_row_index)
+        write_row_outputs(current_row_index, outputs_for_sheet)
+
+    def fetch_next_chunk() -> "asyncio.Task":
+        return asyncio.create_task(asyncio.to_thread(next, row_input_chunks, None))
+
+    all_tasks: List[asyncio.Task] = []
+    pending_tasks: Set[asyncio.Task] = set()
+    next_chunk_task: Optional[asyncio.Task] = fetch_next_chunk()
+    input_exhausted = False
+    try:
+        while pending_tasks or next_chunk_task is not None:
+            if cancel_event is not None and cancel_event.is_set():
+                log_callback("⏹️ Cancellation requested. Stopping the async engine.")
+                break
+
+            waiting_on = set(pending_tasks)
+            if next_chunk_task is not None:
+                waiting_on.add(next_chunk_task)
+            done_tasks, _ = await asyncio.wait(waiting_on, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done_tasks:
+                if task is next_chunk_task:
+                    next_chunk_task = None
+                    row_input_chunk = task.result()
+                    if row_input_chunk is None:
+                        input_exhausted = True
+                        continue
+                    log_callback(f"Fetched input rows {row_input_chunk[0][0]}-{row_input_chunk[-1][0]} in one read.")
+                    for current_row_index, domain_or_formula in row_input_chunk:
+                        row_task = asyncio.create_task(process_row_async(current_row_index, domain_or_formula))
+                        all_tasks.append(row_task)
+                        pending_tasks.add(row_task)
+                else:
+                    pending_tasks.discard(task)
+                    if not task.cancelled():
+                        write_completed(*task.result())
 
-    log_callback("\n--- All rows processed. Core logic finished. ---")
\ No newline at end of file
+            # Read the next chunk once the scheduled backlog drains to one round of requests,
+            # so workers never wait on the sheet and the whole range is never held at once.
+            if next_chunk_task is None and not input_exhausted and len(pending_tasks) <= max_concurrent_requests:
+                next_chunk_task = fetch_next_chunk()
+    finally:
+        unfinished = [task for task in all_tasks if not task.done()]
+        if next_chunk_task is not None:
+            unfinished.append(next_chunk_task)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        # Rows that finished while we were stopping still get written.
+        for task in all_tasks:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                write_completed(*task.result())
+        cancelled_count = sum(1 for task in all_tasks if task.cancelled())
+        if cancelled_count:
+            log_callback(f"⏹️ {cancelled_count} row(s) were cancelled before completion; {len(written_rows)} completed row(s) were kept.")
+        await async_openai_client.close()
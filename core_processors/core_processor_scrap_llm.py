@@ -1,19 +1,37 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import gspread
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException, ElementNotInteractableException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from openai import OpenAI
+import httpx
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from openai import OpenAI, OpenAIError
 import json
 import re
 from dotenv import load_dotenv
-from typing import Callable, Type, Dict, Tuple, List, Any, Optional
+from typing import Callable, Type, Dict, Tuple, List, Any, Optional, Iterable, Iterator
 from prompt_handlers.base_handler import BasePromptHandler
+from core_processors.log_utils import ThreadSafeLogCallback
+from core_processors.page_readiness import wait_for_page_ready, ReadinessStats, DEFAULT_MAX_WAIT_SECONDS, DEFAULT_MIN_TEXT_LENGTH
+from core_processors.rate_limiter import (
+    RateLimiter, estimate_message_tokens,
+    DEFAULT_OPENAI_REQUESTS_PER_MINUTE, DEFAULT_OPENAI_TOKENS_PER_MINUTE, DEFAULT_SHEETS_READS_PER_MINUTE, DEFAULT_SHEETS_WRITES_PER_MINUTE
+)
+from core_processors.browser_pool import BrowserPool, DEFAULT_SELENIUM_POOL_SIZE, DEFAULT_SELENIUM_MAX_PAGES_PER_DRIVER
+from core_processors.html_text import extract_text_from_byte_stream, extract_visible_text, lxml_available, DEFAULT_MAX_DOWNLOAD_BYTES, DEFAULT_MAX_TEXT_CHARS
+from core_processors.content_budget import select_page_content, tiktoken_available, DEFAULT_CONTENT_TOKEN_BUDGET
+from core_processors.http_client import build_http_client, DEFAULT_HTTP_POOL_SIZE
+from core_processors.domain_dedup import canonical_domain, group_rows_by_domain
+from core_processors.content_cache import ScrapeCache, extraction_settings_key, DEFAULT_SCRAPE_CACHE_PATH, DEFAULT_SCRAPE_CACHE_TTL_HOURS
+from core_processors.incremental import select_incremental_rows, incremental_summary_line, INCREMENTAL_MODES, INCREMENTAL_OFF, ROW_STATE_DONE
+from core_processors.job_journal import JobJournal, make_job_id, handler_error_markers, outputs_indicate_failure, DEFAULT_JOB_JOURNAL_PATH
+from core_processors.openai_batch import run_chat_batch, DEFAULT_BATCH_POLL_INTERVAL_SECONDS
+from core_processors.llm_pricing import prompt_fingerprint, prompt_changed_on_disk, PROMPT_CACHE_MIN_TOKENS
+from core_processors.llm_cache import LLMResponseCache, DEFAULT_LLM_CACHE_PATH, DEFAULT_LLM_CACHE_MAX_ENTRIES
+from core_processors.retry_policy import RetryPolicy, CircuitOpenError, call_with_retries, DEFAULT_MAX_RETRIES
+from core_processors.run_metrics import RunMetrics, STAGE_FETCH, STAGE_RENDER, STAGE_CLEAN, STAGE_LLM, STAGE_PARSE, STAGE_WRITE
+from core_processors.structured_output import handler_outputs, schema_request_options
+from core_processors.sheets_utils import BufferedSheetWriter, read_columns, read_range, DEFAULT_FLUSH_MAX_CELLS, DEFAULT_FLUSH_INTERVAL_SECONDS
 
 load_dotenv()
 
@@ -41,9 +59,82 @@ def run_core_logic(
     log_callback: Callable[[str], None],
     openai_model_name: str = "gpt-4o-mini",
     requests_timeout: int = 10,
+    http_pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+    use_http2: bool = False,
+    max_download_bytes: int = DEFAULT_MAX_DOWNLOAD_BYTES,
+    max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+    content_token_budget: Optional[int] = None,
+    html_parser_backend: str = "html.parser",
     selenium_page_load_timeout: int = 20,
-    selenium_sleep_after_load: int = 3
-):
+    selenium_max_wait_after_load: float = DEFAULT_MAX_WAIT_SECONDS,
+    selenium_min_text_length: int = DEFAULT_MIN_TEXT_LENGTH,
+    selenium_pool_size: int = DEFAULT_SELENIUM_POOL_SIZE,
+    selenium_max_pages_per_driver: int = DEFAULT_SELENIUM_MAX_PAGES_PER_DRIVER,
+    max_workers: int = 1,
+    dedupe_domains: bool = True,
+    openai_requests_per_minute: int = DEFAULT_OPENAI_REQUESTS_PER_MINUTE,
+    openai_tokens_per_minute: int = DEFAULT_OPENAI_TOKENS_PER_MINUTE,
+    sheets_reads_per_minute: int = DEFAULT_SHEETS_READS_PER_MINUTE,
+    sheets_writes_per_minute: int = DEFAULT_SHEETS_WRITES_PER_MINUTE,
+    openai_max_retries: int = DEFAULT_MAX_RETRIES,
+    use_openai_batch: bool = False,
+    batch_poll_interval_seconds: float = DEFAULT_BATCH_POLL_INTERVAL_SECONDS,
+    openai_batch_ids: Optional[List[str]] = None,
+    openai_base_url: Optional[str] = None,
+    sheets_flush_max_cells: int = DEFAULT_FLUSH_MAX_CELLS,
+    sheets_flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    scrape_cache_path: Optional[str] = DEFAULT_SCRAPE_CACHE_PATH,
+    scrape_cache_ttl_hours: float = DEFAULT_SCRAPE_CACHE_TTL_HOURS,
+    use_llm_cache: bool = True,
+    llm_cache_path: Optional[str] = DEFAULT_LLM_CACHE_PATH,
+    llm_cache_max_entries: int = DEFAULT_LLM_CACHE_MAX_ENTRIES,
+    resume: bool = False,
+    incremental_mode: str = INCREMENTAL_OFF,
+    job_journal_path: Optional[str] = DEFAULT_JOB_JOURNAL_PATH,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Scrapes and classifies the configured rows and writes the handler's outputs back to the sheet.
+    `progress_callback(rows_completed, rows_total)` is called on this thread after every row.
+    Setting `cancel_event` stops the run after the rows in flight; their results are still written,
+    except for rows whose page download it interrupts, which are left for the next run.
+    Each page's text is cut down to `content_token_budget` tokens (default: the handler's
+    "content_token_budget", else DEFAULT_CONTENT_TOKEN_BUDGET), keeping the title, meta
+    description and the most informative sections; 0 sends the first `max_text_chars` characters.
+    With `use_openai_batch` the pages are scraped first and all classifications are sent as one
+    OpenAI Batch API job (cheaper and outside the synchronous rate limits, but results can take
+    up to 24 h); `openai_batch_ids` collects the results of batches an earlier run submitted (their
+    IDs are logged if the run loses track of them) instead of submitting the rows again. `openai_base_url` points the OpenAI client at another server, e.g. a local stand-in.
+    If the handler's config declares a 'response_schema', OpenAI is asked for schema-constrained
+    structured output and the handler gets the parsed object instead of free text.
+    With `dedupe_domains` rows whose inputs name the same domain (www. or not, http or https,
+    any path) are scraped and classified once, and the result is written to each of them.
+    `incremental_mode` "new_and_failed" reads the input and output columns in one read and only
+    processes rows without outputs or with error outputs (the handler's error markers);
+    "failed_only" re-drives only the latter. Rows with a result and empty inputs are left alone.
+    Returns a run summary: rows_total, rows_completed, rows_failed, rows_already_done,
+    rows_restored, rows_up_to_date, rows_deduplicated, fetches_saved, llm_calls_saved, unwritten_cells,
+    cancelled, prompt_fingerprint, plus the per-stage timing and token summary
+    under "metrics" and the per-row records under "row_metrics".
+    """
+    run_summary: Dict[str, Any] = {
+        "rows_total": 0, "rows_completed": 0, "rows_failed": 0,
+        "rows_already_done": 0, "rows_restored": 0, "rows_up_to_date": 0, "rows_deduplicated": 0, "fetches_saved": 0, "llm_calls_saved": 0,
+        "unwritten_cells": 0, "cancelled": False
+    }
+    # Worker threads must not call the UI callback directly; their messages are queued
+    # and delivered from the main thread.
+    log_callback = ThreadSafeLogCallback(log_callback)
+    max_workers = max(1, int(max_workers))
+    # Adaptive per-backend limiters: they slow down on 429 responses and speed back up as calls succeed.
+    openai_rate_limiter = RateLimiter(openai_requests_per_minute, max_tokens_per_minute=openai_tokens_per_minute)
+    sheets_read_rate_limiter = RateLimiter(sheets_reads_per_minute)
+    sheets_write_rate_limiter = RateLimiter(sheets_writes_per_minute)
+    # Transient OpenAI failures are retried with backoff; a circuit breaker stops calling a dead API.
+    openai_retry_policy = RetryPolicy(max_retries=openai_max_retries)
+    run_metrics = RunMetrics(model_name=openai_model_name)
+
     log_callback(f"🚀 Starting core logic with prompt file: {os.path.basename(prompt_full_path)}, handler key: '{prompt_handler_key}', expecting {num_expected_outputs} output(s).")
     #log_callback(f"DEBUG core_processor: Otrzymano 'available_handlers' z kluczami: {list(available_handlers.keys())}")
 
@@ -67,6 +158,21 @@ def run_core_logic(
         error_msg = f"❌ ERROR: Could not get config from handler '{prompt_handler_key}': {e_cfg}. Aborting."
         log_callback(error_msg)
         raise ValueError(error_msg)
+    if incremental_mode not in INCREMENTAL_MODES:
+        error_msg = f"❌ ERROR: Unknown incremental mode '{incremental_mode}'. Expected one of: {INCREMENTAL_MODES}. Aborting."
+        log_callback(error_msg)
+        raise ValueError(error_msg)
+    error_markers = handler_error_markers(handler_config)
+    if content_token_budget is None:
+        content_token_budget = int(handler_config.get("content_token_budget", DEFAULT_CONTENT_TOKEN_BUDGET))
+    if content_token_budget > 0:
+        token_counter = "tiktoken" if tiktoken_available() else "about 4 characters per token, tiktoken not installed"
+        log_callback(f"✂️ Page text budget: {content_token_budget} tokens per row ({token_counter}).")
+    # Handlers that declare a JSON schema get schema-constrained output instead of free text to parse.
+    structured_request_options = schema_request_options(handler_config, handler_class.get_prompt_key())
+    structured_output = bool(structured_request_options)
+    if structured_output:
+        log_callback(f"🧩 Structured output: responses must match the '{handler_class.get_prompt_key()}' JSON schema.")
 
     # --- Loading Prompt System ---
     system_message_content = ""
@@ -86,6 +192,12 @@ def run_core_logic(
         error_msg = f"❌ ERROR loading system prompt file '{prompt_full_path}': {e}. Aborting."
         log_callback(error_msg)
         raise IOError(error_msg) from e
+    # The prompt is frozen for the whole job: every request starts with the identical system
+    # message, so OpenAI can serve it from its prompt cache, and edits only apply to the next job.
+    run_summary["prompt_fingerprint"] = prompt_fingerprint(system_message_content)
+    log_callback(f"🧊 Prompt frozen for this job (fingerprint {run_summary['prompt_fingerprint']}, about {len(system_message_content) // 4} tokens).")
+    if len(system_message_content) // 4 < PROMPT_CACHE_MIN_TOKENS:
+        log_callback(f"ℹ️ The prompt is shorter than the {PROMPT_CACHE_MIN_TOKENS} tokens OpenAI needs before it caches a prompt prefix.")
 
     # --- OpenAI Client Initialization ---
     openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -94,37 +206,126 @@ def run_core_logic(
         log_callback(error_msg)
         raise ValueError(error_msg)
     try:
-        openai_client = OpenAI(api_key=openai_api_key)
+        # Retries are handled by openai_retry_policy and openai_rate_limiter so they can adapt to failures.
+        openai_client = OpenAI(api_key=openai_api_key, base_url=openai_base_url, max_retries=0)
         log_callback("🤖 OpenAI client initialized successfully.")
     except Exception as e:
         error_msg = f"❌ ERROR initializing OpenAI client: {e}. Aborting."
         log_callback(error_msg)
         raise RuntimeError(error_msg) from e
 
+    # --- LLM Response Cache ---
+    llm_cache: Optional[LLMResponseCache] = None
+    if use_llm_cache:
+        try:
+            llm_cache = LLMResponseCache(llm_cache_path, max_entries=llm_cache_max_entries)
+            log_callback(f"💾 LLM response cache enabled ({llm_cache_path or 'in-memory only'}, up to {llm_cache_max_entries} entries).")
+        except Exception as e_cache:
+            log_callback(f"⚠️ Could not open LLM response cache '{llm_cache_path}': {e_cache}. Continuing without cache.")
+            llm_cache = None
+
     # --- OpenAI Classification Feature ---
-    def classify_with_openai_local(text_to_classify: str) -> str:
+    def build_classification_messages(text_to_classify: str) -> List[Dict[str, str]]:
         if not text_to_classify or not text_to_classify.strip():
             log_callback("⚠️ Warning: No text provided to classify_with_openai_local. LLM will receive empty input.")
             text_to_classify = "No content available for this website."
 
         user_message_content = f"Please analyze the following website content (or lack thereof) and provide a response based on the instructions you received. Website content: \n{text_to_classify}"
-        messages = [
+        return [
             {"role": "system", "content": system_message_content},
             {"role": "user", "content": user_message_content}
         ]
-        try:
-            log_callback(f"💬 Sending request to OpenAI model: {openai_model_name}...")
-            completion = openai_client.chat.completions.create(
-                model=openai_model_name,
-                temperature=0, 
-                messages=messages
-            )
+
+    def cached_classification(messages: List[Dict[str, str]]) -> Optional[str]:
+        if not llm_cache:
+            return None
+        cached_response = llm_cache.get(openai_model_name, system_message_content, messages[-1]["content"])
+        if cached_response is not None:
+            log_callback(f"💾 Using cached OpenAI response (length: {len(cached_response)} chars).")
+        return cached_response
+
+    def response_text_from_completion(current_row_index: int, completion: Any, messages: List[Dict[str, str]], batch: bool = False) -> str:
+        run_metrics.record_usage(current_row_index, completion, batch=batch)
+        response_text = ""
+        if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
             response_text = completion.choices[0].message.content.strip()
-            log_callback(f"✅ OpenAI response received (length: {len(response_text)} chars).")
-            return response_text
+        elif completion.choices and completion.choices[0].message and getattr(completion.choices[0].message, "refusal", None):
+            log_callback(f"⚠️ Row {current_row_index}: the model refused to answer: {completion.choices[0].message.refusal}")
+        log_callback(f"✅ OpenAI response received (length: {len(response_text)} chars).")
+        if llm_cache and response_text:
+            llm_cache.put(openai_model_name, system_message_content, messages[-1]["content"], response_text)
+        return response_text
+
+    def classify_with_openai_local(current_row_index: int, text_to_classify: str) -> str:
+        messages = build_classification_messages(text_to_classify)
+        cached_response = cached_classification(messages)
+        if cached_response is not None:
+            return cached_response
+        # Errors that persist after the retries are raised, so the row gets an "LLM Error" value.
+        log_callback(f"💬 Sending request to OpenAI model: {openai_model_name}...")
+        try:
+            with run_metrics.stage(current_row_index, STAGE_LLM):
+                completion = call_with_retries(
+                    lambda: openai_client.chat.completions.create(
+                        model=openai_model_name,
+                        temperature=0, 
+                        messages=messages,
+                        **structured_request_options
+                    ),
+                    openai_retry_policy,
+                    rate_limiter=openai_rate_limiter,
+                    tokens=estimate_message_tokens(messages),
+                    on_retry=lambda attempt, error: run_metrics.record_retry(current_row_index),
+                    log_callback=log_callback
+                )
         except Exception as e:
-            log_callback(f"❌ Error during OpenAI API call: {e}")
-            return "" 
+            log_callback(f"❌ Error during OpenAI API call: {type(e).__name__} - {e}")
+            raise
+        return response_text_from_completion(current_row_index, completion, messages)
+
+    # --- OpenAI Batch API ---
+    # In batch mode the workers only scrape; each row's request waits here until every page is done.
+    batch_requests: Dict[int, List[Dict[str, str]]] = {}
+    batch_requests_lock = threading.Lock()
+
+    def queue_for_batch(current_row_index: int, messages: List[Dict[str, str]]) -> None:
+        with batch_requests_lock:
+            batch_requests[current_row_index] = messages
+        log_callback(f"📦 Row {current_row_index}: classification queued for the OpenAI batch.")
+
+    def classify_rows_with_batch() -> None:
+        log_callback(f"📦 Sending {len(batch_requests)} classification(s) to the OpenAI Batch API...")
+        # Rows that did not need the LLM reach the sheet before the (possibly long) wait for the batch.
+        sheet_writer.flush()
+        try:
+            batch_results = run_chat_batch(
+                openai_client, batch_requests, openai_model_name, log_callback,
+                request_options={"temperature": 0, **structured_request_options},
+                poll_interval_seconds=batch_poll_interval_seconds,
+                cancel_event=cancel_event,
+                retry_policy=openai_retry_policy,
+                batch_ids=openai_batch_ids
+            )
+        except (OpenAIError, CircuitOpenError) as e_batch:
+            log_callback(f"❌ Error during OpenAI Batch API call: {type(e_batch).__name__} - {e_batch}")
+            batch_results = {current_row_index: (None, type(e_batch).__name__) for current_row_index in batch_requests}
+        for current_row_index, (completion, error) in sorted(batch_results.items()):
+            if current_row_index not in batch_requests:
+                log_callback(f"⚠️ Ignoring a batch result for row {current_row_index}, which is not part of this run.")
+                continue
+            if completion is None:
+                log_callback(f"❌ Batch request for row {current_row_index} failed: {error}")
+                current_outputs = tuple([f"LLM Error: {error}"] * num_expected_outputs)
+            else:
+                try:
+                    classification_result_str = response_text_from_completion(current_row_index, completion, batch_requests[current_row_index], batch=True)
+                    with run_metrics.stage(current_row_index, STAGE_PARSE):
+                        current_outputs = handler_outputs(handler_class, classification_result_str, num_expected_outputs, log_callback, structured_output)
+                except Exception as e_row:
+                    log_callback(f"❌ Unexpected error while processing the batch result for row {current_row_index}: {type(e_row).__name__} - {e_row}")
+                    current_outputs = tuple([f"Processing error: {type(e_row).__name__}"] * num_expected_outputs)
+            record_and_write_row_outputs(current_row_index, current_outputs)
+            log_callback(f"--- Row {current_row_index} processing finished. ---")
 
     # --- Initializing the Google Sheets Client ---
     log_callback("📊 Initializing Google Sheets client...")
@@ -157,66 +358,89 @@ def run_core_logic(
         log_callback(error_msg)
         raise RuntimeError(error_msg) from e
 
-    # --- Selenium WebDriver Initialization ---
-    log_callback("🌐 Initializing Selenium WebDriver...")
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080") 
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-
-    selenium_driver: Optional[webdriver.Chrome] = None
-    try:
-        service = ChromeService(ChromeDriverManager().install())
-        selenium_driver = webdriver.Chrome(service=service, options=chrome_options)
-        log_callback("✅ Selenium WebDriver initialized successfully using webdriver-manager.")
-    except Exception as e:
-        log_callback(f"❌ ERROR initializing Selenium WebDriver with webdriver-manager: {e}")
-        log_callback("Ensure you have an internet connection for the first run to download ChromeDriver, or that ChromeDriver is in your PATH.")
-        selenium_driver = None 
+    if html_parser_backend == "lxml" and not lxml_available():
+        log_callback("⚠️ lxml parser requested but the 'lxml' package is not installed. Falling back to html.parser.")
+        html_parser_backend = "html.parser"
+
+    # --- Scraped Content Cache ---
+    # The token budget is applied to the cached text on every read, so it is not part of the key.
+    scrape_cache: Optional[ScrapeCache] = None
+    if scrape_cache_path:
+        try:
+            scrape_cache = ScrapeCache(
+                scrape_cache_path,
+                ttl_hours=scrape_cache_ttl_hours,
+                extraction_settings=extraction_settings_key(html_parser_backend, max_download_bytes, max_text_chars)
+            )
+            log_callback(f"💾 Scrape cache enabled: {scrape_cache_path} (TTL: {scrape_cache_ttl_hours} h).")
+        except Exception as e_cache:
+            log_callback(f"⚠️ Could not open scrape cache '{scrape_cache_path}': {e_cache}. Continuing without cache.")
+            scrape_cache = None
+
+    # --- Selenium Browser Pool ---
+    # Browsers are only started when a page actually needs the Selenium fallback.
+    browser_pool: Optional[BrowserPool] = None
+    if selenium_pool_size > 0:
+        browser_pool = BrowserPool(
+            log_callback,
+            size=selenium_pool_size,
+            max_pages_per_driver=selenium_max_pages_per_driver,
+            page_load_timeout=selenium_page_load_timeout
+        )
+        log_callback(f"🌐 Selenium fallback enabled with a pool of up to {selenium_pool_size} browser(s).")
+
+    readiness_stats = ReadinessStats()
+
+    # --- Shared HTTP Client ---
+    # One keep-alive connection pool for every page fetch of this run, shared by all workers.
+    http_client = build_http_client(log_callback, pool_size=http_pool_size, use_http2=use_http2, timeout=requests_timeout)
+    if http_pool_size < max_workers:
+        log_callback(f"⚠️ HTTP pool size ({http_pool_size}) is smaller than the number of workers ({max_workers}); some fetches will wait for a free connection.")
+
+    # Opened further down, once the rows to process are known.
+    job_journal: Optional[JobJournal] = None
+
+    def close_run_resources() -> None:
+        http_client.close()
+        if browser_pool:
+            try:
+                browser_pool.close()
+            except Exception as e_quit:
+                log_callback(f"⚠️ Error closing Selenium WebDriver pool: {e_quit}")
+        for run_store in (job_journal, scrape_cache, llm_cache):
+            if run_store:
+                run_store.close()
+
+    def selenium_available() -> bool:
+        return browser_pool is not None and browser_pool.available
 
     # --- Scraping function with Selenium ---
-    def get_text_with_selenium_local(url: str) -> Optional[str]:
-        nonlocal selenium_driver 
-        if not selenium_driver:
+    def get_text_with_selenium_local(current_row_index: int, url: str) -> Optional[str]:
+        if not selenium_available():
             log_callback("⚠️ Selenium driver not available. Cannot scrape with Selenium.")
             return None
         try:
             log_callback(f"Attempting to fetch {url} with Selenium...")
-            selenium_driver.set_page_load_timeout(selenium_page_load_timeout)
-            selenium_driver.get(url)
-            time.sleep(selenium_sleep_after_load) 
-            
-            if "Just a moment..." in selenium_driver.title or "Cloudflare" in selenium_driver.page_source:
-                log_callback(f"⚠️ Possible Cloudflare challenge page detected for {url}. Waiting a bit longer.")
-                time.sleep(5) 
+            with run_metrics.stage(current_row_index, STAGE_RENDER), browser_pool.borrow() as selenium_driver:
+                selenium_driver.get(url)
+                wait_result = wait_for_page_ready(
+                    selenium_driver,
+                    max_wait_seconds=selenium_max_wait_after_load,
+                    min_text_length=selenium_min_text_length
+                )
+                readiness_stats.record(wait_result)
+                if wait_result["timed_out"]:
+                    log_callback(f"⚠️ {url} was not ready after {wait_result['waited_seconds']:.1f} s (possible Cloudflare challenge or slow page). Using what has rendered so far.")
+                else:
+                    log_callback(f"⏱️ {url} ready after {wait_result['waited_seconds']:.1f} s.")
 
-            html = selenium_driver.page_source
-            soup = BeautifulSoup(html, "html.parser")
-            
-            for element_type in ["script", "style", "header", "footer", "nav", "aside", "form"]:
-                for element in soup.find_all(element_type):
-                    element.decompose()
-            
-            body_tag = soup.find('body')
-            text_content = body_tag.get_text(separator=" ", strip=True) if body_tag else soup.get_text(separator=" ", strip=True)
+                html = selenium_driver.page_source
+                text_content = extract_visible_text(html, max_chars=max_text_chars, backend=html_parser_backend)
 
             log_callback(f"✅ Content retrieved with Selenium from {url} (length: {len(text_content)} chars).")
             return text_content
         except (WebDriverException, TimeoutException) as e:
-            log_callback(f"❌ Selenium - WebDriver or Timeout error for {url}: {str(e)[:200]}...")
-            if selenium_driver:
-                log_callback("Attempting to restart Selenium driver once...")
-                try:
-                    selenium_driver.quit()
-                    restarted_service = ChromeService(ChromeDriverManager().install())
-                    selenium_driver = webdriver.Chrome(service=restarted_service, options=chrome_options)
-                    log_callback("✅ Selenium driver restarted.")
-                except Exception as e_restart:
-                    log_callback(f"❌ Failed to restart Selenium driver: {e_restart}")
-                    selenium_driver = None 
+            log_callback(f"❌ Selenium - WebDriver or Timeout error for {url}: {str(e)[:200]}... The browser will be replaced.")
             return None
         except Exception as e:
             log_callback(f"❌ Selenium - Other error for {url}: {str(e)[:200]}...")
@@ -225,27 +449,34 @@ def run_core_logic(
     # --- Main Processing Loop ---
     log_callback(f"📋 Starting processing rows from {start_row} to {end_row}...")
     company_names_data: List[List[str]] = []
+    sheet_rows: List[Tuple[int, Tuple[Any, ...]]] = []
     try:
         if end_row < start_row:
             log_callback(f"⚠️ Warning: End row ({end_row}) is less than start row ({start_row}). No rows will be processed.")
-            if selenium_driver: selenium_driver.quit()
-            return
+            close_run_resources()
+            return run_summary
 
         company_data_range_str = f"{company_input_column}{start_row}:{company_input_column}{end_row}"
-        log_callback(f"Fetching data from Google Sheets range: {company_data_range_str}")
-        company_names_data = sh_opened.get(company_data_range_str, value_render_option='UNFORMATTED_VALUE')
-        if not company_names_data:
-            log_callback(f"⚠️ No data found in range {company_data_range_str}. Ensure the sheet and range are correct.")
+        if incremental_mode == INCREMENTAL_OFF:
+            log_callback(f"Fetching data from Google Sheets range: {company_data_range_str}")
+            company_names_data = read_range(sh_opened, company_data_range_str, value_render_option='UNFORMATTED_VALUE', rate_limiter=sheets_read_rate_limiter)
+            if not company_names_data:
+                log_callback(f"⚠️ No data found in range {company_data_range_str}. Ensure the sheet and range are correct.")
+        else:
+            # One read of the input and output columns decides which rows still need work.
+            output_column_letters = [column_letter for column_letter in (first_output_column, second_output_column, third_output_column)[:num_expected_outputs] if column_letter and column_letter.strip()]
+            log_callback(f"Fetching input column {company_input_column} and output column(s) {', '.join(output_column_letters)} for rows {start_row}-{end_row} in one read.")
+            sheet_rows = read_columns(sh_opened, [company_input_column, *output_column_letters], start_row, end_row, value_render_option='UNFORMATTED_VALUE', rate_limiter=sheets_read_rate_limiter)
 
     except gspread.exceptions.APIError as e_gs_api_error:
         error_msg = f"❌ Google Sheets API error while fetching data from range {company_data_range_str}: {e_gs_api_error}. Aborting."
         log_callback(error_msg)
-        if selenium_driver: selenium_driver.quit()
+        close_run_resources()
         raise RuntimeError(error_msg) from e_gs_api_error
     except Exception as e_fetch:
         error_msg = f"❌ Unexpected error while fetching data from Google Sheets: {e_fetch}. Aborting."
         log_callback(error_msg)
-        if selenium_driver: selenium_driver.quit()
+        close_run_resources()
         raise RuntimeError(error_msg) from e_fetch
 
     output_columns_config = [
@@ -254,13 +485,71 @@ def run_core_logic(
         (third_output_column, "Col3")
     ]
 
-    for i, row_data in enumerate(company_names_data):
-        current_row_index = start_row + i
-        if current_row_index > end_row:
-            log_callback(f"Reached defined end_row ({end_row}). Stopping further processing.")
-            break
+    # --- Fetching page text: Requests first, Selenium as a fallback ---
+    # Returns None if a cancellation stopped the download.
+    def fetch_page_text(current_row_index: int, url_to_scrape: str) -> Optional[Tuple[Optional[str], str]]:
+        text_content: Optional[str] = None
+        scraped_with = ""
+        download_cancelled = False
+
+        def read_until_cancelled(byte_chunks: Iterable[bytes]) -> Iterator[bytes]:
+            # Checked before each read, so a cancellation does not wait for the rest of a slow download.
+            nonlocal download_cancelled
+            chunk_iterator = iter(byte_chunks)
+            while not (cancel_event is not None and cancel_event.is_set()):
+                chunk = next(chunk_iterator, None)
+                if chunk is None:
+                    return
+                yield chunk
+            download_cancelled = True
 
+        try:
+            log_callback(f"Attempting to fetch {url_to_scrape} with Requests...")
+            # The body is streamed and parsed as it arrives; reading stops at the byte budget
+            # or once enough text for the LLM has been collected.
+            with run_metrics.stage(current_row_index, STAGE_FETCH), http_client.stream("GET", url_to_scrape) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "").lower()
+                if "text/html" in content_type:
+                    text_content, bytes_read, stopped_early = extract_text_from_byte_stream(
+                        read_until_cancelled(response.iter_bytes(chunk_size=16384)),
+                        encoding=response.charset_encoding,
+                        max_bytes=max_download_bytes,
+                        max_chars=max_text_chars,
+                        backend=html_parser_backend
+                    )
+            if download_cancelled:
+                log_callback(f"⏹️ Cancellation requested. Stopped downloading {url_to_scrape}; row {current_row_index} is left for the next run.")
+                return None
+            if "text/html" in content_type:
+                scraped_with = "Requests"
+                stopped_note = ", stopped early" if stopped_early else ""
+                log_callback(f"✅ Content retrieved with Requests (length: {len(text_content)} chars, {bytes_read // 1024} KiB read{stopped_note}).")
+            else:
+                log_callback(f"⚠️ Non-HTML content type with Requests for {url_to_scrape}: {content_type}. Will try Selenium if available.")
+                if selenium_available():
+                    text_content = get_text_with_selenium_local(current_row_index, url_to_scrape)
+                    if text_content: scraped_with = "Selenium (after non-HTML with Requests)"
+        
+        except httpx.HTTPError as e_req:
+            log_callback(f"❌ Requests error for {url_to_scrape}: {str(e_req)[:200]}... Will try Selenium if available.")
+            if selenium_available():
+                text_content = get_text_with_selenium_local(current_row_index, url_to_scrape)
+                if text_content: scraped_with = "Selenium (after Requests error)"
+        except Exception as e_gen_req: 
+            log_callback(f"❌ Generic error during Requests for {url_to_scrape}: {str(e_gen_req)[:200]}... Will try Selenium if available.")
+            if selenium_available():
+                text_content = get_text_with_selenium_local(current_row_index, url_to_scrape)
+                if text_content: scraped_with = "Selenium (after generic Requests error)"
+
+        return text_content, scraped_with
+
+    # --- Row Processing: fetch, classify and parse a single row ---
+    # Returns None for a row whose classification was queued for the OpenAI batch, or whose
+    # page download was stopped by a cancellation.
+    def process_row(current_row_index: int, row_data: List[Any]) -> Optional[Tuple[str, ...]]:
         company_name_or_domain_input = row_data[0] if row_data and len(row_data) > 0 and row_data[0] else None
+        if job_journal: job_journal.row_started(current_row_index, company_name_or_domain_input)
         current_outputs: Tuple[str, ...] = tuple([""] * num_expected_outputs)
 
         if not company_name_or_domain_input or not str(company_name_or_domain_input).strip():
@@ -286,58 +575,51 @@ def run_core_logic(
             
             text_content: Optional[str] = None
             scraped_with = ""
-            REQUESTS_HEADERS = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.5",
-            }
-            try:
-                log_callback(f"Attempting to fetch {url_to_scrape} with Requests...")
-                response = requests.get(url_to_scrape, headers=REQUESTS_HEADERS, timeout=requests_timeout, allow_redirects=True)
-                response.raise_for_status() 
-                
-                content_type = response.headers.get("Content-Type", "").lower()
-                if "text/html" in content_type:
-                    soup = BeautifulSoup(response.content, "html.parser")
-                    for element_type in ["script", "style", "header", "footer", "nav", "aside", "form"]:
-                        for element in soup.find_all(element_type):
-                            element.decompose()
-                    body_tag = soup.find('body')
-                    text_content = body_tag.get_text(separator=" ", strip=True) if body_tag else soup.get_text(separator=" ", strip=True)
-                    scraped_with = "Requests"
-                    log_callback(f"✅ Content retrieved with Requests (length: {len(text_content)} chars).")
-                else:
-                    log_callback(f"⚠️ Non-HTML content type with Requests for {url_to_scrape}: {content_type}. Will try Selenium if available.")
-                    if selenium_driver: 
-                        text_content = get_text_with_selenium_local(url_to_scrape)
-                        if text_content: scraped_with = "Selenium (after non-HTML with Requests)"
-            
-            except requests.exceptions.RequestException as e_req:
-                log_callback(f"❌ Requests error for {url_to_scrape}: {str(e_req)[:200]}... Will try Selenium if available.")
-                if selenium_driver: 
-                    text_content = get_text_with_selenium_local(url_to_scrape)
-                    if text_content: scraped_with = "Selenium (after Requests error)"
-            except Exception as e_gen_req: 
-                log_callback(f"❌ Generic error during Requests for {url_to_scrape}: {str(e_gen_req)[:200]}... Will try Selenium if available.")
-                if selenium_driver:
-                    text_content = get_text_with_selenium_local(url_to_scrape)
-                    if text_content: scraped_with = "Selenium (after generic Requests error)"
+            cached_page = scrape_cache.get(url_to_scrape) if scrape_cache else None
+            if cached_page:
+                text_content, scraped_with, fetched_at = cached_page
+                log_callback(f"💾 Using cached content for {url_to_scrape} (fetched with {scraped_with} on {time.strftime('%Y-%m-%d %H:%M', time.localtime(fetched_at))}, length: {len(text_content)} chars).")
+            else:
+                fetched_page = fetch_page_text(current_row_index, url_to_scrape)
+                if fetched_page is None:
+                    return None
+                text_content, scraped_with = fetched_page
+                if scrape_cache and text_content and text_content.strip():
+                    scrape_cache.put(url_to_scrape, text_content, scraped_with)
 
             if text_content and text_content.strip():
-                clean_text = " ".join(filter(None, (line.strip() for line in text_content.splitlines())))
-                clean_text = re.sub(r'\s+', ' ', clean_text).strip() 
-                max_text_len = 30000 
-                if len(clean_text) > max_text_len:
-                    log_callback(f"⚠️ Content too long ({len(clean_text)} chars), truncating to {max_text_len} chars for OpenAI.")
-                    clean_text = clean_text[:max_text_len]
-
-                classification_result_str = classify_with_openai_local(clean_text)
-                current_outputs = handler_class.process_llm_response(classification_result_str, num_expected_outputs, log_callback)
+                with run_metrics.stage(current_row_index, STAGE_CLEAN):
+                    if content_token_budget > 0:
+                        clean_text = select_page_content(text_content, content_token_budget, openai_model_name)[:max_text_chars]
+                        log_callback(f"✂️ Row {current_row_index}: kept {len(clean_text)} of {len(text_content)} chars of page text within the {content_token_budget}-token budget.")
+                    else:
+                        clean_text = " ".join(filter(None, (line.strip() for line in text_content.splitlines())))
+                        clean_text = re.sub(r'\s+', ' ', clean_text).strip() 
+                        if len(clean_text) > max_text_chars:
+                            log_callback(f"⚠️ Content too long ({len(clean_text)} chars), truncating to {max_text_chars} chars for OpenAI.")
+                            clean_text = clean_text[:max_text_chars]
+
+                if use_openai_batch:
+                    messages = build_classification_messages(clean_text)
+                    classification_result_str = cached_classification(messages)
+                    if classification_result_str is None:
+                        queue_for_batch(current_row_index, messages)
+                        return None
+                else:
+                    try:
+                        classification_result_str = classify_with_openai_local(current_row_index, clean_text)
+                    except Exception as e_llm:
+                        return tuple([f"LLM Error: {type(e_llm).__name__}"] * num_expected_outputs)
+                with run_metrics.stage(current_row_index, STAGE_PARSE):
+                    current_outputs = handler_outputs(handler_class, classification_result_str, num_expected_outputs, log_callback, structured_output)
             else: 
                 log_callback(f"⚠️ Failed to retrieve meaningful content for {url_to_scrape} using all methods.")
                 current_outputs = handler_class.handle_no_content(num_expected_outputs, log_callback)
 
-        # --- Login and Update Spreadsheet ---
+        return current_outputs
+
+    # --- Login and Update Spreadsheet ---
+    def write_row_outputs(current_row_index: int, current_outputs: Tuple[str, ...]) -> None:
         log_message_parts = []
         cells_to_update_batch: List[gspread.Cell] = []
 
@@ -378,24 +660,203 @@ def run_core_logic(
             log_callback(f"➡️ Preparing to update sheet for row {current_row_index}: " + ", ".join(log_message_parts))
 
         if cells_to_update_batch:
-            try:
-                sh_opened.update_cells(cells_to_update_batch, value_input_option='USER_ENTERED')
-                log_callback(f"✅ Successfully updated Google Sheets for row {current_row_index}.")
-            except gspread.exceptions.APIError as e_gs_api:
-                log_callback(f"❌ Google Sheets API Error during batch update for row {current_row_index}: Code {e_gs_api.response.status_code} - {e_gs_api.response.json().get('error', {}).get('message', str(e_gs_api))}")
-            except Exception as e_gs_update:
-                log_callback(f"❌ Error batch updating Google Sheets for row {current_row_index}: {e_gs_update}")
-        
-        log_callback(f"--- Row {current_row_index} processing finished. Waiting 1 sec... ---")
-        time.sleep(1) 
+            sheet_writer.add(cells_to_update_batch)
+            log_callback(f"📝 Queued {len(cells_to_update_batch)} cell(s) for row {current_row_index} ({sheet_writer.buffered_cell_count} buffered).")
+
+    def record_and_write_row_outputs(current_row_index: int, current_outputs: Tuple[str, ...]) -> None:
+        # Rows with the same domain as this one get its outputs as well.
+        duplicates = duplicate_rows.get(current_row_index, [])
+        for row_index in [current_row_index, *duplicates]:
+            if job_journal:
+                job_journal.record_row(row_index, current_outputs)
+            with run_metrics.stage(row_index, STAGE_WRITE):
+                write_row_outputs(row_index, current_outputs)
+            run_metrics.row_completed()
+            run_summary["rows_completed"] += 1
+            if outputs_indicate_failure(current_outputs, error_markers):
+                run_summary["rows_failed"] += 1
+        if duplicates:
+            # Each duplicate row would have cost what this row did.
+            processed_row_metrics = run_metrics.row(current_row_index)
+            page_fetches = int(STAGE_FETCH in processed_row_metrics) + int(STAGE_RENDER in processed_row_metrics)
+            run_summary["fetches_saved"] += page_fetches * len(duplicates)
+            run_summary["llm_calls_saved"] += round(processed_row_metrics.get("llm_calls", 0)) * len(duplicates)
+            log_callback(f"🔗 Row {current_row_index}: result reused for row(s) {', '.join(map(str, duplicates))} with the same domain.")
+        if progress_callback:
+            progress_callback(run_summary["rows_completed"], run_summary["rows_total"])
+
+    # --- Job Journal ---
+    # Rows are checkpointed so a crashed or stopped run can be resumed without redoing finished rows.
+    if job_journal_path:
+        try:
+            job_id = make_job_id(
+                gsheet_name, worksheet_name, company_input_column,
+                [first_output_column, second_output_column, third_output_column],
+                os.path.basename(prompt_full_path), prompt_handler_key, openai_model_name
+            )
+            job_journal = JobJournal(job_id, description=f"{gsheet_name} / {worksheet_name} / {prompt_handler_key}", db_path=job_journal_path, error_markers=error_markers)
+            previous_counts = job_journal.begin(resume)
+            if resume:
+                log_callback(f"📒 Resuming job {job_id} (journal: {sum(previous_counts.values())} row(s) recorded so far).")
+            else:
+                log_callback(f"📒 Job {job_id} journaled to {job_journal_path}.")
+        except Exception as e_journal:
+            log_callback(f"⚠️ Could not open job journal '{job_journal_path}': {e_journal}. Continuing without checkpoints.")
+            job_journal = None
+    if resume and not job_journal:
+        log_callback("⚠️ Resume requested but no job journal is available. All rows will be processed.")
+
+    def on_sheet_flush(flushed_rows: List[int]) -> None:
+        run_metrics.record_flush(flushed_rows, sheet_writer.last_flush_seconds)
+        if job_journal:
+            job_journal.mark_written(flushed_rows)
+
+    sheet_writer = BufferedSheetWriter(
+        sh_opened,
+        log_callback,
+        max_buffered_cells=sheets_flush_max_cells,
+        flush_interval_seconds=sheets_flush_interval_seconds,
+        rate_limiter=sheets_write_rate_limiter,
+        on_flush=on_sheet_flush
+    )
+
+    rows_to_process: List[Tuple[int, List[Any]]] = []
+    if incremental_mode == INCREMENTAL_OFF:
+        for i, row_data in enumerate(company_names_data):
+            current_row_index = start_row + i
+            if current_row_index > end_row:
+                log_callback(f"Reached defined end_row ({end_row}). Stopping further processing.")
+                break
+            rows_to_process.append((current_row_index, row_data))
+    else:
+        incremental_rows, row_counts = select_incremental_rows(sheet_rows, incremental_mode, error_markers)
+        run_summary["rows_up_to_date"] = row_counts[ROW_STATE_DONE]
+        rows_to_process = [(current_row_index, [input_value]) for current_row_index, input_value in incremental_rows]
+        log_callback(f"⏩ Incremental mode '{incremental_mode}': {incremental_summary_line(row_counts, len(rows_to_process))}.")
+
+    restored_outputs: Dict[int, Tuple[str, ...]] = {}
+    if resume and job_journal:
+        completed_rows, restored_outputs = job_journal.resume_plan(start_row, end_row)
+        rows_to_process = [
+            (current_row_index, row_data) for current_row_index, row_data in rows_to_process
+            if current_row_index not in completed_rows and current_row_index not in restored_outputs
+        ]
+        run_summary["rows_already_done"] = len(completed_rows)
+        run_summary["rows_restored"] = len(restored_outputs)
+        log_callback(
+            f"⏯️ Resume: {len(completed_rows)} row(s) already done, {len(restored_outputs)} row(s) restored from the journal, "
+            f"{len(rows_to_process)} row(s) left to process."
+        )
+
+    # --- Domain Deduplication ---
+    # Sheets often list a company several times; each canonical domain is scraped and classified once.
+    duplicate_rows: Dict[int, List[int]] = {}
+    if dedupe_domains:
+        rows_to_process, duplicate_rows = group_rows_by_domain(rows_to_process)
+        run_summary["rows_deduplicated"] = sum(len(duplicates) for duplicates in duplicate_rows.values())
+        if duplicate_rows:
+            rows_by_index = dict(rows_to_process)
+            for current_row_index, duplicates in duplicate_rows.items():
+                log_callback(f"🔗 {canonical_domain(rows_by_index[current_row_index][0])}: row {current_row_index} is processed once for row(s) {', '.join(map(str, duplicates))}.")
+            log_callback(f"🔗 {run_summary['rows_deduplicated']} row(s) share their domain with another row; {len(rows_to_process)} unique row(s) to process.")
+
+    run_summary["rows_total"] = len(rows_to_process) + run_summary["rows_deduplicated"]
+
+    try:
+        # Buffered cells are flushed on exit, even if processing stops with an error.
+        with sheet_writer:
+            for current_row_index, current_outputs in sorted(restored_outputs.items()):
+                write_row_outputs(current_row_index, current_outputs)
+
+            if max_workers == 1:
+                for current_row_index, row_data in rows_to_process:
+                    if cancel_event is not None and cancel_event.is_set():
+                        log_callback(f"⏹️ Cancellation requested. Stopping before row {current_row_index}.")
+                        break
+                    try:
+                        current_outputs = process_row(current_row_index, row_data)
+                    except Exception as e_row:
+                        log_callback(f"❌ Unexpected error while processing row {current_row_index}: {type(e_row).__name__} - {e_row}")
+                        current_outputs = tuple([f"Processing error: {type(e_row).__name__}"] * num_expected_outputs)
+                    if current_outputs is None:
+                        continue
+                    record_and_write_row_outputs(current_row_index, current_outputs)
+                    log_callback(f"--- Row {current_row_index} processing finished. ---")
+            else:
+                # Fetching, LLM classification and parsing overlap across rows in worker threads.
+                # Sheet writes stay on this thread; each future carries its own row index so results
+                # cannot end up in the wrong row, whatever order they complete in.
+                log_callback(f"⚙️ Processing {len(rows_to_process)} rows with {max_workers} concurrent workers.")
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrap_llm_row") as executor:
+                    pending_futures = {
+                        executor.submit(process_row, current_row_index, row_data): current_row_index
+                        for current_row_index, row_data in rows_to_process
+                    }
+                    cancelling = False
+                    while pending_futures:
+                        done_futures, _ = wait(pending_futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                        log_callback.drain()
+                        sheet_writer.flush_if_due()
+                        if cancel_event is not None and cancel_event.is_set() and not cancelling:
+                            # Rows not started yet are dropped; rows in flight finish and are written.
+                            cancelling = True
+                            not_started = [future for future in pending_futures if future not in done_futures and future.cancel()]
+                            for future in not_started:
+                                pending_futures.pop(future)
+                            log_callback(f"⏹️ Cancellation requested. {len(not_started)} queued row(s) dropped; finishing {len(pending_futures) - len(done_futures)} row(s) in flight.")
+                        for future in done_futures:
+                            current_row_index = pending_futures.pop(future)
+                            try:
+                                current_outputs = future.result()
+                            except Exception as e_row:
+                                log_callback(f"❌ Unexpected error while processing row {current_row_index}: {type(e_row).__name__} - {e_row}")
+                                current_outputs = tuple([f"Processing error: {type(e_row).__name__}"] * num_expected_outputs)
+                            if current_outputs is None:
+                                continue
+                            record_and_write_row_outputs(current_row_index, current_outputs)
+                            log_callback(f"--- Row {current_row_index} processing finished. ---")
+                log_callback.drain()
+
+            if batch_requests:
+                if cancel_event is not None and cancel_event.is_set():
+                    log_callback(f"⏹️ Cancellation requested. {len(batch_requests)} queued classification(s) were not sent to the Batch API.")
+                else:
+                    classify_rows_with_batch()
+    except BaseException:
+        # Errors and interrupts skip the summary below; the connections, browsers and stores are still released.
+        close_run_resources()
+        raise
+    run_summary["unwritten_cells"] = sheet_writer.unwritten_cell_count
+    run_summary["cancelled"] = cancel_event is not None and cancel_event.is_set()
+    run_summary["metrics"] = run_metrics.summary()
+    run_summary["row_metrics"] = run_metrics.rows()
 
     # --- Finishing and Cleaning ---
-    if selenium_driver:
-        try:
-            selenium_driver.quit()
-            log_callback("✅ Selenium WebDriver closed successfully.")
-        except Exception as e_quit:
-            log_callback(f"⚠️ Error closing Selenium WebDriver: {e_quit}")
-            
+    for metrics_line in run_metrics.summary_lines(run_summary["metrics"]):
+        log_callback(f"⏱️ {metrics_line}")
+    if run_summary["rows_deduplicated"]:
+        log_callback(
+            f"🔗 Domain deduplication: {run_summary['rows_deduplicated']} duplicate row(s) reused an earlier result, "
+            f"saving {run_summary['fetches_saved']} page fetch(es) and {run_summary['llm_calls_saved']} LLM call(s)."
+        )
+    if job_journal:
+        log_callback(f"📒 Job journal: {job_journal.summary_line()}.")
+    if scrape_cache:
+        log_callback(f"💾 Scrape cache: {scrape_cache.hits} hit(s), {scrape_cache.misses} miss(es).")
+    if llm_cache:
+        log_callback(f"💾 LLM response cache: {llm_cache.stats_line()}.")
+
+    if prompt_changed_on_disk(prompt_full_path, run_summary["prompt_fingerprint"]):
+        log_callback(f"⚠️ '{os.path.basename(prompt_full_path)}' was edited during the job. This job used the prompt as loaded at the start; the edits apply to the next job.")
+    log_callback(f"🚦 OpenAI rate limiter: {openai_rate_limiter.stats_line()}.")
+    log_callback(f"🔁 OpenAI retries: {openai_retry_policy.stats_line()}.")
+    log_callback(f"🚦 Google Sheets write rate limiter: {sheets_write_rate_limiter.stats_line()}.")
+    if readiness_stats.pages:
+        log_callback(
+            f"⏱️ Selenium readiness wait: {readiness_stats.average_wait_seconds:.1f} s on average over {readiness_stats.pages} page(s) "
+            f"({readiness_stats.timed_out_pages} hit the {selenium_max_wait_after_load} s upper bound)."
+        )
+    close_run_resources()
     log_callback("🎉 Core logic processing finished.")
+    return run_summary
 
@@ -0,0 +1,44 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def canonical_domain(value: Any) -> Optional[str]:
+    """
+    The key rows are grouped by: the input's host, lowercased, without scheme, port, a leading
+    "www." and anything after the host (path, query, fragment). So "https://www.Example.com/about"
+    and "example.com" share a key. Inputs without a dotted host (e.g. plain company names) are
+    keyed by their lowercased, whitespace-normalised text. None for an empty input.
+    """
+    text = " ".join(str(value).split()) if value is not None else ""
+    if not text:
+        return None
+    url = text if re.match(r"^[a-zA-Z]+://", text) else "https://" + text
+    try:
+        host = (urlsplit(url).hostname or "").rstrip(".")
+    except ValueError:
+        host = ""
+    if "." not in host:
+        return text.lower()
+    return host[len("www."):] if host.startswith("www.") else host
+
+
+def group_rows_by_domain(rows: List[Tuple[int, List[Any]]]) -> Tuple[List[Tuple[int, List[Any]]], Dict[int, List[int]]]:
+    """
+    Splits (row index, row data) pairs, whose first cell is the domain input, into the rows to
+    process (the first row of every canonical domain, plus rows without input) and
+    {processed row: [later rows with the same domain]} to reuse its result for.
+    """
+    rows_to_process: List[Tuple[int, List[Any]]] = []
+    duplicate_rows: Dict[int, List[int]] = {}
+    first_row_by_domain: Dict[str, int] = {}
+    for row_index, row_data in rows:
+        domain = canonical_domain(row_data[0] if row_data else None)
+        if domain is None:
+            rows_to_process.append((row_index, row_data))
+        elif domain in first_row_by_domain:
+            duplicate_rows.setdefault(first_row_by_domain[domain], []).append(row_index)
+        else:
+            first_row_by_domain[domain] = row_index
+            rows_to_process.append((row_index, row_data))
+    return rows_to_process, duplicate_rows
@@ -0,0 +1,213 @@
+import importlib
+import importlib.util
+import inspect
+import os
+import pkgutil
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from prompt_handlers.base_handler import BasePromptHandler
+
+PROMPTS_FOLDER = "prompts/"
+PROMPT_HANDLERS_PACKAGE_NAME = "prompt_handlers"
+REQUIRED_HANDLER_METHODS = ("get_config", "process_llm_response", "handle_no_content", "get_prompt_key")
+
+
+def is_handler_for_page(config: Dict[str, Any], page_id: Optional[str]) -> bool:
+    """
+    True if a handler's 'target_page_id' (a string or a list, "all" matches every page) covers
+    `page_id`. A page_id of None matches every handler that declares a target.
+    """
+    handler_target_id: Union[str, List[str], None] = config.get("target_page_id")
+    if handler_target_id is None:
+        return False
+    target_ids = [handler_target_id] if isinstance(handler_target_id, str) else handler_target_id
+    normalized_target_ids = [str(target_id).lower() for target_id in target_ids]
+    return page_id is None or page_id.lower() in normalized_target_ids or "all" in normalized_target_ids
+
+
+def _current_base_handler_class() -> type:
+    """BasePromptHandler as currently loaded; after a reload it differs from the one imported above."""
+    base_module = sys.modules.get(f"{PROMPT_HANDLERS_PACKAGE_NAME}.base_handler")
+    return getattr(base_module, "BasePromptHandler", BasePromptHandler)
+
+
+def _is_concrete_handler(attribute: Any) -> bool:
+    if not isinstance(attribute, type) or inspect.isabstract(attribute):
+        return False
+    base_handler_class = _current_base_handler_class()
+    if attribute is base_handler_class or attribute.__name__ == "BasePromptHandler":
+        return False
+    if issubclass(attribute, base_handler_class):
+        return True
+    return all(callable(getattr(attribute, method_name, None)) for method_name in REQUIRED_HANDLER_METHODS)
+
+
+def discover_prompt_handlers(
+    page_id: Optional[str] = None,
+    prompts_folder: str = PROMPTS_FOLDER,
+    log_callback: Callable[[str], None] = print
+) -> Tuple[Dict[str, Type[BasePromptHandler]], Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """
+    Imports every module of the prompt_handlers package and collects the handlers meant for
+    `page_id` (all pages if None) whose prompt file exists, without any Streamlit dependency.
+    Returns (handlers by prompt key, configs by display name, prompt file paths by display name).
+    Problems with individual handlers are reported through `log_callback` and skipped.
+    """
+    handlers_by_key: Dict[str, Type[BasePromptHandler]] = {}
+    configs_by_display_name: Dict[str, Dict[str, Any]] = {}
+    prompt_files_by_display_name: Dict[str, str] = {}
+
+    if not os.path.isdir(prompts_folder):
+        log_callback(f"❌ ERROR: Folder '{prompts_folder}' does not exist.")
+
+    prompt_handlers_package = importlib.import_module(PROMPT_HANDLERS_PACKAGE_NAME)
+    for _, module_name, _ in pkgutil.iter_modules(prompt_handlers_package.__path__):
+        if module_name == "base_handler":
+            continue
+        try:
+            module = importlib.import_module(f".{module_name}", package=PROMPT_HANDLERS_PACKAGE_NAME)
+        except Exception as e_mod:
+            log_callback(f"❌ Error importing handler module '{module_name}': {type(e_mod).__name__} - {e_mod}")
+            continue
+
+        for attribute_name in dir(module):
+            handler_class = getattr(module, attribute_name)
+            if not _is_concrete_handler(handler_class):
+                continue
+            try:
+                config: Optional[Dict[str, Any]] = handler_class.get_config()
+                prompt_key: Optional[str] = handler_class.get_prompt_key()
+            except Exception as e_handler_init:
+                log_callback(f"❌ Error configuring handler '{attribute_name}' from module '{module_name}': {type(e_handler_init).__name__} - {e_handler_init}")
+                break
+            if config is None or not prompt_key or not prompt_key.strip():
+                log_callback(f"❌ ERROR: Handler '{attribute_name}' in module '{module_name}' returned no config or an empty prompt key. Skipping.")
+                continue
+            if not is_handler_for_page(config, page_id):
+                continue
+
+            display_name = config.get("display_name")
+            file_base = config.get("file_base")
+            if not display_name or not file_base:
+                log_callback(f"⚠️ Handler '{attribute_name}' in module '{module_name}' has incomplete configuration: {config}. Skipping.")
+                continue
+
+            full_path = os.path.join(prompts_folder, file_base + ".txt")
+            if os.path.exists(full_path):
+                handlers_by_key[prompt_key] = handler_class
+                configs_by_display_name[display_name] = config
+                prompt_files_by_display_name[display_name] = full_path
+            else:
+                log_callback(f"⚠️ Prompt file '{file_base}.txt' for handler '{display_name}' (key: {prompt_key}) not found in '{prompts_folder}'.")
+            # Only the first matching handler of a module is used.
+            break
+
+    return handlers_by_key, configs_by_display_name, prompt_files_by_display_name
+
+
+# (path, mtime in ns, size) of every handler module and prompt file a registry was built from.
+SourceFingerprint = Tuple[Tuple[str, int, int], ...]
+
+
+class HandlerRegistry:
+    """
+    The prompt handlers available to one page, discovered once, with O(1) lookups by prompt key
+    and by display name. `messages` keeps the problems reported while discovering them.
+    """
+
+    def __init__(
+        self,
+        page_id: Optional[str],
+        handlers_by_key: Dict[str, Type[BasePromptHandler]],
+        configs_by_display_name: Dict[str, Dict[str, Any]],
+        prompt_files_by_display_name: Dict[str, str],
+        messages: List[str],
+        source_fingerprint: SourceFingerprint
+    ):
+        self.page_id = page_id
+        self.handlers_by_key = handlers_by_key
+        self.configs_by_display_name = configs_by_display_name
+        self.prompt_files_by_display_name = prompt_files_by_display_name
+        self.messages = messages
+        self.source_fingerprint = source_fingerprint
+        self.keys_by_display_name: Dict[str, str] = {
+            config["display_name"]: handler_class.get_prompt_key()
+            for handler_class in handlers_by_key.values()
+            for config in (handler_class.get_config(),)
+            if config.get("display_name") in configs_by_display_name
+        }
+
+    def display_names(self) -> List[str]:
+        return sorted(self.configs_by_display_name)
+
+    def handler(self, prompt_key: str) -> Optional[Type[BasePromptHandler]]:
+        return self.handlers_by_key.get(prompt_key)
+
+    def key_for_display_name(self, display_name: Optional[str]) -> Optional[str]:
+        return self.keys_by_display_name.get(display_name) if display_name else None
+
+    def config_for_display_name(self, display_name: Optional[str]) -> Dict[str, Any]:
+        return self.configs_by_display_name.get(display_name, {}) if display_name else {}
+
+    def prompt_file_for_display_name(self, display_name: Optional[str]) -> Optional[str]:
+        return self.prompt_files_by_display_name.get(display_name) if display_name else None
+
+
+_registries: Dict[Tuple[Optional[str], str], HandlerRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def _source_fingerprint(prompts_folder: str) -> SourceFingerprint:
+    package_spec = importlib.util.find_spec(PROMPT_HANDLERS_PACKAGE_NAME)
+    folders = list(package_spec.submodule_search_locations or []) if package_spec else []
+    folders.append(prompts_folder)
+    entries: List[Tuple[str, int, int]] = []
+    for folder in folders:
+        try:
+            with os.scandir(folder) as folder_entries:
+                for entry in folder_entries:
+                    if entry.is_file() and entry.name.endswith((".py", ".txt")):
+                        entry_stat = entry.stat()
+                        entries.append((entry.path, entry_stat.st_mtime_ns, entry_stat.st_size))
+        except OSError:
+            continue
+    return tuple(sorted(entries))
+
+
+def _reload_handler_modules() -> None:
+    """Re-imports the handler modules loaded so far, so edited handlers take effect."""
+    importlib.invalidate_caches()
+    base_module_name = f"{PROMPT_HANDLERS_PACKAGE_NAME}.base_handler"
+    module_names = sorted(name for name in sys.modules if name.startswith(PROMPT_HANDLERS_PACKAGE_NAME + "."))
+    # The base class first, so the reloaded handlers subclass the new BasePromptHandler.
+    for module_name in sorted(module_names, key=lambda name: name != base_module_name):
+        try:
+            importlib.reload(sys.modules[module_name])
+        except Exception:
+            # The module is reported again (with the error) when discovery imports it.
+            sys.modules.pop(module_name, None)
+
+
+def get_handler_registry(page_id: Optional[str], prompts_folder: str = PROMPTS_FOLDER) -> HandlerRegistry:
+    """
+    Returns the process-wide handler registry for `page_id`. Handlers are discovered on the
+    first call only; later calls (every Streamlit rerun) merely compare the modification times
+    of the handler modules and prompt files, and rediscover when one of them has changed.
+    """
+    registry_key = (page_id, prompts_folder)
+    source_fingerprint = _source_fingerprint(prompts_folder)
+    with _registries_lock:
+        registry = _registries.get(registry_key)
+        if registry is not None and registry.source_fingerprint == source_fingerprint:
+            return registry
+        if registry is not None:
+            _reload_handler_modules()
+            # Registries of other pages were built from the old modules.
+            _registries.clear()
+        messages: List[str] = []
+        handlers_by_key, configs_by_display_name, prompt_files_by_display_name = discover_prompt_handlers(page_id, prompts_folder, messages.append)
+        registry = HandlerRegistry(page_id, handlers_by_key, configs_by_display_name, prompt_files_by_display_name, messages, source_fingerprint)
+        _registries[registry_key] = registry
+        return registry
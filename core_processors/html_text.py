@@ -0,0 +1,230 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_DOWNLOAD_BYTES = 2 * 1024 * 1024
+DEFAULT_MAX_TEXT_CHARS = 30000
+HTML_PARSER_BACKENDS = ("html.parser", "lxml")
+# Bump when a change to the extraction below changes the text it produces for the same page,
+# so cached page text from the older code is not reused.
+TEXT_EXTRACTION_VERSION = 1
+
+# Elements whose text is not page content. Only <body> text is wanted, so <head> is skipped too.
+SKIPPED_TAGS = frozenset(("script", "style", "header", "footer", "nav", "aside", "form", "head", "noscript", "template"))
+HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4"))
+DESCRIPTION_META_NAMES = frozenset(("description", "og:description"))
+# Markers of the structured text layout: metadata lines first, then one line per heading and per
+# stretch of text between headings. core_processors.content_budget selects sections by them.
+TITLE_PREFIX = "Title: "
+DESCRIPTION_PREFIX = "Description: "
+HEADING_PREFIX = "## "
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([a-zA-Z0-9_-]+)""", re.IGNORECASE)
+
+
+def lxml_available() -> bool:
+    """The lxml backend needs the optional 'lxml' package (`uv sync --extra lxml`)."""
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _VisibleTextCollector:
+    """
+    Parser target shared by both backends: collects whitespace-normalised text outside of
+    SKIPPED_TAGS and reports `done` once `max_chars` characters have been gathered.
+    The page <title> and meta description are kept as the first lines, and every h1-h4
+    heading gets a line of its own (prefixed with HEADING_PREFIX), so the text can later be
+    cut down section by section.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.collected_chars = 0
+        self.title = ""
+        self.description = ""
+        self._lines: List[str] = []
+        self._line_pieces: List[str] = []
+        # Parsers may split one text node across several data() calls (e.g. at chunk
+        # boundaries), so text is buffered until the next tag.
+        self._pending_text: List[str] = []
+        self._title_pieces: Optional[List[str]] = None
+        self._skip_depth = 0
+        self._heading_depth = 0
+
+    @property
+    def done(self) -> bool:
+        return self.collected_chars >= self.max_chars
+
+    def start(self, tag: str, attrib: Any = None) -> None:
+        self._flush_pending_text()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag == "title" and not self.title and self._title_pieces is None:
+            self._title_pieces = []
+        elif tag == "meta" and attrib:
+            self.meta(dict(attrib))
+        if tag in HEADING_TAGS:
+            if not self._heading_depth:
+                self._end_line()
+            self._heading_depth += 1
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag: str) -> None:
+        self._flush_pending_text()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag == "title" and self._title_pieces is not None:
+            self.title = " ".join("".join(self._title_pieces).split())
+            self._title_pieces = None
+        if tag in HEADING_TAGS and self._heading_depth:
+            self._heading_depth -= 1
+            if not self._heading_depth:
+                self._end_line(HEADING_PREFIX)
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def meta(self, attrib: Dict[str, Any]) -> None:
+        name = str(attrib.get("name") or attrib.get("property") or "").lower()
+        if name in DESCRIPTION_META_NAMES and not self.description:
+            self.description = " ".join(str(attrib.get("content") or "").split())
+
+    def data(self, text: str) -> None:
+        if self._title_pieces is not None:
+            self._title_pieces.append(text)
+        elif not self._skip_depth and not self.done:
+            self._pending_text.append(text)
+
+    def close(self) -> str:
+        self._flush_pending_text()
+        self._end_line()
+        metadata_lines = []
+        if self.title:
+            metadata_lines.append(TITLE_PREFIX + self.title)
+        if self.description:
+            metadata_lines.append(DESCRIPTION_PREFIX + self.description)
+        return "\n".join(metadata_lines + self._lines)[:self.max_chars]
+
+    def _flush_pending_text(self) -> None:
+        if not self._pending_text:
+            return
+        text = " ".join("".join(self._pending_text).split())
+        self._pending_text = []
+        if text:
+            self._line_pieces.append(text)
+            self.collected_chars += len(text) + 1
+
+    def _end_line(self, prefix: str = "") -> None:
+        if self._line_pieces:
+            self._lines.append(prefix + " ".join(self._line_pieces))
+            self._line_pieces = []
+
+
+class _StdlibTextParser(HTMLParser):
+    def __init__(self, collector: _VisibleTextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags (<br/>, <img/>, <meta ... />) still separate the text around them.
+        self.collector.start(tag, attrs)
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class IncrementalTextExtractor:
+    """
+    Extracts visible page text from HTML fed in chunks and stops as soon as `max_chars`
+    characters have been collected, so the rest of a large page is neither parsed nor kept.
+    `backend` is "html.parser" (standard library) or "lxml" (faster, optional); lxml falls back
+    to html.parser when it is not installed.
+    """
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_TEXT_CHARS, backend: str = "html.parser"):
+        self.collector = _VisibleTextCollector(max_chars)
+        self.backend = backend if backend == "lxml" and lxml_available() else "html.parser"
+        if self.backend == "lxml":
+            from lxml import etree
+            self._parser = etree.HTMLParser(target=self.collector, recover=True)
+        else:
+            self._parser = _StdlibTextParser(self.collector)
+
+    @property
+    def done(self) -> bool:
+        return self.collector.done
+
+    def feed(self, html_chunk: str) -> bool:
+        """Parses one chunk. Returns True once enough text has been collected."""
+        if html_chunk and not self.done:
+            self._parser.feed(html_chunk)
+        return self.done
+
+    def close(self) -> str:
+        """Finishes parsing and returns the collected text."""
+        try:
+            self._parser.close()
+        except Exception:
+            # lxml raises on documents it could not make sense of; keep whatever was collected.
+            pass
+        return self.collector.close()
+
+
+def extract_visible_text(html: str, max_chars: int = DEFAULT_MAX_TEXT_CHARS, backend: str = "html.parser", chunk_chars: int = 65536) -> str:
+    """Extracts visible text from an already downloaded page (e.g. Selenium's page_source)."""
+    extractor = IncrementalTextExtractor(max_chars=max_chars, backend=backend)
+    for offset in range(0, len(html), chunk_chars):
+        if extractor.feed(html[offset:offset + chunk_chars]):
+            break
+    return extractor.close()
+
+
+def _incremental_decoder(encoding: Optional[str], first_chunk: bytes) -> "codecs.IncrementalDecoder":
+    """Uses the HTTP charset, else a <meta charset> near the top of the page, else UTF-8."""
+    if not encoding:
+        meta_match = META_CHARSET_PATTERN.search(first_chunk[:4096])
+        encoding = meta_match.group(1).decode("ascii") if meta_match else "utf-8"
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+def extract_text_from_byte_stream(
+    byte_chunks: Iterable[bytes],
+    encoding: Optional[str] = None,
+    max_bytes: int = DEFAULT_MAX_DOWNLOAD_BYTES,
+    max_chars: int = DEFAULT_MAX_TEXT_CHARS,
+    backend: str = "html.parser"
+) -> Tuple[str, int, bool]:
+    """
+    Decodes and parses a streamed HTML body chunk by chunk. Reading stops when `max_bytes`
+    have been consumed or `max_chars` of text have been collected, whichever comes first.
+    Returns (text, bytes_read, stopped_early).
+    """
+    decoder: Optional["codecs.IncrementalDecoder"] = None
+    extractor = IncrementalTextExtractor(max_chars=max_chars, backend=backend)
+    bytes_read = 0
+    stopped_early = False
+    for chunk in byte_chunks:
+        if decoder is None:
+            decoder = _incremental_decoder(encoding, chunk)
+        bytes_read += len(chunk)
+        if extractor.feed(decoder.decode(chunk)) or bytes_read >= max_bytes:
+            stopped_early = True
+            break
+    if decoder is not None and not stopped_early:
+        extractor.feed(decoder.decode(b"", final=True))
+    return extractor.close(), bytes_read, stopped_early
@@ -0,0 +1,47 @@
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    import httpx
+
+DEFAULT_HTTP_POOL_SIZE = 20
+
+REQUESTS_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+
+def http2_supported() -> bool:
+    """HTTP/2 in httpx needs the optional 'h2' package (`uv sync --extra http2`)."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_http_client(
+    log_callback: Callable[[str], None],
+    pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+    use_http2: bool = False,
+    timeout: float = 10
+) -> "httpx.Client":
+    """
+    Builds the single HTTP client shared by every page fetch of a run (and by all concurrent
+    workers), so keep-alive connections and TLS sessions are reused across rows, redirects
+    and `www.` variants. The client is thread-safe; close it when the run ends.
+    """
+    import httpx
+
+    if use_http2 and not http2_supported():
+        log_callback("⚠️ HTTP/2 requested but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+        use_http2 = False
+    pool_size = max(1, pool_size)
+    return httpx.Client(
+        headers=REQUESTS_HEADERS,
+        follow_redirects=True,
+        timeout=timeout,
+        http2=use_http2,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    )
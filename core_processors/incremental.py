@@ -0,0 +1,55 @@
+from typing import Any, Dict, List, Tuple
+
+from core_processors.job_journal import outputs_indicate_failure, ERROR_OUTPUT_PREFIXES
+
+INCREMENTAL_OFF = "off"                          # every row of the range is processed
+INCREMENTAL_NEW_AND_FAILED = "new_and_failed"    # rows without outputs or with error outputs
+INCREMENTAL_FAILED_ONLY = "failed_only"          # only rows with error outputs are re-driven
+INCREMENTAL_MODES = (INCREMENTAL_OFF, INCREMENTAL_NEW_AND_FAILED, INCREMENTAL_FAILED_ONLY)
+
+ROW_STATE_NEW = "new"            # no output written yet
+ROW_STATE_FAILED = "failed"      # an output matches the error markers
+ROW_STATE_DONE = "done"          # a result without errors is already in the sheet
+ROW_STATE_NO_INPUT = "no_input"  # empty input cell
+ROW_STATES = (ROW_STATE_NEW, ROW_STATE_FAILED, ROW_STATE_DONE, ROW_STATE_NO_INPUT)
+
+
+def row_state(input_value: Any, output_values: Tuple[Any, ...], error_markers: Tuple[str, ...] = ERROR_OUTPUT_PREFIXES) -> str:
+    if input_value is None or not str(input_value).strip():
+        return ROW_STATE_NO_INPUT
+    if outputs_indicate_failure(output_values, error_markers):
+        return ROW_STATE_FAILED
+    if all(value is None or not str(value).strip() for value in output_values):
+        return ROW_STATE_NEW
+    return ROW_STATE_DONE
+
+
+def select_incremental_rows(
+    sheet_rows: List[Tuple[int, Tuple[Any, ...]]],
+    incremental_mode: str,
+    error_markers: Tuple[str, ...] = ERROR_OUTPUT_PREFIXES
+) -> Tuple[List[Tuple[int, Any]], Dict[str, int]]:
+    """
+    Picks the rows an incremental run processes from (row index, (input, *outputs)) as returned
+    by sheets_utils.read_columns: rows without outputs and rows whose outputs match
+    `error_markers`, or only the latter with INCREMENTAL_FAILED_ONLY. Rows that already have a
+    result and rows without input are left alone.
+    Returns ([(row index, input)] to process, number of rows per state).
+    """
+    states_to_process = (ROW_STATE_FAILED,) if incremental_mode == INCREMENTAL_FAILED_ONLY else (ROW_STATE_NEW, ROW_STATE_FAILED)
+    rows_to_process: List[Tuple[int, Any]] = []
+    row_counts = dict.fromkeys(ROW_STATES, 0)
+    for row_index, (input_value, *output_values) in sheet_rows:
+        state = row_state(input_value, tuple(output_values), error_markers)
+        row_counts[state] += 1
+        if state in states_to_process:
+            rows_to_process.append((row_index, input_value))
+    return rows_to_process, row_counts
+
+
+def incremental_summary_line(row_counts: Dict[str, int], rows_to_process: int) -> str:
+    return (
+        f"{row_counts[ROW_STATE_NEW]} new, {row_counts[ROW_STATE_FAILED]} with errors, "
+        f"{row_counts[ROW_STATE_DONE]} already done, {row_counts[ROW_STATE_NO_INPUT]} without input; "
+        f"{rows_to_process} row(s) to process"
+    )
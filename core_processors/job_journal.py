@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_JOB_JOURNAL_PATH = os.path.join(".cache", "job_journal.sqlite3")
+
+ROW_STATUS_DONE = "done"            # outputs written to the sheet
+ROW_STATUS_PROCESSED = "processed"  # outputs computed, not yet confirmed as written
+ROW_STATUS_FAILED = "failed"        # error outputs; processed again when the job is resumed
+ROW_STATUS_SKIPPED = "skipped"      # empty input, nothing to write
+
+# Outputs starting with one of these mark a failed row; handlers may add their own "error_markers".
+ERROR_OUTPUT_PREFIXES = ("Error", "LLM Error", "Processing error", "Row setup error")
+
+
+def make_job_id(*job_identity: Any) -> str:
+    """
+    Derives a stable job ID from what identifies a job (sheet, worksheet, columns, prompt,
+    handler, model). The row range is deliberately left out so a job can be resumed with a
+    different start or end row.
+    """
+    return hashlib.sha256(json.dumps(job_identity, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def handler_error_markers(handler_config: Dict[str, Any]) -> Tuple[str, ...]:
+    """ERROR_OUTPUT_PREFIXES plus the prefixes the handler's config lists under "error_markers"."""
+    return tuple(dict.fromkeys((*ERROR_OUTPUT_PREFIXES, *(handler_config.get("error_markers") or ()))))
+
+
+def outputs_indicate_failure(outputs: Tuple[Any, ...], error_markers: Tuple[str, ...] = ERROR_OUTPUT_PREFIXES) -> bool:
+    return any(str(value).startswith(error_markers) for value in outputs if value is not None)
+
+
+class JobJournal:
+    """
+    SQLite checkpoint journal of one job's rows: status, outputs, attempts and processing time.
+
+    A row only becomes 'done' once the sheet writer confirms its cells were flushed, so after a
+    crash a resumed job skips exactly the rows that reached the sheet, rewrites rows whose
+    outputs were computed but never flushed, and processes failed and missing rows again.
+    Safe to share between worker threads.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        description: str = "",
+        db_path: str = DEFAULT_JOB_JOURNAL_PATH,
+        error_markers: Tuple[str, ...] = ERROR_OUTPUT_PREFIXES
+    ):
+        self.job_id = job_id
+        self.description = description
+        self.db_path = db_path
+        self.error_markers = error_markers
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._started_rows: Dict[int, Tuple[float, Any]] = {}
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " description TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_rows ("
+                " job_id TEXT NOT NULL,"
+                " row_index INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " input_value TEXT,"
+                " outputs_json TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " duration_seconds REAL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (job_id, row_index))"
+            )
+
+    def begin(self, resume: bool) -> Dict[str, int]:
+        """
+        Registers the job. Without `resume` any earlier journal of the same job is discarded.
+        Returns the row counts per status carried over from earlier runs.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            if not resume:
+                self._connection.execute("DELETE FROM job_rows WHERE job_id = ?", (self.job_id,))
+            self._connection.execute(
+                "INSERT INTO jobs (job_id, description, created_at, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET description = excluded.description, updated_at = excluded.updated_at",
+                (self.job_id, self.description, now, now)
+            )
+        return self.status_counts()
+
+    def resume_plan(self, start_row: int, end_row: int) -> Tuple[Set[int], Dict[int, Tuple[str, ...]]]:
+        """
+        Returns (rows that need no work, {row: outputs} computed earlier but never confirmed written)
+        for the given range. Every other row in the range has to be processed.
+        """
+        completed_rows: Set[int] = set()
+        unwritten_outputs: Dict[int, Tuple[str, ...]] = {}
+        with self._lock:
+            for row_index, status, outputs_json in self._connection.execute(
+                "SELECT row_index, status, outputs_json FROM job_rows WHERE job_id = ? AND row_index BETWEEN ? AND ?",
+                (self.job_id, start_row, end_row)
+            ):
+                if status in (ROW_STATUS_DONE, ROW_STATUS_SKIPPED):
+                    completed_rows.add(row_index)
+                elif status == ROW_STATUS_PROCESSED and outputs_json:
+                    unwritten_outputs[row_index] = tuple(json.loads(outputs_json))
+        return completed_rows, unwritten_outputs
+
+    def row_started(self, row_index: int, input_value: Any = None) -> None:
+        """Remembers when (and with which input) a row started, for its journal entry."""
+        with self._lock:
+            self._started_rows[row_index] = (time.monotonic(), input_value)
+
+    def record_row(self, row_index: int, outputs: Optional[Tuple[str, ...]]) -> str:
+        """
+        Records a row's outputs before they are written; None means the row had nothing to
+        process. Returns the status the row was given.
+        """
+        if outputs is None:
+            status, outputs_json = ROW_STATUS_SKIPPED, None
+        else:
+            status = ROW_STATUS_FAILED if outputs_indicate_failure(outputs, self.error_markers) else ROW_STATUS_PROCESSED
+            outputs_json = json.dumps([str(value) for value in outputs])
+        self._upsert_row(row_index, status, outputs_json)
+        return status
+
+    def mark_written(self, row_indexes: Iterable[int]) -> None:
+        """Called by the sheet writer after a successful flush."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE job_rows SET status = ?, updated_at = ? WHERE job_id = ? AND row_index = ? AND status = ?",
+                [(ROW_STATUS_DONE, now, self.job_id, row_index, ROW_STATUS_PROCESSED) for row_index in row_indexes]
+            )
+
+    def status_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT status, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY status", (self.job_id,)
+            ).fetchall())
+
+    def summary_line(self) -> str:
+        counts = self.status_counts()
+        parts: List[str] = [f"{counts.get(status, 0)} {status}" for status in (ROW_STATUS_DONE, ROW_STATUS_FAILED, ROW_STATUS_SKIPPED)]
+        if counts.get(ROW_STATUS_PROCESSED):
+            parts.append(f"{counts[ROW_STATUS_PROCESSED]} not yet written")
+        return ", ".join(parts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _upsert_row(self, row_index: int, status: str, outputs_json: Optional[str]) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            started_at, input_value = self._started_rows.pop(row_index, (None, None))
+            duration_seconds = time.monotonic() - started_at if started_at is not None else None
+            self._connection.execute(
+                "INSERT INTO job_rows (job_id, row_index, status, input_value, outputs_json, attempts, duration_seconds, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT(job_id, row_index) DO UPDATE SET status = excluded.status, input_value = excluded.input_value,"
+                " outputs_json = excluded.outputs_json, attempts = job_rows.attempts + 1,"
+                " duration_seconds = excluded.duration_seconds, updated_at = excluded.updated_at",
+                (self.job_id, row_index, status, None if input_value is None else str(input_value), outputs_json, duration_seconds, now)
+            )
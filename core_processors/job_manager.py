@@ -0,0 +1,192 @@
+import importlib
+import itertools
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+DEFAULT_MAX_CONCURRENT_JOBS = 1
+DEFAULT_MAX_LOG_LINES = 500
+DEFAULT_MAX_FINISHED_JOBS = 50
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+FINISHED_JOB_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+
+class BackgroundJob:
+    """State of one submitted run: status, progress, recent log lines and the run's result or error."""
+
+    def __init__(self, job_id: str, description: str, max_log_lines: int = DEFAULT_MAX_LOG_LINES):
+        self.job_id = job_id
+        self.description = description
+        self.status = JOB_STATUS_QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.rows_completed = 0
+        self.rows_total = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+        self._log_lines: Deque[str] = deque(maxlen=max_log_lines)
+        self._lock = threading.Lock()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATUSES
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def log(self, message: str) -> None:
+        with self._lock:
+            self._log_lines.append(message.strip())
+
+    def log_lines(self) -> List[str]:
+        with self._lock:
+            return list(self._log_lines)
+
+    def update_progress(self, rows_completed: int, rows_total: int) -> None:
+        self.rows_completed = rows_completed
+        self.rows_total = rows_total
+
+
+class JobManager:
+    """
+    Runs processor jobs in a background thread pool so the Streamlit script never blocks on them.
+
+    At most `max_concurrent_jobs` jobs run at the same time across all sessions and tabs of the
+    process; further jobs wait in the queue. Each job gets its own log buffer, progress counters
+    and cancel event, which the UI polls. Only the most recent `max_finished_jobs` finished jobs
+    are kept.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+        max_log_lines: int = DEFAULT_MAX_LOG_LINES,
+        max_finished_jobs: int = DEFAULT_MAX_FINISHED_JOBS
+    ):
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.max_log_lines = max_log_lines
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix="analysis_job")
+        self._jobs: Dict[str, BackgroundJob] = {}
+        self._lock = threading.Lock()
+        self._job_counter = itertools.count(1)
+
+    def submit(self, run_fn: Callable[..., Any], description: str, **run_kwargs: Any) -> str:
+        """
+        Queues `run_fn(**run_kwargs)` and returns the new job ID. The job's log_callback,
+        progress_callback and cancel_event are passed to `run_fn` as keyword arguments.
+        """
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._job_counter)}"
+        job = BackgroundJob(job_id, description, max_log_lines=self.max_log_lines)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._forget_old_jobs()
+        job.log(f"📥 Job {job_id} queued: {description}")
+        job.future = self._executor.submit(self._run_job, job, run_fn, run_kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[BackgroundJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[BackgroundJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted_at)
+
+    def active_job_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job outright, or asks a running one to stop after the rows in flight.
+        Returns False if the job is unknown or already finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = JOB_STATUS_CANCELLED
+            job.finished_at = time.time()
+            job.log("⏹️ Job cancelled before it started.")
+        else:
+            job.log("⏹️ Cancellation requested. Finishing the rows in flight...")
+        return True
+
+    def shutdown(self) -> None:
+        for job in self.list_jobs():
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_job(self, job: BackgroundJob, run_fn: Callable[..., Any], run_kwargs: Dict[str, Any]) -> None:
+        if job.cancel_event.is_set():
+            job.status = JOB_STATUS_CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = JOB_STATUS_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = run_fn(
+                log_callback=job.log,
+                progress_callback=job.update_progress,
+                cancel_event=job.cancel_event,
+                **run_kwargs
+            )
+            job.status = JOB_STATUS_CANCELLED if job.cancel_event.is_set() else JOB_STATUS_SUCCEEDED
+        except Exception as e:
+            job.error = f"{type(e).__name__} - {e}"
+            job.status = JOB_STATUS_FAILED
+            job.log(f"❌ FATAL ERROR DURING PROCESSING: {job.error}")
+            job.log(traceback.format_exc(limit=5))
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_old_jobs(self) -> None:
+        finished = sorted((job for job in self._jobs.values() if job.is_finished), key=lambda job: job.submitted_at)
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.job_id]
+
+
+def lazy_run_fn(module_name: str, function_name: str = "run_core_logic") -> Callable[..., Any]:
+    """
+    A run_fn for `submit` that imports `module_name` only when the job starts, in the job's
+    worker thread. Pages submit processors this way so that importing a page (on every rerun)
+    does not load the processors' heavy dependencies (openai, gspread, Selenium, ...).
+    """
+    def run_imported_fn(**run_kwargs: Any) -> Any:
+        return getattr(importlib.import_module(module_name), function_name)(**run_kwargs)
+
+    run_imported_fn.__qualname__ = run_imported_fn.__name__ = f"{module_name}.{function_name}"
+    return run_imported_fn
+
+
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the process-wide job manager, so every Streamlit session shares one queue and one
+    concurrency cap. The cap comes from the MAX_CONCURRENT_JOBS environment variable (default 1).
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(int(os.getenv("MAX_CONCURRENT_JOBS", DEFAULT_MAX_CONCURRENT_JOBS)))
+        return _job_manager
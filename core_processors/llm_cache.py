@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(".cache", "llm_cache.sqlite3")
+DEFAULT_LLM_CACHE_MAX_ENTRIES = 50000
+# The on-disk tier is trimmed back to max_entries every N writes rather than on every write.
+PRUNE_EVERY_N_PUTS = 100
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of LLM responses keyed by (model name, hash of the system prompt,
+    hash of the user message). Entries live in an in-memory LRU and, when `db_path` is set,
+    in an SQLite file so they survive restarts. Both tiers are bounded to `max_entries`;
+    the least recently used entries are evicted first. Safe to share between worker threads.
+    """
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_LLM_CACHE_PATH, max_entries: int = DEFAULT_LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_responses ("
+                    " cache_key TEXT PRIMARY KEY,"
+                    " model_name TEXT NOT NULL,"
+                    " response_text TEXT NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " last_used_at REAL NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used_at)"
+                )
+
+    @staticmethod
+    def make_key(model_name: str, system_prompt: str, user_message: str) -> str:
+        return hash_text("\x00".join((model_name, hash_text(system_prompt), hash_text(user_message))))
+
+    def get(self, model_name: str, system_prompt: str, user_message: str) -> Optional[str]:
+        return self.get_first(model_name, system_prompt, (user_message,))
+
+    def get_first(self, model_name: str, system_prompt: str, user_messages: Sequence[str]) -> Optional[str]:
+        """
+        The cached response of the first of `user_messages` that has one. Each message is looked
+        up once, and the call counts as a single hit or miss however many messages it tries.
+        """
+        with self._lock:
+            response_text = None
+            for user_message in user_messages:
+                response_text = self._lookup(self.make_key(model_name, system_prompt, user_message))
+                if response_text is not None:
+                    break
+
+            if response_text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response_text
+
+    def put(self, model_name: str, system_prompt: str, user_message: str, response_text: str) -> None:
+        cache_key = self.make_key(model_name, system_prompt, user_message)
+        with self._lock:
+            self._remember(cache_key, response_text)
+            if self._connection is None:
+                return
+            now = time.time()
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses (cache_key, model_name, response_text, created_at, last_used_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (cache_key, model_name, response_text, now, now)
+                )
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= PRUNE_EVERY_N_PUTS:
+                    self._puts_since_prune = 0
+                    self._prune_disk_tier()
+
+    def stats_line(self) -> str:
+        lookups = self.hits + self.misses
+        hit_ratio = (self.hits / lookups * 100) if lookups else 0.0
+        return f"{self.hits} hit(s), {self.misses} miss(es) ({hit_ratio:.0f}% hit ratio)"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                with self._connection:
+                    self._prune_disk_tier()
+                self._connection.close()
+                self._connection = None
+
+    def _lookup(self, cache_key: str) -> Optional[str]:
+        """Memory tier first, then the SQLite file. Must be called with the lock held."""
+        response_text = self._memory.get(cache_key)
+        if response_text is not None:
+            self._memory.move_to_end(cache_key)
+        elif self._connection is not None:
+            row = self._connection.execute(
+                "SELECT response_text FROM llm_responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None:
+                response_text = row[0]
+                with self._connection:
+                    self._connection.execute(
+                        "UPDATE llm_responses SET last_used_at = ? WHERE cache_key = ?", (time.time(), cache_key)
+                    )
+                self._remember(cache_key, response_text)
+        return response_text
+
+    def _remember(self, cache_key: str, response_text: str) -> None:
+        self._memory[cache_key] = response_text
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk_tier(self) -> None:
+        self._connection.execute(
+            "DELETE FROM llm_responses WHERE cache_key IN ("
+            " SELECT cache_key FROM llm_responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
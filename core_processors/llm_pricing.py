@@ -0,0 +1,49 @@
+from typing import Any, Dict, Optional, Tuple
+
+from core_processors.llm_cache import hash_text
+
+# USD per million tokens: (uncached input, cached input, output). Update when OpenAI's prices change.
+MODEL_PRICES_PER_MILLION_TOKENS: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+# Batch API requests are billed at half the synchronous price.
+BATCH_PRICE_FACTOR = 0.5
+# OpenAI only caches prompt prefixes of at least this many tokens (then in steps of 128).
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens served from OpenAI's prompt cache (`usage.prompt_tokens_details.cached_tokens`)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def call_cost_usd(model_name: str, usage: Any, batch: bool = False) -> Optional[float]:
+    """Estimated cost of one call from its usage, or None for models without a known price."""
+    prices = MODEL_PRICES_PER_MILLION_TOKENS.get(model_name)
+    if prices is None or usage is None:
+        return None
+    input_price, cached_input_price, output_price = prices
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    cached_tokens = min(cached_prompt_tokens(usage), prompt_tokens)
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    cost = ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_input_price + completion_tokens * output_price) / 1_000_000
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+
+def prompt_fingerprint(prompt_content: str) -> str:
+    """Short content hash identifying the exact system prompt a job was run with."""
+    return hash_text(prompt_content)[:12]
+
+
+def prompt_changed_on_disk(prompt_path: str, fingerprint: str) -> bool:
+    """True if the prompt file no longer matches the content a running job froze at start."""
+    try:
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            return prompt_fingerprint(f.read()) != fingerprint
+    except OSError:
+        return False
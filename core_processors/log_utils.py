@@ -0,0 +1,32 @@
+import queue
+import threading
+from typing import Callable
+
+
+class ThreadSafeLogCallback:
+    """
+    Wraps a `log_callback` that may only be called from the thread that created it
+    (e.g. a Streamlit UI callback). Messages logged from worker threads are queued
+    and delivered the next time the owner thread logs or calls `drain()`.
+    """
+
+    def __init__(self, log_callback: Callable[[str], None]):
+        self._log_callback = log_callback
+        self._owner_thread_id = threading.get_ident()
+        self._pending: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+
+    def __call__(self, message: str) -> None:
+        if threading.get_ident() != self._owner_thread_id:
+            self._pending.put(message)
+            return
+        self.drain()
+        self._log_callback(message)
+
+    def drain(self) -> None:
+        """Delivers all messages queued by worker threads. Must be called from the owner thread."""
+        while True:
+            try:
+                message = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            self._log_callback(message)
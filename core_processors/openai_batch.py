@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from core_processors.retry_policy import RetryPolicy, call_with_retries
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+DEFAULT_BATCH_POLL_INTERVAL_SECONDS = 30.0
+# OpenAI accepts up to 50,000 requests (and 200 MB) per batch input file.
+DEFAULT_MAX_REQUESTS_PER_BATCH = 50000
+DEFAULT_MAX_BATCH_FILE_BYTES = 150 * 1024 * 1024
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# row index -> (completion, None) on success or (None, error description) on failure
+BatchResults = Dict[int, Tuple[Optional[ChatCompletion], Optional[str]]]
+
+
+def custom_id_for_row(row_index: int) -> str:
+    return f"row-{row_index}"
+
+
+def row_for_custom_id(custom_id: str) -> Optional[int]:
+    try:
+        return int(custom_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def build_batch_lines(
+    requests_by_row: Dict[int, List[Dict[str, str]]],
+    model_name: str,
+    request_options: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """One JSONL line per row: the same chat request the synchronous modes would send."""
+    return [
+        json.dumps({
+            "custom_id": custom_id_for_row(row_index),
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": model_name, "messages": messages, **(request_options or {})}
+        })
+        for row_index, messages in sorted(requests_by_row.items())
+    ]
+
+
+def split_batch_lines(lines: List[str], max_requests: int, max_bytes: int) -> List[List[str]]:
+    """Splits request lines into input files that stay within the batch size limits."""
+    parts: List[List[str]] = []
+    current: List[str] = []
+    current_bytes = 0
+    for line in lines:
+        line_bytes = len(line.encode("utf-8")) + 1
+        if current and (len(current) >= max_requests or current_bytes + line_bytes > max_bytes):
+            parts.append(current)
+            current, current_bytes = [], 0
+        current.append(line)
+        current_bytes += line_bytes
+    if current:
+        parts.append(current)
+    return parts
+
+
+def parse_batch_output(output_text: str) -> BatchResults:
+    """Maps the lines of a batch output or error file back to rows."""
+    results: BatchResults = {}
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        row_index = row_for_custom_id(str(record.get("custom_id", "")))
+        if row_index is None:
+            continue
+        response = record.get("response") or {}
+        error = record.get("error")
+        if response.get("status_code") == 200 and response.get("body"):
+            results[row_index] = (ChatCompletion.model_validate(response["body"]), None)
+        elif error:
+            results[row_index] = (None, str(error.get("code") or error.get("message") or error))
+        else:
+            body_error = (response.get("body") or {}).get("error") or {}
+            results[row_index] = (None, str(body_error.get("code") or body_error.get("type") or f"HTTP {response.get('status_code')}"))
+    return results
+
+
+def run_chat_batch(
+    openai_client: OpenAI,
+    requests_by_row: Dict[int, List[Dict[str, str]]],
+    model_name: str,
+    log_callback: Callable[[str], None],
+    request_options: Optional[Dict[str, Any]] = None,
+    poll_interval_seconds: float = DEFAULT_BATCH_POLL_INTERVAL_SECONDS,
+    max_requests_per_batch: int = DEFAULT_MAX_REQUESTS_PER_BATCH,
+    max_batch_file_bytes: int = DEFAULT_MAX_BATCH_FILE_BYTES,
+    cancel_event: Optional[threading.Event] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    batch_ids: Optional[List[str]] = None
+) -> BatchResults:
+    """
+    Sends the rows' chat requests through the OpenAI Batch API: writes them to JSONL input files,
+    submits one batch per file, polls until every batch has finished and returns the result of
+    each row. Rows without a result (expired or cancelled batches) are reported as errors.
+    Setting `cancel_event` cancels the submitted batches; results finished before that are kept.
+    `openai_client` can point at any server implementing the files and batches endpoints
+    (e.g. a local stand-in via its base_url).
+    Polling, cancelling and downloading results go through `retry_policy`, so a transient error
+    during the (up to 24 h) wait does not abandon the submitted batches. If the batches are lost track of anyway, their IDs
+    are logged; passing them as `batch_ids` collects their results instead of submitting the
+    requests again.
+    """
+    retry_policy = retry_policy or RetryPolicy()
+
+    def with_retries(call: Callable[[], Any]) -> Any:
+        return call_with_retries(call, retry_policy, log_callback=log_callback)
+
+    if batch_ids:
+        batch_ids = list(batch_ids)
+        log_callback(f"📦 Collecting the results of {len(batch_ids)} batch(es) submitted earlier: {', '.join(batch_ids)}.")
+    else:
+        batch_ids = []
+        lines = build_batch_lines(requests_by_row, model_name, request_options)
+        for part_number, part_lines in enumerate(split_batch_lines(lines, max_requests_per_batch, max_batch_file_bytes), start=1):
+            # Not retried: a create that timed out may still have gone through and would be billed twice.
+            input_file = openai_client.files.create(
+                file=(f"batch_requests_{part_number}.jsonl", ("\n".join(part_lines) + "\n").encode("utf-8"), "application/jsonl"),
+                purpose="batch"
+            )
+            batch = openai_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW
+            )
+            batch_ids.append(batch.id)
+            log_callback(f"📦 Submitted batch {batch.id} with {len(part_lines)} request(s) (input file {input_file.id}).")
+
+    try:
+        return _collect_batch_results(openai_client, batch_ids, requests_by_row, with_retries, log_callback, poll_interval_seconds, cancel_event)
+    except Exception as e_poll:
+        log_callback(
+            f"❌ Lost track of batch(es) {', '.join(batch_ids)}: {type(e_poll).__name__} - {e_poll}. They keep running on OpenAI; "
+            f"run the job again with openai_batch_ids={json.dumps(batch_ids)} to collect their results without resubmitting."
+        )
+        raise
+
+
+def _collect_batch_results(
+    openai_client: OpenAI,
+    batch_ids: List[str],
+    requests_by_row: Dict[int, List[Dict[str, str]]],
+    with_retries: Callable[[Callable[[], Any]], Any],
+    log_callback: Callable[[str], None],
+    poll_interval_seconds: float,
+    cancel_event: Optional[threading.Event]
+) -> BatchResults:
+    """Polls `batch_ids` until every batch has finished and returns the result of each row."""
+    finished_batches: Dict[str, Any] = {}
+    cancel_requested = False
+    while len(finished_batches) < len(batch_ids):
+        if cancel_event is not None and cancel_event.is_set() and not cancel_requested:
+            cancel_requested = True
+            for batch_id in batch_ids:
+                if batch_id not in finished_batches:
+                    with_retries(lambda: openai_client.batches.cancel(batch_id))
+            log_callback("⏹️ Cancellation requested. Cancelling the submitted batch(es); finished results are kept.")
+        for batch_id in batch_ids:
+            if batch_id in finished_batches:
+                continue
+            batch = with_retries(lambda: openai_client.batches.retrieve(batch_id))
+            counts = batch.request_counts
+            progress = f"{counts.completed + counts.failed}/{counts.total} request(s) done" if counts else "no progress reported yet"
+            log_callback(f"⏳ Batch {batch_id}: {batch.status}, {progress}.")
+            if batch.status in BATCH_FINAL_STATUSES:
+                finished_batches[batch_id] = batch
+        if len(finished_batches) < len(batch_ids):
+            if cancel_event is not None and not cancel_requested:
+                cancel_event.wait(poll_interval_seconds)
+            else:
+                time.sleep(min(poll_interval_seconds, 5.0) if cancel_requested else poll_interval_seconds)
+
+    results: BatchResults = {}
+    unrequested_rows = 0
+    for batch_id, batch in finished_batches.items():
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                for row_index, row_result in parse_batch_output(with_retries(lambda: openai_client.files.content(file_id)).text).items():
+                    # Batches submitted by an earlier run may cover rows this run did not ask for.
+                    if row_index in requests_by_row:
+                        results[row_index] = row_result
+                    else:
+                        unrequested_rows += 1
+        if batch.status != "completed":
+            log_callback(f"⚠️ Batch {batch_id} ended with status '{batch.status}'.")
+    if unrequested_rows:
+        log_callback(f"ℹ️ Ignored {unrequested_rows} batch result(s) for rows outside this run.")
+    for row_index in requests_by_row:
+        results.setdefault(row_index, (None, "BatchNoResult"))
+    return results
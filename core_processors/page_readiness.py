@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Any, Dict
+
+from selenium.common.exceptions import JavascriptException
+
+DEFAULT_MAX_WAIT_SECONDS = 15.0
+DEFAULT_MIN_TEXT_LENGTH = 200
+
+# Installs a MutationObserver on first call and reports the signals used to decide readiness.
+READINESS_PROBE_JS = """
+if (!window.__readinessProbe) {
+    window.__readinessProbe = {lastMutation: performance.now()};
+    new MutationObserver(function () {
+        window.__readinessProbe.lastMutation = performance.now();
+    }).observe(document.documentElement || document, {childList: true, subtree: true, characterData: true});
+}
+var lastNetworkActivity = 0;
+var resources = performance.getEntriesByType('resource');
+for (var i = 0; i < resources.length; i++) {
+    var finishedAt = resources[i].responseEnd || resources[i].startTime;
+    if (finishedAt > lastNetworkActivity) { lastNetworkActivity = finishedAt; }
+}
+var now = performance.now();
+return {
+    readyState: document.readyState,
+    title: document.title || '',
+    textLength: document.body ? (document.body.innerText || '').length : 0,
+    msSinceMutation: now - window.__readinessProbe.lastMutation,
+    msSinceNetwork: now - lastNetworkActivity
+};
+"""
+
+
+def is_challenge_page(title: str) -> bool:
+    return "Just a moment..." in title or "Cloudflare" in title
+
+
+def wait_for_page_ready(
+    driver: Any,
+    max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+    min_text_length: int = DEFAULT_MIN_TEXT_LENGTH,
+    quiet_period_seconds: float = 0.5,
+    settle_seconds: float = 2.0,
+    poll_interval_seconds: float = 0.1
+) -> Dict[str, Any]:
+    """
+    Waits after `driver.get()` until the page looks rendered instead of sleeping a fixed time.
+
+    A page is ready when document.readyState is 'complete', neither the DOM nor the network
+    has changed for `quiet_period_seconds`, no Cloudflare challenge is showing, and either the
+    body holds at least `min_text_length` characters of text or the page has stayed quiet for
+    `settle_seconds` (short pages that will never reach the threshold).
+    Never waits longer than `max_wait_seconds`.
+    Returns {"waited_seconds": float, "timed_out": bool, "text_length": int}.
+    """
+    started_at = time.monotonic()
+    deadline = started_at + max_wait_seconds
+    quiet_ms = quiet_period_seconds * 1000
+    settle_ms = settle_seconds * 1000
+    text_length = 0
+
+    while True:
+        try:
+            state = driver.execute_script(READINESS_PROBE_JS) or {}
+        except JavascriptException:
+            state = {}
+
+        text_length = int(state.get("textLength") or 0)
+        quiet_for_ms = min(state.get("msSinceMutation") or 0, state.get("msSinceNetwork") or 0)
+        ready = (
+            state.get("readyState") == "complete"
+            and not is_challenge_page(state.get("title", ""))
+            and quiet_for_ms >= quiet_ms
+            and (text_length >= min_text_length or quiet_for_ms >= settle_ms)
+        )
+        now = time.monotonic()
+        if ready or now >= deadline:
+            return {"waited_seconds": now - started_at, "timed_out": not ready, "text_length": text_length}
+        time.sleep(min(poll_interval_seconds, max(0.0, deadline - now)))
+
+
+class ReadinessStats:
+    """Thread-safe running totals of readiness waits, for the end-of-run report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.timed_out_pages = 0
+        self.total_wait_seconds = 0.0
+
+    def record(self, wait_result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.pages += 1
+            self.total_wait_seconds += wait_result["waited_seconds"]
+            if wait_result["timed_out"]:
+                self.timed_out_pages += 1
+
+    @property
+    def average_wait_seconds(self) -> float:
+        with self._lock:
+            return self.total_wait_seconds / self.pages if self.pages else 0.0
@@ -0,0 +1,181 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_OPENAI_REQUESTS_PER_MINUTE = 500
+DEFAULT_OPENAI_TOKENS_PER_MINUTE = 200000
+DEFAULT_SHEETS_READS_PER_MINUTE = 60
+DEFAULT_SHEETS_WRITES_PER_MINUTE = 60
+# Completion tokens reserved per request until the real count arrives in completion.usage.
+DEFAULT_EXPECTED_COMPLETION_TOKENS = 200
+DEFAULT_MAX_RATE_LIMIT_RETRIES = 5
+
+# After a 429 the rate is halved (down to MIN_RATE_FRACTION of the ceiling); every successful
+# call then wins back RECOVERY_STEP of the ceiling, so throughput climbs back once quota recovers.
+# Requests already in flight when the limit was hit usually get 429s too, so the rate is lowered
+# at most once per DECREASE_COOLDOWN_SECONDS.
+RATE_DECREASE_FACTOR = 0.5
+RECOVERY_STEP = 0.02
+MIN_RATE_FRACTION = 0.05
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+class _TokenBucket:
+    """A bucket refilled at `per_minute` units per minute that may go into debt when reserved."""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.burst_seconds = burst_seconds
+        self.rate_per_second = per_minute / 60.0
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.rate_per_second * self.burst_seconds)
+
+    def set_rate(self, per_minute: float, now: float) -> None:
+        self.refill(now)
+        self.rate_per_second = per_minute / 60.0
+        self.level = min(self.level, self.capacity)
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` units and returns how long the caller has to wait for them."""
+        self.refill(now)
+        self.level -= amount
+        return -self.level / self.rate_per_second if self.level < 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Thread-safe, adaptive token-bucket limiter for a single backend (OpenAI, Google Sheets, ...),
+    shared by every worker that talks to it.
+
+    Calls are limited to `max_calls_per_minute` and, if `max_tokens_per_minute` is set, to that
+    many tokens per minute (callers reserve an estimate and correct it with `record_tokens`).
+    `report_rate_limited()` after a 429 halves the rate and honours Retry-After by pausing all
+    callers; `report_success()` raises the rate again step by step up to the configured ceiling.
+    """
+
+    def __init__(
+        self,
+        max_calls_per_minute: float,
+        max_tokens_per_minute: float = 0,
+        burst_seconds: float = 1.0
+    ):
+        self.max_calls_per_minute = max_calls_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.rate_fraction = 1.0
+        self.calls = 0
+        self.rate_limited_responses = 0
+        self.total_wait_seconds = 0.0
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._last_decrease_at: Optional[float] = None
+        self._buckets: Dict[str, _TokenBucket] = {}
+        if max_calls_per_minute > 0:
+            self._buckets["calls"] = _TokenBucket(max_calls_per_minute, burst_seconds)
+        if max_tokens_per_minute > 0:
+            self._buckets["tokens"] = _TokenBucket(max_tokens_per_minute, burst_seconds)
+
+    @property
+    def current_calls_per_minute(self) -> float:
+        return self.max_calls_per_minute * self.rate_fraction
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Claims a slot for one call (and `tokens` tokens) without blocking.
+        Returns the number of seconds the caller must wait before starting it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            waits: List[float] = [self._paused_until - now]
+            if "calls" in self._buckets:
+                waits.append(self._buckets["calls"].reserve(1, now))
+            if tokens and "tokens" in self._buckets:
+                waits.append(self._buckets["tokens"].reserve(tokens, now))
+            wait_seconds = max(0.0, *waits)
+            self.calls += 1
+            self.total_wait_seconds += wait_seconds
+        return wait_seconds
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Blocks until the caller is allowed to start its call.
+        Returns the number of seconds the caller had to wait.
+        """
+        wait_seconds = self.reserve(tokens)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def record_tokens(self, reserved_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Corrects a reservation once the call reports how many tokens it really used."""
+        if actual_tokens is None or "tokens" not in self._buckets:
+            return
+        with self._lock:
+            self._buckets["tokens"].level += reserved_tokens - actual_tokens
+
+    def report_rate_limited(self, retry_after_seconds: Optional[float] = None) -> None:
+        """Slows down after a 429; with Retry-After every caller pauses that long."""
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited_responses += 1
+            if self._last_decrease_at is None or now - self._last_decrease_at >= DECREASE_COOLDOWN_SECONDS:
+                self._last_decrease_at = now
+                self._set_rate_fraction(max(MIN_RATE_FRACTION, self.rate_fraction * RATE_DECREASE_FACTOR), now)
+            if retry_after_seconds:
+                self._paused_until = max(self._paused_until, now + retry_after_seconds)
+
+    def report_success(self) -> None:
+        if self.rate_fraction >= 1.0:
+            return
+        with self._lock:
+            self._set_rate_fraction(min(1.0, self.rate_fraction + RECOVERY_STEP), time.monotonic())
+
+    def stats_line(self) -> str:
+        return (
+            f"{self.calls} call(s), {self.total_wait_seconds:.1f} s spent waiting, {self.rate_limited_responses} rate-limit response(s), "
+            f"now at {self.current_calls_per_minute:.0f}/{self.max_calls_per_minute:.0f} calls per minute"
+        )
+
+    def _set_rate_fraction(self, rate_fraction: float, now: float) -> None:
+        self.rate_fraction = rate_fraction
+        if "calls" in self._buckets:
+            self._buckets["calls"].set_rate(self.max_calls_per_minute * rate_fraction, now)
+        if "tokens" in self._buckets:
+            self._buckets["tokens"].set_rate(self.max_tokens_per_minute * rate_fraction, now)
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]], expected_completion_tokens: int = DEFAULT_EXPECTED_COMPLETION_TOKENS) -> int:
+    """Rough token estimate of a chat request (about 4 characters per token) for the token bucket."""
+    return sum(len(message.get("content") or "") // 4 + 4 for message in messages) + expected_completion_tokens
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for HTTP 429 errors from the OpenAI SDK, gspread or httpx, except an exhausted OpenAI quota."""
+    return error_status_code(error) == 429 and getattr(error, "code", None) != "insufficient_quota"
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The Retry-After (or OpenAI's retry-after-ms) of a failed call's response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000.0
+        retry_after = headers.get("Retry-After")
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """The HTTP status code of a failed call (OpenAI SDK, gspread or httpx error), if any."""
+    status_code: Any = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
@@ -0,0 +1,259 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+from openai import APIConnectionError
+
+from core_processors.rate_limiter import RateLimiter, error_status_code, is_rate_limit_error, retry_after_seconds
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_BACKOFF_SECONDS = 1.0
+DEFAULT_MAX_BACKOFF_SECONDS = 30.0
+# Retries may add at most this share of the first attempts (plus DEFAULT_MIN_RETRY_BUDGET), so an
+# outage cannot multiply the load on the API.
+DEFAULT_RETRY_BUDGET_RATIO = 0.2
+DEFAULT_MIN_RETRY_BUDGET = 10
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 5
+DEFAULT_CIRCUIT_RESET_SECONDS = 30.0
+
+TRANSIENT_STATUS_CODES = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API that has failed too many times in a row."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Timeouts, connection problems, 408/409/429 and 5xx responses are worth retrying."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, APIConnectionError, httpx.TransportError)):
+        return True
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    status_code = error_status_code(error)
+    return status_code is not None and (status_code in TRANSIENT_STATUS_CODES or status_code >= 500)
+
+
+class RetryPolicy:
+    """
+    Retry policy for one backend, shared by every worker of a run.
+
+    Transient failures are retried up to `max_retries` times with exponential backoff and full
+    jitter (or Retry-After, when the response carries one). All retries of the run draw from a
+    common budget of `min_retry_budget` plus `retry_budget_ratio` of the calls made. After
+    `circuit_failure_threshold` calls in a row have failed for good, the circuit opens and calls
+    fail fast with CircuitOpenError for `circuit_reset_seconds`; then one trial call is let
+    through, and the circuit closes again if it succeeds.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_backoff_seconds: float = DEFAULT_BASE_BACKOFF_SECONDS,
+        max_backoff_seconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+        retry_budget_ratio: float = DEFAULT_RETRY_BUDGET_RATIO,
+        min_retry_budget: int = DEFAULT_MIN_RETRY_BUDGET,
+        circuit_failure_threshold: int = DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+        circuit_reset_seconds: float = DEFAULT_CIRCUIT_RESET_SECONDS
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retry_budget_ratio = retry_budget_ratio
+        self.min_retry_budget = min_retry_budget
+        self.circuit_failure_threshold = max(1, circuit_failure_threshold)
+        self.circuit_reset_seconds = circuit_reset_seconds
+        self.calls = 0
+        self.retries = 0
+        self.recovered_calls = 0
+        self.failed_calls = 0
+        self.rejected_calls = 0
+        self._consecutive_failures = 0
+        self._circuit_open_until: Optional[float] = None
+        self._trial_call_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def circuit_open(self) -> bool:
+        return self._circuit_open_until is not None
+
+    def before_call(self) -> bool:
+        """
+        Counts a new call, or raises CircuitOpenError while the circuit is open. Returns True if
+        the call is the trial call of a half-open circuit.
+        """
+        with self._lock:
+            trial_call = False
+            if self._circuit_open_until is not None:
+                if time.monotonic() < self._circuit_open_until or self._trial_call_in_flight:
+                    self.rejected_calls += 1
+                    raise CircuitOpenError(f"API unavailable after {self._consecutive_failures} failed calls in a row; not calling it for now.")
+                # Half-open: let one trial call through.
+                self._trial_call_in_flight = trial_call = True
+            self.calls += 1
+            return trial_call
+
+    def release_trial_call(self) -> None:
+        """
+        Ends a trial call. One that stopped without a success or failure (e.g. it was cancelled)
+        leaves the circuit half-open, so the next call becomes the trial.
+        """
+        with self._lock:
+            self._trial_call_in_flight = False
+
+    def retry_delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """
+        Seconds to wait before retrying after the `attempt`-th failure (0-based) of a call,
+        or None if the error is not transient, the call is out of attempts or the budget is spent.
+        """
+        if attempt >= self.max_retries or not is_transient_error(error):
+            return None
+        with self._lock:
+            if self.retries >= self.min_retry_budget + self.retry_budget_ratio * self.calls:
+                return None
+            self.retries += 1
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        return random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt)))
+
+    def record_success(self, retried: bool) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._circuit_open_until = None
+            self._trial_call_in_flight = False
+            if retried:
+                self.recovered_calls += 1
+
+    def record_failure(self, transient: bool) -> bool:
+        """
+        Records a call that failed for good. Only transient failures count towards opening the
+        circuit; any other error shows the API is reachable. Returns True if this opened the circuit.
+        """
+        with self._lock:
+            self.failed_calls += 1
+            if not transient:
+                self._consecutive_failures = 0
+                self._circuit_open_until = None
+                self._trial_call_in_flight = False
+                return False
+            self._consecutive_failures += 1
+            reopening = self._trial_call_in_flight
+            self._trial_call_in_flight = False
+            if reopening or (self._circuit_open_until is None and self._consecutive_failures >= self.circuit_failure_threshold):
+                self._circuit_open_until = time.monotonic() + self.circuit_reset_seconds
+                return True
+            return False
+
+    def stats_line(self) -> str:
+        circuit_note = ", circuit open" if self.circuit_open else ""
+        return (
+            f"{self.calls} call(s), {self.retries} retried attempt(s), {self.recovered_calls} call(s) recovered after a retry, "
+            f"{self.failed_calls} failed, {self.rejected_calls} rejected by the circuit breaker{circuit_note}"
+        )
+
+
+def call_with_retries(
+    call: Callable[[], T],
+    retry_policy: RetryPolicy,
+    rate_limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    log_callback: Optional[Callable[[str], None]] = None
+) -> T:
+    """
+    Runs `call()` under `retry_policy`, paced by `rate_limiter` if given. 429 responses also slow
+    the limiter down; token usage from the result's `usage` corrects the `tokens` estimate.
+    `on_retry(attempt, error)` is called before each retry. The last error is raised if every
+    attempt fails, and CircuitOpenError while the API is considered down.
+    """
+    trial_call = retry_policy.before_call()
+    try:
+        attempt = 0
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire(tokens)
+            try:
+                result = call()
+            except Exception as error:
+                delay = _handle_failed_attempt(retry_policy, rate_limiter, attempt, error, on_retry, log_callback)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            _handle_success(retry_policy, rate_limiter, result, tokens, attempt)
+            return result
+    finally:
+        if trial_call:
+            retry_policy.release_trial_call()
+
+
+async def async_call_with_retries(
+    call: Callable[[], Awaitable[T]],
+    retry_policy: RetryPolicy,
+    rate_limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    log_callback: Optional[Callable[[str], None]] = None
+) -> T:
+    """`call_with_retries` for coroutines; backoff and rate-limit waits do not block the event loop."""
+    trial_call = retry_policy.before_call()
+    try:
+        attempt = 0
+        while True:
+            if rate_limiter is not None:
+                wait_seconds = rate_limiter.reserve(tokens)
+                if wait_seconds > 0:
+                    await asyncio.sleep(wait_seconds)
+            try:
+                result = await call()
+            except Exception as error:
+                delay = _handle_failed_attempt(retry_policy, rate_limiter, attempt, error, on_retry, log_callback)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            _handle_success(retry_policy, rate_limiter, result, tokens, attempt)
+            return result
+    finally:
+        if trial_call:
+            retry_policy.release_trial_call()
+
+
+def _handle_failed_attempt(
+    retry_policy: RetryPolicy,
+    rate_limiter: Optional[RateLimiter],
+    attempt: int,
+    error: Exception,
+    on_retry: Optional[Callable[[int, BaseException], None]],
+    log_callback: Optional[Callable[[str], None]]
+) -> Optional[float]:
+    """Returns the delay before the next attempt, or None once the call has failed for good."""
+    rate_limited = is_rate_limit_error(error)
+    delay = retry_policy.retry_delay(attempt, error)
+    if rate_limited and rate_limiter is not None:
+        # Every caller pauses, not just this one; the limiter then takes care of the wait.
+        rate_limiter.report_rate_limited(delay)
+    if delay is None:
+        if retry_policy.record_failure(transient=is_transient_error(error)) and log_callback:
+            log_callback(f"⛔ Circuit breaker opened: the API failed {retry_policy.circuit_failure_threshold} call(s) in a row. Calls fail fast for {retry_policy.circuit_reset_seconds:.0f} s.")
+        return None
+    if on_retry:
+        on_retry(attempt, error)
+    if log_callback:
+        log_callback(f"⏳ Transient error ({type(error).__name__}). Retrying in {delay:.1f} s (retry {attempt + 1}/{retry_policy.max_retries})...")
+    return 0.0 if rate_limited and rate_limiter is not None else delay
+
+
+def _handle_success(retry_policy: RetryPolicy, rate_limiter: Optional[RateLimiter], result: Any, tokens: int, attempt: int) -> None:
+    retry_policy.record_success(retried=attempt > 0)
+    if rate_limiter is not None:
+        rate_limiter.report_success()
+        if tokens:
+            rate_limiter.record_tokens(tokens, getattr(getattr(result, "usage", None), "total_tokens", None))
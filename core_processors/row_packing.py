@@ -0,0 +1,61 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_ROWS_PER_REQUEST = 1
+MAX_ROWS_PER_REQUEST = 50
+# Packed requests ask for a JSON object, so the reply can be split back into rows reliably.
+PACKED_RESPONSE_FORMAT = {"type": "json_object"}
+# Item responses split out of a packed reply are cached under the single-row message with this
+# prefix: they were answered under the packing instruction, so only packed runs reuse them.
+PACKED_CACHE_KEY_PREFIX = "[packed item] "
+
+
+def item_id_for_row(row_index: int) -> str:
+    return f"row-{row_index}"
+
+
+def chunk_items(items: List[Tuple[int, str]], rows_per_request: int) -> List[List[Tuple[int, str]]]:
+    """Splits (row index, input) pairs into packs of at most `rows_per_request` items."""
+    rows_per_request = max(1, min(rows_per_request, MAX_ROWS_PER_REQUEST))
+    return [items[start:start + rows_per_request] for start in range(0, len(items), rows_per_request)]
+
+
+def build_packed_user_message(items: Sequence[Tuple[int, str]]) -> str:
+    """
+    One user message carrying several inputs. The system prompt is sent once for the whole pack;
+    the model is asked for the response it would give each input on its own, keyed by item ID.
+    """
+    packed_inputs = [{"id": item_id_for_row(row_index), "input": item_input} for row_index, item_input in items]
+    return (
+        "Please process each of the following inputs independently, based on your instructions. "
+        "Reply only with a JSON object of the form "
+        '{"results": [{"id": "<id of the input>", "response": <your complete response for that input, exactly as you would give it for that input alone>}]}, '
+        "with exactly one entry per input and the ids unchanged. Inputs:\n"
+        + json.dumps(packed_inputs, ensure_ascii=False)
+    )
+
+
+def parse_packed_response(response_text: str, item_ids: Sequence[str]) -> Dict[str, str]:
+    """
+    Maps item ID -> the model's response for that item. Responses that are objects or lists are
+    returned as JSON text, so handlers parse them the same way as a single-row reply.
+    Items missing from the reply (or a reply that is not valid JSON) are simply left out.
+    """
+    try:
+        parsed: Any = json.loads(response_text)
+    except (TypeError, ValueError):
+        return {}
+    results = parsed.get("results") if isinstance(parsed, dict) else parsed
+    if not isinstance(results, list):
+        return {}
+    expected_ids = set(item_ids)
+    responses: Dict[str, str] = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        item_id = str(result.get("id", ""))
+        item_response: Optional[Any] = result.get("response")
+        if item_id not in expected_ids or item_id in responses or item_response is None:
+            continue
+        responses[item_id] = item_response if isinstance(item_response, str) else json.dumps(item_response, ensure_ascii=False)
+    return responses
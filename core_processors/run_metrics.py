@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from core_processors.llm_pricing import cached_prompt_tokens, call_cost_usd, MODEL_PRICES_PER_MILLION_TOKENS
+
+STAGE_FETCH = "fetch"    # Requests download and streaming text extraction
+STAGE_RENDER = "render"  # Selenium fallback: page load, readiness wait and text extraction
+STAGE_CLEAN = "clean"    # whitespace normalisation and truncation before the LLM
+STAGE_LLM = "llm"        # the OpenAI request itself
+STAGE_PARSE = "parse"    # the handler's process_llm_response (and cache bookkeeping)
+STAGE_WRITE = "write"    # queueing the row's cells plus its share of the batched sheet writes
+STAGES = (STAGE_FETCH, STAGE_RENDER, STAGE_CLEAN, STAGE_LLM, STAGE_PARSE, STAGE_WRITE)
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+CACHED_TOKENS_FIELD = "cached_tokens"  # prompt tokens served from OpenAI's prompt cache
+COST_FIELD = "cost_usd"
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class RunMetrics:
+    """
+    Structured per-row, per-stage timings and token counts of one run.
+
+    Stages are timed with `stage(row_index, name)`; the same stage may be timed several times
+    for a row and the durations add up. Token counts are taken from `completion.usage`; retried
+    LLM attempts are counted so recovered calls show up in the summary. With a priced
+    `model_name` each call's estimated cost is added up as well, cached prompt tokens and Batch
+    API calls at their discounted prices.
+    `summary()` reports p50/p95/max per stage, rows per minute, total tokens, the prompt cache
+    hit ratio and the effective cost per row; the per-row
+    records from `rows()` can be exported with `metrics_to_json` / `row_metrics_to_csv`.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name
+        self.started_at = time.monotonic()
+        self.rows_completed = 0
+        self._rows: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, row_index: int, stage_name: str) -> Iterator[None]:
+        stage_started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(row_index, stage_name, time.perf_counter() - stage_started_at)
+
+    def record(self, row_index: int, stage_name: str, seconds: float) -> None:
+        with self._lock:
+            row_metrics = self._rows.setdefault(row_index, {})
+            row_metrics[stage_name] = row_metrics.get(stage_name, 0.0) + seconds
+
+    def record_usage(self, row_index: int, completion: Any, share: float = 1.0, batch: bool = False) -> None:
+        """
+        Counts an LLM call for the row and adds the token counts from `completion.usage`, if reported.
+        A call answering several rows at once is recorded for each of them with `share` = 1 / rows;
+        `batch` marks a call made through the Batch API.
+        """
+        usage = getattr(completion, "usage", None)
+        cost = call_cost_usd(self.model_name, usage, batch=batch) if self.model_name else None
+        with self._lock:
+            row_metrics = self._rows.setdefault(row_index, {})
+            row_metrics["llm_calls"] = row_metrics.get("llm_calls", 0) + share
+            for field in TOKEN_FIELDS:
+                row_metrics[field] = row_metrics.get(field, 0) + (getattr(usage, field, None) or 0) * share
+            row_metrics[CACHED_TOKENS_FIELD] = row_metrics.get(CACHED_TOKENS_FIELD, 0) + cached_prompt_tokens(usage) * share
+            if cost is not None:
+                row_metrics[COST_FIELD] = row_metrics.get(COST_FIELD, 0.0) + cost * share
+
+    def record_retry(self, row_index: int) -> None:
+        """Counts a retried LLM attempt; a row with retries and a successful call has recovered."""
+        with self._lock:
+            row_metrics = self._rows.setdefault(row_index, {})
+            row_metrics["llm_retries"] = row_metrics.get("llm_retries", 0) + 1
+
+    def record_shared(self, row_indexes: List[int], stage_name: str, seconds: float) -> None:
+        """Spreads one operation done for several rows at once evenly over those rows."""
+        if not row_indexes:
+            return
+        share = seconds / len(row_indexes)
+        for row_index in row_indexes:
+            self.record(row_index, stage_name, share)
+
+    def record_flush(self, row_indexes: List[int], seconds: float) -> None:
+        """Spreads one batched sheet write over the rows it contained."""
+        self.record_shared(row_indexes, STAGE_WRITE, seconds)
+
+    def row_completed(self) -> None:
+        with self._lock:
+            self.rows_completed += 1
+
+    def row(self, row_index: int) -> Dict[str, float]:
+        """A copy of one row's seconds per stage and token counts (empty if nothing was recorded)."""
+        with self._lock:
+            return dict(self._rows.get(row_index, {}))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One record per row: row index, seconds per stage and token counts."""
+        with self._lock:
+            return [
+                {"row": row_index, **{name: round(value, 4) if isinstance(value, float) else value for name, value in row_metrics.items()}}
+                for row_index, row_metrics in sorted(self._rows.items())
+            ]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            row_metrics_list = list(self._rows.values())
+            rows_completed = self.rows_completed
+        elapsed_seconds = time.monotonic() - self.started_at
+
+        stages: Dict[str, Dict[str, float]] = {}
+        for stage_name in STAGES:
+            durations = sorted(row_metrics[stage_name] for row_metrics in row_metrics_list if stage_name in row_metrics)
+            if not durations:
+                continue
+            stages[stage_name] = {
+                "rows": len(durations),
+                "total_seconds": round(sum(durations), 3),
+                "p50_seconds": round(_percentile(durations, 0.50), 3),
+                "p95_seconds": round(_percentile(durations, 0.95), 3),
+                "max_seconds": round(durations[-1], 3)
+            }
+
+        tokens = {field: round(sum(row_metrics.get(field, 0) for row_metrics in row_metrics_list)) for field in TOKEN_FIELDS + ("llm_calls",)}
+        retried_rows = [row_metrics for row_metrics in row_metrics_list if row_metrics.get("llm_retries")]
+        retries = {
+            "total_retries": sum(row_metrics["llm_retries"] for row_metrics in retried_rows),
+            "retried_rows": len(retried_rows),
+            "recovered_rows": sum(1 for row_metrics in retried_rows if row_metrics.get("llm_calls"))
+        }
+        cached_tokens = round(sum(row_metrics.get(CACHED_TOKENS_FIELD, 0) for row_metrics in row_metrics_list))
+        prompt_cache = {
+            "cached_tokens": cached_tokens,
+            "hit_ratio": round(cached_tokens / tokens["prompt_tokens"], 3) if tokens["prompt_tokens"] else 0.0
+        }
+        summary: Dict[str, Any] = {
+            "rows_completed": rows_completed,
+            "elapsed_seconds": round(elapsed_seconds, 1),
+            "rows_per_minute": round(rows_completed / elapsed_seconds * 60, 1) if elapsed_seconds > 0 else 0.0,
+            "stages": stages,
+            "tokens": tokens,
+            "prompt_cache": prompt_cache,
+            "retries": retries
+        }
+        if self.model_name in MODEL_PRICES_PER_MILLION_TOKENS:
+            total_cost = sum(row_metrics.get(COST_FIELD, 0.0) for row_metrics in row_metrics_list)
+            summary["cost"] = {
+                "model": self.model_name,
+                "total_usd": round(total_cost, 6),
+                "per_row_usd": round(total_cost / rows_completed, 6) if rows_completed else 0.0
+            }
+        return summary
+
+    def summary_lines(self, summary: Optional[Dict[str, Any]] = None) -> List[str]:
+        summary = summary or self.summary()
+        lines = [
+            f"{stage_name}: p50 {stats['p50_seconds']:.2f} s, p95 {stats['p95_seconds']:.2f} s, max {stats['max_seconds']:.2f} s over {stats['rows']} row(s)"
+            for stage_name, stats in summary["stages"].items()
+        ]
+        tokens = summary["tokens"]
+        retries = summary["retries"]
+        if retries["total_retries"]:
+            lines.append(f"{retries['total_retries']} LLM retry attempt(s) on {retries['retried_rows']} row(s); {retries['recovered_rows']} row(s) recovered")
+        lines.append(
+            f"{summary['rows_completed']} row(s) in {summary['elapsed_seconds']:.1f} s ({summary['rows_per_minute']:.1f} rows/min), "
+            f"{tokens['total_tokens']} tokens ({tokens['prompt_tokens']} prompt, {tokens['completion_tokens']} completion) over {tokens['llm_calls']} LLM call(s)"
+        )
+        prompt_cache = summary["prompt_cache"]
+        if tokens["prompt_tokens"]:
+            lines.append(f"prompt cache: {prompt_cache['cached_tokens']} of {tokens['prompt_tokens']} prompt tokens cached ({prompt_cache['hit_ratio']:.1%})")
+        cost = summary.get("cost")
+        if cost:
+            lines.append(f"estimated cost: ${cost['total_usd']:.4f} (${cost['per_row_usd']:.6f} per row, {cost['model']})")
+        return lines
+
+
+def metrics_to_json(summary: Dict[str, Any], row_metrics: List[Dict[str, Any]]) -> str:
+    return json.dumps({"summary": summary, "rows": row_metrics}, indent=2)
+
+
+def row_metrics_to_csv(row_metrics: List[Dict[str, Any]]) -> str:
+    """One CSV line per row with a column per stage and token field (empty when not applicable)."""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=["row", *STAGES, *TOKEN_FIELDS, CACHED_TOKENS_FIELD, COST_FIELD, "llm_calls", "llm_retries"], extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(row_metrics)
+    return output.getvalue()
@@ -0,0 +1,364 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import gspread
+
+from core_processors.rate_limiter import RateLimiter, error_status_code, retry_after_seconds, DEFAULT_MAX_RATE_LIMIT_RETRIES
+
+DEFAULT_READ_CHUNK_SIZE = 1000
+DEFAULT_FLUSH_MAX_CELLS = 100
+DEFAULT_FLUSH_INTERVAL_SECONDS = 10.0
+# After a flush fails for good (retries exhausted), the next one waits at least this long.
+DEFAULT_FAILED_FLUSH_COOLDOWN_SECONDS = 30.0
+
+# Outcomes of one buffered write request.
+_WRITE_OK = "ok"
+_WRITE_REJECTED = "rejected"   # the API refused the request; retrying it unchanged cannot help
+_WRITE_FAILED = "failed"       # quota, server or connection errors outlasted the retries
+
+
+def iter_column_chunks(
+    worksheet: gspread.Worksheet,
+    column_letter: str,
+    start_row: int,
+    end_row: int,
+    chunk_size: int = DEFAULT_READ_CHUNK_SIZE,
+    value_render_option: str = "FORMATTED_VALUE",
+    rate_limiter: Optional[RateLimiter] = None
+) -> Iterator[List[Tuple[int, Any]]]:
+    """
+    Pages through a single column with one bulk range read per `chunk_size` rows instead of
+    one `worksheet.cell()` call per row.
+    Yields lists of (row_index, value) pairs covering every row of the chunk; rows without
+    a value (including trailing empty rows that the API trims) are yielded with value None.
+    Reads go through `rate_limiter` if given, and reads rejected with a 429 are retried.
+    """
+    chunk_size = max(1, chunk_size)
+    for chunk_start in range(start_row, end_row + 1, chunk_size):
+        chunk_end = min(chunk_start + chunk_size - 1, end_row)
+        range_str = f"{column_letter}{chunk_start}:{column_letter}{chunk_end}"
+        values = read_range(worksheet, range_str, value_render_option=value_render_option, rate_limiter=rate_limiter)
+
+        chunk: List[Tuple[int, Any]] = []
+        for offset in range(chunk_end - chunk_start + 1):
+            row_values = values[offset] if offset < len(values) else []
+            chunk.append((chunk_start + offset, row_values[0] if row_values else None))
+        yield chunk
+
+
+def read_range(
+    worksheet: gspread.Worksheet,
+    range_str: str,
+    value_render_option: str = "FORMATTED_VALUE",
+    rate_limiter: Optional[RateLimiter] = None,
+    max_retries: int = DEFAULT_MAX_RATE_LIMIT_RETRIES
+) -> List[List[Any]]:
+    """One range read, paced by `rate_limiter`. Quota (429) errors slow the limiter down and are retried."""
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            values = worksheet.get(range_str, value_render_option=value_render_option)
+        except gspread.exceptions.APIError as e_gs_api:
+            if error_status_code(e_gs_api) != 429 or attempt == max_retries:
+                raise
+            retry_after = retry_after_seconds(e_gs_api)
+            if rate_limiter is not None:
+                rate_limiter.report_rate_limited(retry_after)
+            else:
+                time.sleep(retry_after or 2.0 ** attempt)
+            continue
+        if rate_limiter is not None:
+            rate_limiter.report_success()
+        return values
+    return []
+
+
+def read_columns(
+    worksheet: gspread.Worksheet,
+    column_letters: List[str],
+    start_row: int,
+    end_row: int,
+    value_render_option: str = "FORMATTED_VALUE",
+    rate_limiter: Optional[RateLimiter] = None
+) -> List[Tuple[int, Tuple[Any, ...]]]:
+    """
+    Reads several columns of a row range with a single range read of the block spanning them
+    (columns in between are read and dropped).
+    Returns (row_index, values in the order of `column_letters`) for every row of the range;
+    empty cells, including those the API trims, are None.
+    """
+    column_indexes = [gspread.utils.a1_to_rowcol(f"{column_letter}1")[1] for column_letter in column_letters]
+    first_column, last_column = min(column_indexes), max(column_indexes)
+    range_str = f"{gspread.utils.rowcol_to_a1(start_row, first_column)}:{gspread.utils.rowcol_to_a1(end_row, last_column)}"
+    values = read_range(worksheet, range_str, value_render_option=value_render_option, rate_limiter=rate_limiter)
+
+    rows: List[Tuple[int, Tuple[Any, ...]]] = []
+    for offset in range(end_row - start_row + 1):
+        row_values = values[offset] if offset < len(values) else []
+        cells = [row_values[column_index - first_column] if column_index - first_column < len(row_values) else None for column_index in column_indexes]
+        rows.append((start_row + offset, tuple(None if cell == "" else cell for cell in cells)))
+    return rows
+
+
+class BufferedSheetWriter:
+    """
+    Write-behind buffer for Google Sheets output cells.
+
+    Cells from many rows are collected and coalesced (the latest value for a cell wins), then
+    written with a single `batch_update` request once `max_buffered_cells` cells are waiting or
+    `flush_interval_seconds` have passed since the last flush. Quota (429), server (5xx) and
+    connection errors are retried with exponential backoff; cells that still cannot be written
+    stay in the buffer, and no flush is attempted for `failed_flush_cooldown_seconds` (except on
+    `close()`), so a failing API is not hit again by every row. A request the API rejects (e.g. a
+    400 for an over-long value) is split in halves until the rejected cells are isolated; those
+    are dropped from the buffer and reported by `close()` and `unwritten_cell_count`, so one bad
+    cell does not hold back the rest of the run. Use as a context manager (or call `close()`)
+    so everything left in the buffer is flushed on shutdown or error. `on_flush`, if given, is
+    called with the row numbers whose cells were all written by a flush; `last_flush_seconds`
+    holds how long that flush took, retries included.
+    """
+
+    def __init__(
+        self,
+        worksheet: gspread.Worksheet,
+        log_callback: Callable[[str], None],
+        max_buffered_cells: int = DEFAULT_FLUSH_MAX_CELLS,
+        flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = 5,
+        base_backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 64.0,
+        failed_flush_cooldown_seconds: float = DEFAULT_FAILED_FLUSH_COOLDOWN_SECONDS,
+        rate_limiter: Optional[RateLimiter] = None,
+        value_input_option: str = "USER_ENTERED",
+        on_flush: Optional[Callable[[List[int]], None]] = None
+    ):
+        self.worksheet = worksheet
+        self.log_callback = log_callback
+        self.max_buffered_cells = max(1, max_buffered_cells)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.failed_flush_cooldown_seconds = failed_flush_cooldown_seconds
+        self.rate_limiter = rate_limiter
+        self.value_input_option = value_input_option
+        self.on_flush = on_flush
+
+        self._buffer: Dict[Tuple[int, int], Any] = {}
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush_at = time.monotonic()
+        self._retry_not_before = 0.0
+        # Cells the API rejected; they are not retried.
+        self.rejected_cells: Dict[Tuple[int, int], Any] = {}
+        self.write_requests = 0
+        self.last_flush_seconds = 0.0
+
+    def __enter__(self) -> "BufferedSheetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def buffered_cell_count(self) -> int:
+        with self._buffer_lock:
+            return len(self._buffer)
+
+    @property
+    def unwritten_cell_count(self) -> int:
+        """Cells still buffered plus cells the API rejected."""
+        with self._buffer_lock:
+            return len(self._buffer) + len(self.rejected_cells)
+
+    def add(self, cells: List[gspread.Cell]) -> None:
+        """Queues cells for writing and flushes if a size or time threshold has been reached."""
+        with self._buffer_lock:
+            for cell in cells:
+                self._buffer[(cell.row, cell.col)] = cell.value
+        self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flushes if the buffer is full or the flush interval has elapsed, unless a failed flush is cooling down."""
+        with self._buffer_lock:
+            buffered = len(self._buffer)
+        if not buffered or time.monotonic() < self._retry_not_before:
+            return
+        interval_elapsed = time.monotonic() - self._last_flush_at >= self.flush_interval_seconds
+        if buffered >= self.max_buffered_cells or interval_elapsed:
+            self.flush()
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Writes all buffered cells, in one request unless the API rejects it.
+        Returns True if the buffer is empty afterwards, False if cells had to be kept for a later
+        retry. Within the cooldown after a failed flush nothing is sent unless `force` is set.
+        """
+        with self._flush_lock:
+            if not force and time.monotonic() < self._retry_not_before:
+                return False
+            with self._buffer_lock:
+                pending = dict(self._buffer)
+            self._last_flush_at = time.monotonic()
+            if not pending:
+                return True
+
+            rows = sorted({row for row, _ in pending})
+            flush_started_at = time.monotonic()
+            requests_before = self.write_requests
+            written, rejected, failed = self._write_cells(pending)
+
+            with self._buffer_lock:
+                # Only drop what was written or rejected; a newer value queued meanwhile stays buffered.
+                for key in written + rejected:
+                    if key in self._buffer and self._buffer[key] is pending[key]:
+                        del self._buffer[key]
+                for key in rejected:
+                    self.rejected_cells[key] = pending[key]
+                buffer_empty = not self._buffer
+            if failed:
+                self._retry_not_before = time.monotonic() + self.failed_flush_cooldown_seconds
+                self.log_callback(
+                    f"⏸️ {len(pending) - len(written) - len(rejected)} cell(s) are kept for the next flush, "
+                    f"which waits at least {self.failed_flush_cooldown_seconds:g} s."
+                )
+            if not written:
+                return buffer_empty
+
+            written_keys = set(written)
+            incomplete_rows = {row for row, col in pending if (row, col) not in written_keys}
+            written_rows = sorted({row for row, _ in written} - incomplete_rows)
+            self.log_callback(
+                f"✅ Wrote {len(written)} cell(s) for {len({row for row, _ in written})} row(s) ({rows[0]}-{rows[-1]}) "
+                f"to Google Sheets in {self.write_requests - requests_before} request(s)."
+            )
+            self.last_flush_seconds = time.monotonic() - flush_started_at
+            if self.on_flush is not None and written_rows:
+                self.on_flush(written_rows)
+            return buffer_empty
+
+    def close(self) -> None:
+        """Flushes everything left in the buffer. Cells that could not be written are logged."""
+        self.flush(force=True)
+        with self._buffer_lock:
+            unwritten = sorted({**self.rejected_cells, **self._buffer}.items())
+        if unwritten:
+            self.log_callback(f"❌ {len(unwritten)} cell(s) could not be written to Google Sheets:")
+            for (row, col), value in unwritten:
+                self.log_callback(f"   {gspread.utils.rowcol_to_a1(row, col)} = '{str(value)[:100]}'")
+
+    def _write_cells(self, cells: Dict[Tuple[int, int], Any]) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]], bool]:
+        """
+        Writes `cells`, splitting a rejected request in halves until the rejected cells are isolated.
+        Returns (written cells, rejected cells, True if a transient failure left cells unwritten).
+        """
+        outcome = self._write_with_retries(cells)
+        if outcome == _WRITE_OK:
+            return list(cells), [], False
+        if outcome == _WRITE_FAILED:
+            return [], [], True
+        keys = sorted(cells)
+        if len(keys) == 1:
+            (row, col), value = keys[0], cells[keys[0]]
+            self.log_callback(f"❌ Google Sheets rejected {gspread.utils.rowcol_to_a1(row, col)} = '{str(value)[:100]}'. The cell is dropped.")
+            return [], keys, False
+        written: List[Tuple[int, int]] = []
+        rejected: List[Tuple[int, int]] = []
+        for half in (keys[:len(keys) // 2], keys[len(keys) // 2:]):
+            half_written, half_rejected, failed = self._write_cells({key: cells[key] for key in half})
+            written += half_written
+            rejected += half_rejected
+            if failed:
+                # The API is failing; the remaining half waits for the next flush.
+                return written, rejected, True
+        return written, rejected, False
+
+    def _write_with_retries(self, cells: Dict[Tuple[int, int], Any]) -> str:
+        """One batch_update of `cells` with retries. Returns _WRITE_OK, _WRITE_REJECTED or _WRITE_FAILED."""
+        data = _cells_to_batch_update_data(cells)
+        rows = sorted({row for row, _ in cells})
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                self.worksheet.batch_update(data, value_input_option=self.value_input_option)
+                self.write_requests += 1
+                if self.rate_limiter is not None:
+                    self.rate_limiter.report_success()
+                return _WRITE_OK
+            except gspread.exceptions.APIError as e_gs_api:
+                status_code = error_status_code(e_gs_api)
+                rate_limited = status_code == 429 and self.rate_limiter is not None
+                retryable = status_code == 429 or (status_code is not None and status_code >= 500)
+                if not retryable:
+                    self.log_callback(
+                        f"❌ Google Sheets API rejected {len(cells)} cell(s) for rows {rows[0]}-{rows[-1]}: "
+                        f"Code {status_code} - {e_gs_api}."
+                        + (" Splitting the write to find the rejected cell(s)." if len(cells) > 1 else "")
+                    )
+                    return _WRITE_REJECTED
+                error_description = f"quota/server error (Code {status_code})"
+                retry_after = retry_after_seconds(e_gs_api)
+            except OSError as e_connection:  # includes the requests exceptions gspread raises
+                error_description = f"connection error ({type(e_connection).__name__})"
+                retry_after = None
+                rate_limited = False
+            except Exception as e_gs_update:
+                self.log_callback(
+                    f"❌ Error writing {len(cells)} cell(s) for rows {rows[0]}-{rows[-1]}: "
+                    f"{type(e_gs_update).__name__} - {e_gs_update}."
+                    + (" Splitting the write to find the rejected cell(s)." if len(cells) > 1 else "")
+                )
+                return _WRITE_REJECTED
+            if attempt == self.max_retries:
+                if rate_limited:
+                    self.rate_limiter.report_rate_limited(retry_after)
+                self.log_callback(f"❌ Google Sheets {error_description} while writing rows {rows[0]}-{rows[-1]}; giving up after {self.max_retries} retries.")
+                return _WRITE_FAILED
+            delay = self._backoff_delay(attempt, retry_after)
+            self.log_callback(
+                f"⏳ Google Sheets {error_description} while writing rows {rows[0]}-{rows[-1]}. "
+                f"Retrying in {delay:.1f} s (attempt {attempt + 1}/{self.max_retries})..."
+            )
+            if rate_limited:
+                # Every caller pauses, not just this write; the limiter's acquire() then takes care of the wait.
+                self.rate_limiter.report_rate_limited(delay)
+            else:
+                time.sleep(delay)
+        return _WRITE_FAILED
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        delay = min(self.base_backoff_seconds * (2 ** attempt), self.max_backoff_seconds)
+        return delay + random.uniform(0, delay / 2)
+
+
+def _cells_to_batch_update_data(cells: Dict[Tuple[int, int], Any]) -> List[Dict[str, Any]]:
+    """Groups cells into one A1 range per run of adjacent columns in the same row."""
+    data: List[Dict[str, Any]] = []
+    run_start: Optional[Tuple[int, int]] = None
+    run_values: List[Any] = []
+    previous: Optional[Tuple[int, int]] = None
+    for row, col in sorted(cells):
+        if previous is not None and row == previous[0] and col == previous[1] + 1:
+            run_values.append(cells[(row, col)])
+        else:
+            if run_start is not None:
+                data.append(_range_entry(run_start, run_values))
+            run_start = (row, col)
+            run_values = [cells[(row, col)]]
+        previous = (row, col)
+    if run_start is not None:
+        data.append(_range_entry(run_start, run_values))
+    return data
+
+
+def _range_entry(run_start: Tuple[int, int], run_values: List[Any]) -> Dict[str, Any]:
+    row, col = run_start
+    start_a1 = gspread.utils.rowcol_to_a1(row, col)
+    end_a1 = gspread.utils.rowcol_to_a1(row, col + len(run_values) - 1)
+    return {"range": f"{start_a1}:{end_a1}", "values": [run_values]}
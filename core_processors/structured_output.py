@@ -0,0 +1,50 @@
+import json
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from prompt_handlers.base_handler import BasePromptHandler
+
+
+def schema_request_options(handler_config: Dict[str, Any], schema_name: str) -> Dict[str, Any]:
+    """
+    Extra chat completion arguments for a handler whose config declares a 'response_schema':
+    a strict json_schema `response_format`, so the model can only answer with a matching JSON
+    object. Empty for handlers without a schema.
+    """
+    response_schema = handler_config.get("response_schema")
+    if not response_schema:
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": schema_name, "schema": response_schema, "strict": True}
+        }
+    }
+
+
+def parse_structured_response(response_text: str) -> Optional[Dict[str, Any]]:
+    """
+    The JSON object of a structured-output response, or None if the text is not a JSON object
+    (an empty reply or a refusal, or a response cached before the handler declared a schema).
+    """
+    try:
+        parsed_response = json.loads(response_text)
+    except (TypeError, ValueError):
+        return None
+    return parsed_response if isinstance(parsed_response, dict) else None
+
+
+def handler_outputs(
+    handler_class: Type[BasePromptHandler],
+    response_text: str,
+    num_expected_outputs: int,
+    log_callback: Callable[[str], None],
+    structured: bool = False
+) -> Tuple[str, ...]:
+    """
+    Runs the handler on an LLM response. With `structured` output the parsed object goes straight
+    to `process_parsed_response`; any other text goes through `process_llm_response` as before.
+    """
+    parsed_response = parse_structured_response(response_text) if structured else None
+    if parsed_response is not None:
+        return handler_class.process_parsed_response(parsed_response, num_expected_outputs, log_callback)
+    return handler_class.process_llm_response(response_text, num_expected_outputs, log_callback)
@@ -2,134 +2,43 @@ import streamlit as st
 import os
 import re
 from dotenv import load_dotenv
-import importlib
-import pkgutil
-from typing import Dict, Type, List, Any, Optional, Union
+from typing import Dict, Type, List, Any, Optional
 from prompt_handlers.base_handler import BasePromptHandler
-from core_processors.core_processor_llm_only import run_core_logic
+from core_processors.handler_registry import get_handler_registry
+from core_processors.incremental import INCREMENTAL_OFF, INCREMENTAL_NEW_AND_FAILED, INCREMENTAL_FAILED_ONLY
+from core_processors.job_manager import get_job_manager, lazy_run_fn, JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED
+from core_processors.rate_limiter import DEFAULT_OPENAI_REQUESTS_PER_MINUTE, DEFAULT_OPENAI_TOKENS_PER_MINUTE
+from core_processors.row_packing import DEFAULT_ROWS_PER_REQUEST, MAX_ROWS_PER_REQUEST
+from core_processors.run_metrics import metrics_to_json, row_metrics_to_csv
 
 load_dotenv()
 
 PROMPTS_FOLDER = "prompts/"
+JOB_POLL_INTERVAL_SECONDS = 2
 PROMPT_HANDLERS_PACKAGE_NAME = "prompt_handlers"
+# Imported by the job when it starts, so page reruns do not load openai, gspread or Selenium.
+PROCESSOR_MODULE = "core_processors.core_processor_llm_only"
+INCREMENTAL_MODE_LABELS = {
+    "All rows in the range": INCREMENTAL_OFF,
+    "New rows and rows with errors": INCREMENTAL_NEW_AND_FAILED,
+    "Only rows with errors": INCREMENTAL_FAILED_ONLY,
+}
 CURRENT_PAGE_ID = "llm_interface"
 
 st.set_page_config(page_title="Company Website Analyzer", layout="wide")
 st.title("Company Website Analyzer for Ecommerce Berlin Expo")
 
-AVAILABLE_PROMPT_HANDLERS: Dict[str, Type[BasePromptHandler]] = {}
-PROMPT_CONFIG_MAP: Dict[str, Dict[str, Any]] = {}
-ACTUAL_PROMPT_FILES: Dict[str, str] = {}
-
-def load_prompt_handlers_and_configs(current_page_identifier: str):
-    """
-    Dynamically loads prompt handlers from PROMPT_HANDLERS_PACKAGE_NAME package.
-    Populates global dictionaries AVAILABLE_PROMPT_HANDLERS, PROMPT_CONFIG_MAP, ACTUAL_PROMPT_FILES.
-    """
-    if not os.path.isdir(PROMPTS_FOLDER):
-        st.error(f"Folder '{PROMPTS_FOLDER}' does not exist.")
-
-    try:
-        prompt_handlers_package = importlib.import_module(PROMPT_HANDLERS_PACKAGE_NAME)
-        for _, module_name, _ in pkgutil.iter_modules(prompt_handlers_package.__path__):
-            if module_name == "base_handler":
-                continue
-            try:
-                module = importlib.import_module(f".{module_name}", package=PROMPT_HANDLERS_PACKAGE_NAME)
-                for attribute_name in dir(module):
-                    attribute = getattr(module, attribute_name)
-                    
-                    is_concrete_handler = False
-                    if isinstance(attribute, type):
-                        if attribute is BasePromptHandler:
-                            continue 
-                        if issubclass(attribute, BasePromptHandler):
-                            is_concrete_handler = True
-                        elif attribute.__name__ != "BasePromptHandler" and (
-                              hasattr(attribute, "get_config") and callable(getattr(attribute, "get_config")) and
-                              hasattr(attribute, "process_llm_response") and callable(getattr(attribute, "process_llm_response")) and
-                              hasattr(attribute, "handle_no_content") and callable(getattr(attribute, "handle_no_content")) and
-                              hasattr(attribute, "get_prompt_key") and callable(getattr(attribute, "get_prompt_key"))
-                        ):
-                            is_concrete_handler = True
-                            st.info(f"Handler '{attribute_name}' in module '{module_name}' loaded by duck-typing.")
-                    
-                    if is_concrete_handler:
-                        handler_class: Type[BasePromptHandler] = attribute
-                        try:
-                            if not (hasattr(handler_class, "get_config") and 
-                                    hasattr(handler_class, "get_prompt_key")):
-                                st.warning(f"Handler class '{attribute_name}' in module '{module_name}' is missing required static methods (get_config or get_prompt_key). Skipping.")
-                                continue
-
-                            config: Optional[Dict[str, Any]] = handler_class.get_config()
-                            prompt_key: Optional[str] = handler_class.get_prompt_key()
-
-                            if config is None:
-                                st.error(f"ERROR: Handler '{attribute_name}' in module '{module_name}' returned None from get_config(). Skipping this handler.")
-                                continue
-                            if prompt_key is None or not prompt_key.strip():
-                                st.error(f"ERROR: Handler '{attribute_name}' w module '{module_name}' returned None or empty string from get_prompt_key(). Skipping this handler.")
-                                continue
-
-                            handler_target_id: Union[str, List[str], None] = config.get("target_page_id")
-                            display_name_for_log = config.get('display_name', attribute_name)
-
-                            is_for_this_page = False
-                            if handler_target_id is None:
-                                # Jeśli brak 'target_page_id', załóżmy, że jest dla wszystkich (opcjonalne założenie)
-                                # Możesz też zdecydować, że brak oznacza, że nie jest dla żadnej konkretnej strony i go pominąć.
-                                # Dla jasności, przyjmijmy, że brak oznacza, że nie pasuje do żadnej strony, chyba że current_page_identifier to np. "all_pages_view"
-                                # Lepsze podejście: jawne "all" lub lista.
-                                pass # Domyślnie nie jest dla tej strony, jeśli nie zdefiniowano.
-                            elif isinstance(handler_target_id, str):
-                                if handler_target_id.lower() == current_page_identifier.lower() or handler_target_id.lower() == "all":
-                                    is_for_this_page = True
-                            elif isinstance(handler_target_id, list):
-                                normalized_target_ids = [str(tid).lower() for tid in handler_target_id]
-                                if current_page_identifier.lower() in normalized_target_ids or "all" in normalized_target_ids:
-                                    is_for_this_page = True
-                            
-                            if not is_for_this_page:
-                                # Opcjonalnie: print(f"DEBUG: Pomijam handler '{display_name_for_log}' (cel: {handler_target_id}) dla strony '{current_page_identifier}'.")
-                                continue
-
-                            display_name = config.get("display_name")
-                            file_base = config.get("file_base")
-
-                            if not display_name or not file_base:
-                                st.warning(f"Handler '{attribute_name}' in module '{module_name}' has incomplete configuration. Configuration: {config}. Prompt key: {prompt_key}. Skipping.")
-                                continue
-
-                            full_path = os.path.join(PROMPTS_FOLDER, file_base + ".txt")
-                            if os.path.exists(full_path):
-                                AVAILABLE_PROMPT_HANDLERS[prompt_key] = handler_class
-                                PROMPT_CONFIG_MAP[display_name] = config
-                                ACTUAL_PROMPT_FILES[display_name] = full_path
-                                #st.info(f"✅ Successfully loaded handler: '{display_name}' (key: '{prompt_key}')")
-                            else:
-                                st.warning(f"Prompt file '{file_base}.txt' for handler '{display_name}' (key: {prompt_key}) not found in '{PROMPTS_FOLDER}'.")
-                        except Exception as e_handler_init:
-                            handler_prompt_key_attr = getattr(handler_class, 'PROMPT_KEY', 'N/A') if hasattr(handler_class, 'PROMPT_KEY') else 'Nieznany'
-                            st.error(f"Error initializing/configuring handler '{attribute_name}' (for prompt key: {handler_prompt_key_attr}) z modułu '{module_name}': {type(e_handler_init).__name__} - {e_handler_init}")
-                        break
-            except ImportError as e_mod:
-                st.error(f"Error importing handler module '{module_name}': {e_mod}")
-            except Exception as e_mod_general:
-                st.error(f"General module processing error '{module_name}': {e_mod_general}")
-
-    except ImportError as e_pkg:
-        st.error(f"Could not import prompt handlers package: '{PROMPT_HANDLERS_PACKAGE_NAME}'. Error: {e_pkg}")
-        st.error(f"Make sure the '{PROMPT_HANDLERS_PACKAGE_NAME}' directory exists and contains the file '__init__.py'.")
-    except Exception as e_load_general:
-        st.error(f"An unexpected error occurred while loading prompt handlers: {e_load_general}")
-    
-    print(f"DEBUG app_interface.load_prompt_handlers_and_configs: Final Content AVAILABLE_PROMPT_HANDLERS: {list(AVAILABLE_PROMPT_HANDLERS.keys())}")
-
+# Discovered once per process; later reruns (sidebar interactions) only check whether a file
+# in prompt_handlers/ or prompts/ has changed since.
+handler_registry = get_handler_registry(CURRENT_PAGE_ID, PROMPTS_FOLDER)
+for discovery_message in handler_registry.messages:
+    st.warning(discovery_message)
 
-load_prompt_handlers_and_configs(CURRENT_PAGE_ID)
+AVAILABLE_PROMPT_HANDLERS: Dict[str, Type[BasePromptHandler]] = handler_registry.handlers_by_key
+PROMPT_CONFIG_MAP: Dict[str, Dict[str, Any]] = handler_registry.configs_by_display_name
+ACTUAL_PROMPT_FILES: Dict[str, str] = handler_registry.prompt_files_by_display_name
 
-available_prompts_display = sorted(list(PROMPT_CONFIG_MAP.keys()))
+available_prompts_display = handler_registry.display_names()
 
 if not available_prompts_display:
     st.error(
@@ -155,16 +64,7 @@ if selected_prompt_display_name and available_prompts_display:
     current_prompt_config = PROMPT_CONFIG_MAP.get(selected_prompt_display_name, {})
     selected_prompt_full_path = ACTUAL_PROMPT_FILES.get(selected_prompt_display_name)
     
-    for key, handler_cls_ref in AVAILABLE_PROMPT_HANDLERS.items():
-        try:
-            config_from_handler = handler_cls_ref.get_config()
-            if config_from_handler: 
-                handler_display_name = config_from_handler.get("display_name")
-                if handler_display_name == selected_prompt_display_name:
-                    selected_prompt_key = key
-                    break
-        except Exception as e_get_conf_sidebar:
-            st.warning(f"Cannot get configuration for handler (key: {key}) when matching sidebar display name: {e_get_conf_sidebar}")
+    selected_prompt_key = handler_registry.key_for_display_name(selected_prompt_display_name)
 
 st.sidebar.info(f"Currently selected prompt key: `{selected_prompt_key}`" if selected_prompt_key else "No prompt selected/loaded.")
 
@@ -178,6 +78,14 @@ worksheet_name_input = st.sidebar.text_input("File Name:", value="Arkusz3")
 st.sidebar.header("↔️ Rows' range")
 start_row_input = st.sidebar.number_input("Start row:", min_value=1, max_value=1000000, value=2, step=1)
 end_row_input = st.sidebar.number_input("End row:", min_value=1, max_value=1000000, value=5, step=1)
+resume_job_input = st.sidebar.checkbox(
+    "Resume job", value=False,
+    help="Skips rows that an earlier run of the same job (sheet, columns and prompt) already wrote, and re-processes only pending or failed rows."
+)
+incremental_mode_label = st.sidebar.selectbox(
+    "Rows to process:", options=list(INCREMENTAL_MODE_LABELS), index=0,
+    help="Reads the output columns first: rows that already have a result are left alone, so new rows can be added to a large sheet without reprocessing it. Rows whose outputs start with an error marker (e.g. 'Error: No website content retrieved') count as rows with errors."
+)
 
 st.sidebar.header("⬇️ Input column")
 company_input_column_input = st.sidebar.text_input("Column with domains:", value="A", max_chars=3)
@@ -208,6 +116,35 @@ if num_outputs_for_ui >= 3:
         max_chars=3
     )
 
+st.sidebar.header("⚡ Performance")
+execution_mode_labels = {
+    "Serial (one row at a time)": "serial",
+    "Async (concurrent OpenAI requests)": "async",
+    "Batch (OpenAI Batch API, about half the cost, results within 24 h)": "batch"
+}
+execution_mode_label = st.sidebar.selectbox(
+    "Execution mode:", options=list(execution_mode_labels.keys()), index=0,
+    help="Batch sends all rows as one OpenAI Batch API job: not subject to the per-minute limits below, but the job waits until OpenAI has finished it."
+)
+max_concurrent_requests_input = st.sidebar.number_input(
+    "Max in-flight OpenAI requests:", min_value=1, max_value=100, value=10, step=1,
+    disabled=execution_mode_labels[execution_mode_label] != "async"
+)
+rows_per_request_input = st.sidebar.number_input(
+    "Inputs per OpenAI request:", min_value=1, max_value=MAX_ROWS_PER_REQUEST, value=DEFAULT_ROWS_PER_REQUEST, step=1,
+    disabled=execution_mode_labels[execution_mode_label] == "batch",
+    help="Packs several rows into one request so the system prompt is sent once per pack. Rows missing from a packed reply are retried on their own."
+)
+openai_rpm_input = st.sidebar.number_input(
+    "OpenAI requests per minute:", min_value=1, max_value=10000, value=DEFAULT_OPENAI_REQUESTS_PER_MINUTE, step=10,
+    help="Upper limit; the rate drops automatically after 429 responses and recovers as requests succeed."
+)
+openai_tpm_input = st.sidebar.number_input("OpenAI tokens per minute:", min_value=1000, max_value=100000000, value=DEFAULT_OPENAI_TOKENS_PER_MINUTE, step=10000)
+use_llm_cache_input = st.sidebar.checkbox(
+    "Reuse cached LLM responses", value=True,
+    help="Rows whose prompt and input did not change since an earlier run reuse the stored answer instead of calling OpenAI."
+)
+
 log_placeholder = st.empty()
 log_messages: List[str] = []
 
@@ -337,33 +274,32 @@ if st.button("Start Analysis", disabled=run_button_disabled, key="run_analysis_b
     if valid_input and selected_prompt_key and selected_prompt_full_path:
         ui_log_callback("✅ Validation completed successfully. Starting processing...\n")
         
-        with st.spinner("Processing... This may take a while..."):
-            try:
-                run_core_logic(
-                    prompt_full_path=selected_prompt_full_path,
-                    prompt_handler_key=selected_prompt_key,
-                    available_handlers=AVAILABLE_PROMPT_HANDLERS,
-                    num_expected_outputs=num_outputs_for_ui,
-                    gsheet_name=gsheet_name_input,
-                    worksheet_name=worksheet_name_input,
-                    start_row=start_row_input,
-                    end_row=end_row_input,
-                    company_input_column=company_input_column_input.upper(),
-                    first_output_column=temp_output_cols_to_pass[0],
-                    second_output_column=temp_output_cols_to_pass[1],
-                    third_output_column=temp_output_cols_to_pass[2],
-                    log_callback=ui_log_callback
-                )
-                ui_log_callback("\n--- ✅ PPROCESSING COMPLETED Successfully ---")
-                st.success("Processing completed successfully!")
-            except ValueError as ve:
-                ui_log_callback(f"\n--- ❌ ERROR CONFIGURATION OR VALUES ---")
-                ui_log_callback(f"ERROR: {str(ve)}")
-                st.error(f"Configuration or value ERROR occurred: {ve}")
-            except Exception as e:
-                ui_log_callback(f"\n--- ❌ FATAL ERROR DURING PROCESSING ---")
-                ui_log_callback(f"Error details: {type(e).__name__} - {str(e)}")
-                st.error(f"An unexpected ERROR occurred while processing: {type(e).__name__} - {e}")
+        job_id = get_job_manager().submit(
+            lazy_run_fn(PROCESSOR_MODULE),
+            description=f"{selected_prompt_display_name}: '{gsheet_name_input}' / '{worksheet_name_input}', rows {start_row_input}-{end_row_input}",
+            prompt_full_path=selected_prompt_full_path,
+            prompt_handler_key=selected_prompt_key,
+            available_handlers=AVAILABLE_PROMPT_HANDLERS,
+            num_expected_outputs=num_outputs_for_ui,
+            gsheet_name=gsheet_name_input,
+            worksheet_name=worksheet_name_input,
+            start_row=start_row_input,
+            end_row=end_row_input,
+            company_input_column=company_input_column_input.upper(),
+            first_output_column=temp_output_cols_to_pass[0],
+            second_output_column=temp_output_cols_to_pass[1],
+            third_output_column=temp_output_cols_to_pass[2],
+            execution_mode=execution_mode_labels[execution_mode_label],
+            rows_per_request=int(rows_per_request_input),
+            max_concurrent_requests=int(max_concurrent_requests_input),
+            openai_requests_per_minute=int(openai_rpm_input),
+            openai_tokens_per_minute=int(openai_tpm_input),
+            use_llm_cache=use_llm_cache_input,
+            resume=resume_job_input,
+            incremental_mode=INCREMENTAL_MODE_LABELS[incremental_mode_label]
+        )
+        st.session_state.setdefault("analysis_job_ids", []).append(job_id)
+        ui_log_callback(f"📥 Job {job_id} submitted. Its progress and log are shown below; the page stays usable meanwhile.")
     elif valid_input and (not selected_prompt_key or not selected_prompt_full_path):
         ui_log_callback("Internal ERROR: Validation passed but key or prompt path is missing. Aborting.")
         st.error("Internal configuration ERROR. Check the logs or contact support :>.")
@@ -373,6 +309,59 @@ if st.button("Start Analysis", disabled=run_button_disabled, key="run_analysis_b
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+
+def render_run_metrics(job_id: str, run_summary: Dict[str, Any]):
+    """Shows a finished run's per-stage timings, token counts, prompt cache hits and cost, with JSON/CSV downloads."""
+    metrics = run_summary["metrics"]
+    row_metrics = run_summary.get("row_metrics", [])
+    rate_col, tokens_col, calls_col, cache_col, cost_col = st.columns(5)
+    rate_col.metric("Rows/min", f"{metrics['rows_per_minute']:.1f}")
+    tokens_col.metric("Total tokens", f"{metrics['tokens']['total_tokens']:,}")
+    calls_col.metric("LLM calls", metrics["tokens"]["llm_calls"])
+    cache_col.metric("Prompt cache hits", f"{metrics['prompt_cache']['hit_ratio']:.0%}")
+    cost_col.metric("Cost per row", f"${metrics['cost']['per_row_usd']:.5f}" if metrics.get("cost") else "n/a")
+    if metrics["stages"]:
+        st.table([
+            {"Stage": stage_name, "Rows": stats["rows"], "p50 (s)": stats["p50_seconds"], "p95 (s)": stats["p95_seconds"], "Max (s)": stats["max_seconds"], "Total (s)": stats["total_seconds"]}
+            for stage_name, stats in metrics["stages"].items()
+        ])
+    json_col, csv_col = st.columns(2)
+    json_col.download_button("Download metrics (JSON)", metrics_to_json(metrics, row_metrics), file_name=f"metrics_{job_id}.json", mime="application/json", key=f"metrics_json_{job_id}")
+    csv_col.download_button("Download per-row metrics (CSV)", row_metrics_to_csv(row_metrics), file_name=f"metrics_{job_id}.csv", mime="text/csv", key=f"metrics_csv_{job_id}")
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_SECONDS)
+def render_analysis_jobs():
+    """Polls the background jobs started from this session and shows their status, progress and log."""
+    job_manager = get_job_manager()
+    session_jobs = [job for job in (job_manager.get(job_id) for job_id in st.session_state.get("analysis_job_ids", [])) if job]
+    if not session_jobs:
+        return
+    st.subheader("📋 Jobs")
+    st.caption(f"{job_manager.active_job_count()} job(s) queued or running in this app; up to {job_manager.max_concurrent_jobs} run at a time.")
+    for job in reversed(session_jobs):
+        with st.container(border=True):
+            info_col, action_col = st.columns([5, 1])
+            info_col.markdown(f"**{job.description}**  \nJob `{job.job_id}` · status: `{job.status}` · {job.elapsed_seconds:.0f} s")
+            if not job.is_finished and action_col.button("Cancel", key=f"cancel_job_{job.job_id}"):
+                job_manager.cancel(job.job_id)
+            if job.rows_total:
+                st.progress(min(1.0, job.rows_completed / job.rows_total), text=f"{job.rows_completed}/{job.rows_total} rows")
+            if job.status == JOB_STATUS_SUCCEEDED:
+                st.success("Processing completed successfully!")
+            elif job.status == JOB_STATUS_FAILED:
+                st.error(f"An unexpected ERROR occurred while processing: {job.error}")
+            elif job.status == JOB_STATUS_CANCELLED:
+                st.warning("Job cancelled. Rows completed before the cancellation were written.")
+            if isinstance(job.result, dict) and job.result.get("metrics"):
+                with st.expander("⏱️ Run metrics"):
+                    render_run_metrics(job.job_id, job.result)
+            with st.expander("Log", expanded=not job.is_finished):
+                st.code("\n".join(job.log_lines()[-200:]), language=None)
+
+
+render_analysis_jobs()
+
 CLASSIFICATION = os.getenv("CLASSIFICATION_LINK")
 st.sidebar.markdown("---")
 st.sidebar.markdown(
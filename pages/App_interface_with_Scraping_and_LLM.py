@@ -2,136 +2,46 @@ import streamlit as st
 import os
 import re
 from dotenv import load_dotenv
-import importlib
-import pkgutil
-from typing import Dict, Type, List, Any, Optional, Union
+from typing import Dict, Type, List, Any, Optional
 from prompt_handlers.base_handler import BasePromptHandler
-from core_processors.core_processor_scrap_llm import run_core_logic
+from core_processors.handler_registry import get_handler_registry
+from core_processors.incremental import INCREMENTAL_OFF, INCREMENTAL_NEW_AND_FAILED, INCREMENTAL_FAILED_ONLY
+from core_processors.job_manager import get_job_manager, lazy_run_fn, JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED
+from core_processors.rate_limiter import DEFAULT_OPENAI_REQUESTS_PER_MINUTE, DEFAULT_OPENAI_TOKENS_PER_MINUTE
+from core_processors.run_metrics import metrics_to_json, row_metrics_to_csv
+from core_processors.http_client import DEFAULT_HTTP_POOL_SIZE
+from core_processors.html_text import HTML_PARSER_BACKENDS, DEFAULT_MAX_DOWNLOAD_BYTES
+from core_processors.content_budget import DEFAULT_CONTENT_TOKEN_BUDGET
+from core_processors.content_cache import DEFAULT_SCRAPE_CACHE_PATH, DEFAULT_SCRAPE_CACHE_TTL_HOURS
 
 load_dotenv()
 
 PROMPTS_FOLDER = "prompts/"
+JOB_POLL_INTERVAL_SECONDS = 2
 PROMPT_HANDLERS_PACKAGE_NAME = "prompt_handlers"
+# Imported by the job when it starts, so page reruns do not load openai, gspread or Selenium.
+PROCESSOR_MODULE = "core_processors.core_processor_scrap_llm"
+INCREMENTAL_MODE_LABELS = {
+    "All rows in the range": INCREMENTAL_OFF,
+    "New rows and rows with errors": INCREMENTAL_NEW_AND_FAILED,
+    "Only rows with errors": INCREMENTAL_FAILED_ONLY,
+}
 CURRENT_PAGE_ID = "scrap_llm_interface"
 
 st.set_page_config(page_title="Company Website Analyzer", layout="wide")
 st.title("Company Website Analyzer for Ecommerce Berlin Expo")
 
-AVAILABLE_PROMPT_HANDLERS: Dict[str, Type[BasePromptHandler]] = {}
-PROMPT_CONFIG_MAP: Dict[str, Dict[str, Any]] = {}
-ACTUAL_PROMPT_FILES: Dict[str, str] = {}
-
-def load_prompt_handlers_and_configs(current_page_identifier: str):
-    """
-    Dynamically loads prompt handlers from PROMPT_HANDLERS_PACKAGE_NAME package.
-    Populates global dictionaries AVAILABLE_PROMPT_HANDLERS, PROMPT_CONFIG_MAP, ACTUAL_PROMPT_FILES,
-    filtered for the current page.
-    """
-    AVAILABLE_PROMPT_HANDLERS.clear()
-    PROMPT_CONFIG_MAP.clear()
-    ACTUAL_PROMPT_FILES.clear()
-
-    if not os.path.isdir(PROMPTS_FOLDER):
-        st.error(f"Folder '{PROMPTS_FOLDER}' does not exist.")
-        return
+# Discovered once per process; later reruns (sidebar interactions) only check whether a file
+# in prompt_handlers/ or prompts/ has changed since.
+handler_registry = get_handler_registry(CURRENT_PAGE_ID, PROMPTS_FOLDER)
+for discovery_message in handler_registry.messages:
+    st.warning(discovery_message)
+
+AVAILABLE_PROMPT_HANDLERS: Dict[str, Type[BasePromptHandler]] = handler_registry.handlers_by_key
+PROMPT_CONFIG_MAP: Dict[str, Dict[str, Any]] = handler_registry.configs_by_display_name
+ACTUAL_PROMPT_FILES: Dict[str, str] = handler_registry.prompt_files_by_display_name
 
-    try:
-        prompt_handlers_package = importlib.import_module(PROMPT_HANDLERS_PACKAGE_NAME)
-        for _, module_name, _ in pkgutil.iter_modules(prompt_handlers_package.__path__):
-            if module_name == "base_handler":
-                continue
-            try:
-                module = importlib.import_module(f".{module_name}", package=PROMPT_HANDLERS_PACKAGE_NAME)
-                for attribute_name in dir(module):
-                    attribute = getattr(module, attribute_name)
-                    
-                    is_concrete_handler = False
-                    if isinstance(attribute, type):
-                        if attribute is BasePromptHandler:
-                            continue 
-                        if issubclass(attribute, BasePromptHandler):
-                            is_concrete_handler = True
-
-                        elif attribute.__name__ != "BasePromptHandler" and (
-                                hasattr(attribute, "get_config") and callable(getattr(attribute, "get_config")) and
-                                hasattr(attribute, "process_llm_response") and callable(getattr(attribute, "process_llm_response")) and
-                                hasattr(attribute, "handle_no_content") and callable(getattr(attribute, "handle_no_content")) and
-                                hasattr(attribute, "get_prompt_key") and callable(getattr(attribute, "get_prompt_key"))
-                        ):
-                            is_concrete_handler = True
-                            st.info(f"Handler '{attribute_name}' in module '{module_name}' loaded by duck-typing.")
-                    
-                    if is_concrete_handler:
-                        handler_class: Type[BasePromptHandler] = attribute
-                        try:
-                            if not (hasattr(handler_class, "get_config") and 
-                                    hasattr(handler_class, "get_prompt_key")):
-                                st.warning(f"Handler class '{attribute_name}' in module '{module_name}' is missing required static methods (get_config or get_prompt_key). Skipping.")
-                                continue
-
-                            config: Optional[Dict[str, Any]] = handler_class.get_config()
-                            prompt_key: Optional[str] = handler_class.get_prompt_key()
-
-                            if config is None:
-                                st.error(f"ERROR: Handler '{attribute_name}' in module '{module_name}' returned None from get_config(). Skipping this handler.")
-                                continue
-                            if prompt_key is None or not prompt_key.strip():
-                                st.error(f"ERROR: Handler '{attribute_name}' in module '{module_name}' returned None or empty string from get_prompt_key(). Skipping this handler.")
-                                continue
-
-                            handler_target_config: Union[str, List[str], None] = config.get("target_page_id")
-                            
-                            is_for_this_page = False
-                            if handler_target_config is not None:
-                                if isinstance(handler_target_config, str):
-                                    if handler_target_config.lower() == current_page_identifier.lower() or \
-                                       handler_target_config.lower() == "all":
-                                        is_for_this_page = True
-                                elif isinstance(handler_target_config, list):
-                                    normalized_target_ids = [str(tid).lower() for tid in handler_target_config]
-                                    if current_page_identifier.lower() in normalized_target_ids or \
-                                       "all" in normalized_target_ids:
-                                        is_for_this_page = True
-                            
-                            if not is_for_this_page:
-                                continue
-
-                            display_name = config.get("display_name")
-                            file_base = config.get("file_base")
-
-                            if not display_name or not file_base:
-                                st.warning(f"Handler '{attribute_name}' in module '{module_name}' has incomplete configuration (display_name or file_base missing). Configuration: {config}. Prompt key: {prompt_key}. Skipping.")
-                                continue
-
-                            full_path = os.path.join(PROMPTS_FOLDER, file_base + ".txt")
-                            if os.path.exists(full_path):
-                                AVAILABLE_PROMPT_HANDLERS[prompt_key] = handler_class
-                                PROMPT_CONFIG_MAP[display_name] = config
-                                ACTUAL_PROMPT_FILES[display_name] = full_path
-                                # st.info(f"Successfully loaded handler for this page: '{display_name}' (key: '{prompt_key}')") # Optional info
-                            else:
-                                st.warning(f"Prompt file '{file_base}.txt' for handler '{display_name}' (key: {prompt_key}) not found in '{PROMPTS_FOLDER}'.")
-                        
-                        except Exception as e_handler_init:
-                            handler_display_name_for_error = config.get('display_name', attribute_name) if 'config' in locals() and config else attribute_name
-                            st.error(f"Error initializing/configuring handler '{handler_display_name_for_error}' from module '{module_name}': {type(e_handler_init).__name__} - {e_handler_init}")
-                            break 
-            
-            except ImportError as e_mod:
-                st.error(f"Error importing handler module '{module_name}': {e_mod}")
-            except Exception as e_mod_general:
-                st.error(f"General module processing error for '{module_name}': {e_mod_general}")
-
-    except ImportError as e_pkg:
-        st.error(f"Could not import prompt handlers package: '{PROMPT_HANDLERS_PACKAGE_NAME}'. Error: {e_pkg}")
-        st.error(f"Make sure the '{PROMPT_HANDLERS_PACKAGE_NAME}' directory exists and contains the file '__init__.py'.")
-    except Exception as e_load_general:
-        st.error(f"An unexpected error occurred while loading prompt handlers: {e_load_general}")
-    print(f"DEBUG: Load complete for page '{current_page_identifier}'. Available prompt keys: {list(AVAILABLE_PROMPT_HANDLERS.keys())}")
-
-load_prompt_handlers_and_configs(CURRENT_PAGE_ID)
-
-available_prompts_display = sorted(list(PROMPT_CONFIG_MAP.keys()))
+available_prompts_display = handler_registry.display_names()
 
 if not available_prompts_display:
     st.error(
@@ -157,16 +67,7 @@ if selected_prompt_display_name and available_prompts_display:
     current_prompt_config = PROMPT_CONFIG_MAP.get(selected_prompt_display_name, {})
     selected_prompt_full_path = ACTUAL_PROMPT_FILES.get(selected_prompt_display_name)
     
-    for key, handler_cls_ref in AVAILABLE_PROMPT_HANDLERS.items():
-        try:
-            config_from_handler = handler_cls_ref.get_config()
-            if config_from_handler: 
-                handler_display_name = config_from_handler.get("display_name")
-                if handler_display_name == selected_prompt_display_name:
-                    selected_prompt_key = key
-                    break
-        except Exception as e_get_conf_sidebar:
-            st.warning(f"Cannot get configuration for handler (key: {key}) when matching sidebar display name: {e_get_conf_sidebar}")
+    selected_prompt_key = handler_registry.key_for_display_name(selected_prompt_display_name)
 
 st.sidebar.info(f"Currently selected prompt key: `{selected_prompt_key}`" if selected_prompt_key else "No prompt selected/loaded.")
 
@@ -180,9 +81,21 @@ worksheet_name_input = st.sidebar.text_input("File Name:", value="Arkusz3")
 st.sidebar.header("↔️ Rows' range")
 start_row_input = st.sidebar.number_input("Start row:", min_value=1, max_value=1000000, value=2, step=1)
 end_row_input = st.sidebar.number_input("End row:", min_value=1, max_value=1000000, value=5, step=1)
+resume_job_input = st.sidebar.checkbox(
+    "Resume job", value=False,
+    help="Skips rows that an earlier run of the same job (sheet, columns and prompt) already wrote, and re-processes only pending or failed rows."
+)
+incremental_mode_label = st.sidebar.selectbox(
+    "Rows to process:", options=list(INCREMENTAL_MODE_LABELS), index=0,
+    help="Reads the output columns first: rows that already have a result are left alone, so new rows can be added to a large sheet without reprocessing it. Rows whose outputs start with an error marker (e.g. 'Error: No website content retrieved') count as rows with errors."
+)
 
 st.sidebar.header("⬇️ Input column")
 company_input_column_input = st.sidebar.text_input("Column with domains:", value="A", max_chars=3)
+dedupe_domains_input = st.sidebar.checkbox(
+    "Process each domain once", value=True,
+    help="Rows naming the same domain (with or without www., http or https, any page of the site) are scraped and classified once; the result is written to every one of them."
+)
 
 st.sidebar.header("⬆️ Output columns")
 output_col_1_val = ""
@@ -210,6 +123,59 @@ if num_outputs_for_ui >= 3:
         max_chars=3
     )
 
+st.sidebar.header("⚡ Performance")
+max_workers_input = st.sidebar.number_input(
+    "Concurrent workers:", min_value=1, max_value=32, value=1, step=1,
+    help="Number of rows fetched and classified at the same time. 1 processes rows one by one."
+)
+openai_rpm_input = st.sidebar.number_input(
+    "OpenAI requests per minute:", min_value=1, max_value=10000, value=DEFAULT_OPENAI_REQUESTS_PER_MINUTE, step=10,
+    help="Upper limit; the rate drops automatically after 429 responses and recovers as requests succeed."
+)
+openai_tpm_input = st.sidebar.number_input("OpenAI tokens per minute:", min_value=1000, max_value=100000000, value=DEFAULT_OPENAI_TOKENS_PER_MINUTE, step=10000)
+sheets_wpm_input = st.sidebar.number_input("Google Sheets writes per minute:", min_value=1, max_value=300, value=60, step=1)
+use_openai_batch_input = st.sidebar.checkbox(
+    "Classify with the OpenAI Batch API", value=False,
+    help="Scrapes every page first, then sends all classifications as one batch job: about half the cost and not subject to the per-minute limits above, but results can take up to 24 h."
+)
+selenium_pool_size_input = st.sidebar.number_input(
+    "Selenium browsers:", min_value=0, max_value=8, value=2, step=1,
+    help="Headless Chrome instances kept open for pages that need JavaScript rendering. 0 disables the Selenium fallback."
+)
+http_pool_size_input = st.sidebar.number_input(
+    "HTTP connection pool size:", min_value=1, max_value=200, value=DEFAULT_HTTP_POOL_SIZE, step=1,
+    help="Keep-alive connections shared by all workers for plain page downloads."
+)
+use_http2_input = st.sidebar.checkbox(
+    "Use HTTP/2 for page downloads", value=False,
+    help="Multiplexes requests to the same host over one connection. Needs the optional 'h2' package; falls back to HTTP/1.1 without it."
+)
+max_download_kib_input = st.sidebar.number_input(
+    "Max download per page (KiB):", min_value=64, max_value=64 * 1024, value=DEFAULT_MAX_DOWNLOAD_BYTES // 1024, step=256,
+    help="Page downloads stop after this many bytes, or earlier once enough text has been collected for the LLM."
+)
+content_token_budget_input = st.sidebar.number_input(
+    "Page text budget (tokens):", min_value=0, max_value=100000,
+    value=int(current_prompt_config.get("content_token_budget", DEFAULT_CONTENT_TOKEN_BUDGET)), step=250,
+    help="Tokens of page text sent to the LLM per row. The title, meta description and sections such as 'About' and 'Products' are kept first. 0 sends the raw text up to the character limit."
+)
+html_parser_backend_input = st.sidebar.selectbox(
+    "HTML parser:", options=list(HTML_PARSER_BACKENDS), index=0,
+    help="lxml is considerably faster but needs the optional 'lxml' package; html.parser is used without it."
+)
+use_scrape_cache_input = st.sidebar.checkbox(
+    "Reuse cached website content", value=True,
+    help="Pages fetched in earlier runs are read from the local cache instead of being downloaded again."
+)
+scrape_cache_ttl_input = st.sidebar.number_input(
+    "Cache lifetime (hours):", min_value=1, max_value=24 * 365, value=int(DEFAULT_SCRAPE_CACHE_TTL_HOURS), step=1,
+    disabled=not use_scrape_cache_input
+)
+use_llm_cache_input = st.sidebar.checkbox(
+    "Reuse cached LLM responses", value=True,
+    help="Rows whose prompt and input did not change since an earlier run reuse the stored answer instead of calling OpenAI."
+)
+
 log_placeholder = st.empty()
 log_messages: List[str] = []
 
@@ -339,33 +305,41 @@ if st.button("Start Analysis", disabled=run_button_disabled, key="run_analysis_b
     if valid_input and selected_prompt_key and selected_prompt_full_path:
         ui_log_callback("✅ Validation completed successfully. Starting processing...\n")
         
-        with st.spinner("Processing... This may take a while..."):
-            try:
-                run_core_logic(
-                    prompt_full_path=selected_prompt_full_path,
-                    prompt_handler_key=selected_prompt_key,
-                    available_handlers=AVAILABLE_PROMPT_HANDLERS,
-                    num_expected_outputs=num_outputs_for_ui,
-                    gsheet_name=gsheet_name_input,
-                    worksheet_name=worksheet_name_input,
-                    start_row=start_row_input,
-                    end_row=end_row_input,
-                    company_input_column=company_input_column_input.upper(),
-                    first_output_column=temp_output_cols_to_pass[0],
-                    second_output_column=temp_output_cols_to_pass[1],
-                    third_output_column=temp_output_cols_to_pass[2],
-                    log_callback=ui_log_callback
-                )
-                ui_log_callback("\n--- ✅ PPROCESSING COMPLETED Successfully ---")
-                st.success("Processing completed successfully!")
-            except ValueError as ve:
-                ui_log_callback(f"\n--- ❌ ERROR CONFIGURATION OR VALUES ---")
-                ui_log_callback(f"ERROR: {str(ve)}")
-                st.error(f"Configuration or value ERROR occurred: {ve}")
-            except Exception as e:
-                ui_log_callback(f"\n--- ❌ FATAL ERROR DURING PROCESSING ---")
-                ui_log_callback(f"Error details: {type(e).__name__} - {str(e)}")
-                st.error(f"An unexpected ERROR occurred while processing: {type(e).__name__} - {e}")
+        job_id = get_job_manager().submit(
+            lazy_run_fn(PROCESSOR_MODULE),
+            description=f"{selected_prompt_display_name}: '{gsheet_name_input}' / '{worksheet_name_input}', rows {start_row_input}-{end_row_input}",
+            prompt_full_path=selected_prompt_full_path,
+            prompt_handler_key=selected_prompt_key,
+            available_handlers=AVAILABLE_PROMPT_HANDLERS,
+            num_expected_outputs=num_outputs_for_ui,
+            gsheet_name=gsheet_name_input,
+            worksheet_name=worksheet_name_input,
+            start_row=start_row_input,
+            end_row=end_row_input,
+            company_input_column=company_input_column_input.upper(),
+            first_output_column=temp_output_cols_to_pass[0],
+            second_output_column=temp_output_cols_to_pass[1],
+            third_output_column=temp_output_cols_to_pass[2],
+            max_workers=int(max_workers_input),
+            dedupe_domains=dedupe_domains_input,
+            openai_requests_per_minute=int(openai_rpm_input),
+            openai_tokens_per_minute=int(openai_tpm_input),
+            sheets_writes_per_minute=int(sheets_wpm_input),
+            use_openai_batch=use_openai_batch_input,
+            scrape_cache_path=DEFAULT_SCRAPE_CACHE_PATH if use_scrape_cache_input else None,
+            scrape_cache_ttl_hours=float(scrape_cache_ttl_input),
+            use_llm_cache=use_llm_cache_input,
+            selenium_pool_size=int(selenium_pool_size_input),
+            http_pool_size=int(http_pool_size_input),
+            use_http2=use_http2_input,
+            max_download_bytes=int(max_download_kib_input) * 1024,
+            content_token_budget=int(content_token_budget_input),
+            html_parser_backend=html_parser_backend_input,
+            resume=resume_job_input,
+            incremental_mode=INCREMENTAL_MODE_LABELS[incremental_mode_label]
+        )
+        st.session_state.setdefault("analysis_job_ids", []).append(job_id)
+        ui_log_callback(f"📥 Job {job_id} submitted. Its progress and log are shown below; the page stays usable meanwhile.")
     elif valid_input and (not selected_prompt_key or not selected_prompt_full_path):
         ui_log_callback("Internal ERROR: Validation passed but key or prompt path is missing. Aborting.")
         st.error("Internal configuration ERROR. Check the logs or contact support :>.")
@@ -375,6 +349,64 @@ if st.button("Start Analysis", disabled=run_button_disabled, key="run_analysis_b
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+
+def render_run_metrics(job_id: str, run_summary: Dict[str, Any]):
+    """Shows a finished run's per-stage timings, token counts, prompt cache hits and cost, with JSON/CSV downloads."""
+    metrics = run_summary["metrics"]
+    row_metrics = run_summary.get("row_metrics", [])
+    rate_col, tokens_col, calls_col, cache_col, cost_col = st.columns(5)
+    rate_col.metric("Rows/min", f"{metrics['rows_per_minute']:.1f}")
+    tokens_col.metric("Total tokens", f"{metrics['tokens']['total_tokens']:,}")
+    calls_col.metric("LLM calls", metrics["tokens"]["llm_calls"])
+    cache_col.metric("Prompt cache hits", f"{metrics['prompt_cache']['hit_ratio']:.0%}")
+    cost_col.metric("Cost per row", f"${metrics['cost']['per_row_usd']:.5f}" if metrics.get("cost") else "n/a")
+    if run_summary.get("rows_deduplicated"):
+        st.caption(
+            f"{run_summary['rows_deduplicated']} duplicate-domain row(s) reused an earlier result: "
+            f"{run_summary['fetches_saved']} page fetch(es) and {run_summary['llm_calls_saved']} LLM call(s) saved."
+        )
+    if metrics["stages"]:
+        st.table([
+            {"Stage": stage_name, "Rows": stats["rows"], "p50 (s)": stats["p50_seconds"], "p95 (s)": stats["p95_seconds"], "Max (s)": stats["max_seconds"], "Total (s)": stats["total_seconds"]}
+            for stage_name, stats in metrics["stages"].items()
+        ])
+    json_col, csv_col = st.columns(2)
+    json_col.download_button("Download metrics (JSON)", metrics_to_json(metrics, row_metrics), file_name=f"metrics_{job_id}.json", mime="application/json", key=f"metrics_json_{job_id}")
+    csv_col.download_button("Download per-row metrics (CSV)", row_metrics_to_csv(row_metrics), file_name=f"metrics_{job_id}.csv", mime="text/csv", key=f"metrics_csv_{job_id}")
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_SECONDS)
+def render_analysis_jobs():
+    """Polls the background jobs started from this session and shows their status, progress and log."""
+    job_manager = get_job_manager()
+    session_jobs = [job for job in (job_manager.get(job_id) for job_id in st.session_state.get("analysis_job_ids", [])) if job]
+    if not session_jobs:
+        return
+    st.subheader("📋 Jobs")
+    st.caption(f"{job_manager.active_job_count()} job(s) queued or running in this app; up to {job_manager.max_concurrent_jobs} run at a time.")
+    for job in reversed(session_jobs):
+        with st.container(border=True):
+            info_col, action_col = st.columns([5, 1])
+            info_col.markdown(f"**{job.description}**  \nJob `{job.job_id}` · status: `{job.status}` · {job.elapsed_seconds:.0f} s")
+            if not job.is_finished and action_col.button("Cancel", key=f"cancel_job_{job.job_id}"):
+                job_manager.cancel(job.job_id)
+            if job.rows_total:
+                st.progress(min(1.0, job.rows_completed / job.rows_total), text=f"{job.rows_completed}/{job.rows_total} rows")
+            if job.status == JOB_STATUS_SUCCEEDED:
+                st.success("Processing completed successfully!")
+            elif job.status == JOB_STATUS_FAILED:
+                st.error(f"An unexpected ERROR occurred while processing: {job.error}")
+            elif job.status == JOB_STATUS_CANCELLED:
+                st.warning("Job cancelled. Rows completed before the cancellation were written.")
+            if isinstance(job.result, dict) and job.result.get("metrics"):
+                with st.expander("⏱️ Run metrics"):
+                    render_run_metrics(job.job_id, job.result)
+            with st.expander("Log", expanded=not job.is_finished):
+                st.code("\n".join(job.log_lines()[-200:]), language=None)
+
+
+render_analysis_jobs()
+
 CLASSIFICATION = os.getenv("CLASSIFICATION_LINK")
 st.sidebar.markdown("---")
 st.sidebar.markdown(
@@ -1,3 +1,4 @@
+import json
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Tuple, Callable
 
@@ -12,6 +13,14 @@ class BasePromptHandler(ABC):
         """
         Returns the configuration for this type of prompt.
         Should contain keys like: 'display_name', 'file_base', 'num_outputs', 'output_labels'.
+        Handlers for scraped pages may set 'content_token_budget': how many tokens of page text
+        the LLM gets per row. 'error_markers' may list further output prefixes that mark a failed
+        row (outputs starting with "Error", "LLM Error", ... always do); incremental runs process
+        such rows again.
+        A handler that expects a JSON object may set 'response_schema': a strict JSON schema
+        (every property listed in 'required', 'additionalProperties': False). The processors then
+        request schema-constrained structured output and pass the parsed object to
+        process_parsed_response.
         """
         pass
 
@@ -30,6 +39,20 @@ class BasePromptHandler(ABC):
         """
         pass
 
+    @classmethod
+    def process_parsed_response(
+        cls,
+        parsed_response: Dict[str, Any],
+        num_expected_outputs: int,
+        log_callback: Callable[[str], None]
+    ) -> Tuple[str, ...]:
+        """
+        Processes the JSON object of a structured-output response (see 'response_schema').
+        Returns the same tuple as process_llm_response. By default the object is serialised
+        and handed to process_llm_response; handlers with a schema override this.
+        """
+        return cls.process_llm_response(json.dumps(parsed_response, ensure_ascii=False), num_expected_outputs, log_callback)
+
     @staticmethod
     @abstractmethod
     def handle_no_content(
@@ -28,9 +28,46 @@ class DescriptionKeywordHandler(BasePromptHandler):
             "file_base": DescriptionKeywordHandler.PROMPT_KEY,
             "num_outputs": 2,
             "output_labels": ["Column: Description", "Column: Keywords"],
-            "target_page_id": "scrap_llm_interface"
+            "target_page_id": "scrap_llm_interface",
+            "content_token_budget": 3000,
+            "response_schema": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "keywords": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["description", "keywords"],
+                "additionalProperties": False
+            }
         }
 
+    @staticmethod
+    def process_parsed_response(
+        llm_data: Dict[str, Any],
+        num_expected_outputs: int,
+        log_callback: Callable[[str], None]
+    ) -> Tuple[str, ...]:
+        """
+        Maps the LLM's JSON object ('description' and 'keywords') to the output columns.
+        Called directly with structured output, or by process_llm_response once it has
+        extracted the JSON from a free-text response.
+        """
+        parsed_description = str(llm_data.get("description", "Error")).strip()
+        parsed_keywords = str(llm_data.get("keywords", "LLM JSON response missing 'explanation' field.")).strip()
+
+        if isinstance(llm_data.get("keywords"), list):
+            parsed_keywords = ", ".join(str(item) for item in llm_data.get("keywords", []))
+        else:
+            parsed_keywords = parsed_keywords.replace('[', '')
+            parsed_keywords = parsed_keywords.replace(']', '')
+            parsed_keywords = parsed_keywords.replace("'", "")
+
+        log_callback(f"Handler '{DescriptionKeywordHandler.PROMPT_KEY}': Parsed LLM data - Description: {parsed_description[:50]}, Keywords: {parsed_keywords[:10]}...")
+
+        outputs_list = [parsed_description, parsed_keywords]
+        final_outputs = (outputs_list + [""] * num_expected_outputs)[:num_expected_outputs]
+        return tuple(final_outputs)
+
     @staticmethod
     def process_llm_response(
         llm_response_str: str,
@@ -64,18 +101,7 @@ class DescriptionKeywordHandler(BasePromptHandler):
             if extracted_json_str:
                 try:
                     llm_data: Dict[str, Any] = json.loads(extracted_json_str)
-                    
-                    parsed_description = str(llm_data.get("description", "Error")).strip()
-                    parsed_keywords = str(llm_data.get("keywords", "LLM JSON response missing 'explanation' field.")).strip()
-                    
-                    if isinstance(llm_data.get("keywords"), list):
-                        parsed_keywords = ", ".join(str(item) for item in llm_data.get("keywords", []))
-                    else:
-                        parsed_keywords = parsed_keywords.replace('[', '')
-                        parsed_keywords = parsed_keywords.replace(']', '')
-                        parsed_keywords = parsed_keywords.replace("'", "")
-
-                    log_callback(f"Handler '{DescriptionKeywordHandler.PROMPT_KEY}': Parsed LLM data - Description: {parsed_description[:50]}, Keywords: {parsed_keywords[:10]}...")
+                    return DescriptionKeywordHandler.process_parsed_response(llm_data, num_expected_outputs, log_callback)
 
                 except json.JSONDecodeError:
                     log_callback(f"CRITICAL ERROR: Handler '{DescriptionKeywordHandler.PROMPT_KEY}' - LLM output was not valid JSON. Attempted to parse: '{extracted_json_str[:200]}...'. Raw LLM response: '{llm_response_str[:200]}...'")
@@ -28,9 +28,48 @@ class ExhibitorFitHandler(BasePromptHandler):
             "file_base": ExhibitorFitHandler.PROMPT_KEY,
             "num_outputs": 2,
             "output_labels": ["Column: Exhibitor fit", "Column: Reason"],
-            "target_page_id": "scrap_llm_interface"
+            "target_page_id": "scrap_llm_interface",
+            "content_token_budget": 2500,
+            "response_schema": {
+                "type": "object",
+                "properties": {
+                    "fit_for_expo": {"type": "string", "enum": ["Yes", "Maybe", "No"]},
+                    "explanation": {"type": "string"}
+                },
+                "required": ["fit_for_expo", "explanation"],
+                "additionalProperties": False
+            }
         }
 
+    @staticmethod
+    def process_parsed_response(
+        llm_data: Dict[str, Any],
+        num_expected_outputs: int,
+        log_callback: Callable[[str], None]
+    ) -> Tuple[str, ...]:
+        """
+        Maps the LLM's JSON object ('fit_for_expo' and 'explanation') to the output columns.
+        Called directly with structured output, or by process_llm_response once it has
+        extracted the JSON from a free-text response.
+        """
+        parsed_fit = str(llm_data.get("fit_for_expo", "Error")).strip()
+        parsed_explanation = str(llm_data.get("explanation", "LLM JSON response missing 'explanation' field.")).strip()
+
+        if parsed_fit.lower() in ["yes", "no", "maybe"]:
+            parsed_fit = parsed_fit.capitalize()
+        elif parsed_fit.lower() == "error" and "fit_for_expo" not in llm_data:
+            parsed_explanation = f"LLM JSON response missing 'fit_for_expo' field. Explanation: {parsed_explanation}"
+        else:
+            original_fit_value = parsed_fit
+            log_callback(f"Warning: Handler '{ExhibitorFitHandler.PROMPT_KEY}' - Invalid value for 'fit_for_expo': '{original_fit_value}'. LLM Explanation: '{parsed_explanation}'")
+            parsed_explanation = f"Invalid 'fit_for_expo' value received: '{original_fit_value}'. LLM Explanation: {parsed_explanation}"
+            parsed_fit = "Error"
+        log_callback(f"Handler '{ExhibitorFitHandler.PROMPT_KEY}': Parsed LLM data - Fit: {parsed_fit}, Explanation: {parsed_explanation[:100]}...")
+
+        outputs_list = [parsed_fit, parsed_explanation]
+        final_outputs = (outputs_list + [""] * num_expected_outputs)[:num_expected_outputs]
+        return tuple(final_outputs)
+
     @staticmethod
     def process_llm_response(
         llm_response_str: str,
@@ -64,20 +103,7 @@ class ExhibitorFitHandler(BasePromptHandler):
             if extracted_json_str:
                 try:
                     llm_data: Dict[str, Any] = json.loads(extracted_json_str)
-                    
-                    parsed_fit = str(llm_data.get("fit_for_expo", "Error")).strip()
-                    parsed_explanation = str(llm_data.get("explanation", "LLM JSON response missing 'explanation' field.")).strip()
-
-                    if parsed_fit.lower() in ["yes", "no", "maybe"]:
-                        parsed_fit = parsed_fit.capitalize()
-                    elif parsed_fit.lower() == "error" and "fit_for_expo" not in llm_data:
-                        parsed_explanation = f"LLM JSON response missing 'fit_for_expo' field. Explanation: {parsed_explanation}"
-                    else:
-                        original_fit_value = parsed_fit
-                        log_callback(f"Warning: Handler '{ExhibitorFitHandler.PROMPT_KEY}' - Invalid value for 'fit_for_expo': '{original_fit_value}'. LLM Explanation: '{parsed_explanation}'")
-                        parsed_explanation = f"Invalid 'fit_for_expo' value received: '{original_fit_value}'. LLM Explanation: {parsed_explanation}"
-                        parsed_fit = "Error"
-                    log_callback(f"Handler '{ExhibitorFitHandler.PROMPT_KEY}': Parsed LLM data - Fit: {parsed_fit}, Explanation: {parsed_explanation[:100]}...")
+                    return ExhibitorFitHandler.process_parsed_response(llm_data, num_expected_outputs, log_callback)
 
                 except json.JSONDecodeError:
                     log_callback(f"CRITICAL ERROR: Handler '{ExhibitorFitHandler.PROMPT_KEY}' - LLM output was not valid JSON. Attempted to parse: '{extracted_json_str[:200]}...'. Raw LLM response: '{llm_response_str[:200]}...'")
@@ -0,0 +1,276 @@
+"""
+Headless batch runner for the analysis processors, for cron/systemd jobs without Streamlit.
+
+Examples:
+    python run_batch.py --config jobs/exhibitors.toml
+    python run_batch.py --processor scrap_llm --prompt exhibitor_fit --sheet "Test PD" --worksheet Sheet1 \\
+        --start-row 2 --end-row 3000 --input-column A --output-columns B C --option max_workers=8 --resume
+
+A config file (JSON or TOML) may hold the same settings as the flags (processor, prompt, sheet,
+worksheet, start_row, end_row, input_column, output_columns, resume) plus an "options" table with
+any further keyword arguments of the processor's run_core_logic. Flags override the file.
+
+Exit status: 0 all rows succeeded, 1 finished but some rows failed or cells stayed unwritten,
+2 configuration error, 3 the run aborted with an error, 130 interrupted or cancelled.
+"""
+import argparse
+import importlib
+import inspect
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tomllib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from core_processors.handler_registry import discover_prompt_handlers, PROMPTS_FOLDER
+from core_processors.run_metrics import metrics_to_json, row_metrics_to_csv
+
+EXIT_OK = 0
+EXIT_ROWS_FAILED = 1
+EXIT_CONFIG_ERROR = 2
+EXIT_RUN_ERROR = 3
+EXIT_INTERRUPTED = 130
+
+# processor name -> (module with run_core_logic, page id used by the handlers' 'target_page_id')
+PROCESSORS = {
+    "scrap_llm": ("core_processors.core_processor_scrap_llm", "scrap_llm_interface"),
+    "llm_only": ("core_processors.core_processor_llm_only", "llm_interface"),
+}
+# Settings that map to flags rather than to run_core_logic options.
+JOB_SETTINGS = ("processor", "prompt", "sheet", "worksheet", "start_row", "end_row", "input_column", "output_columns", "resume")
+# run_core_logic arguments the runner fills in from the job settings.
+RESERVED_OPTIONS = (
+    "prompt_full_path", "prompt_handler_key", "available_handlers", "num_expected_outputs", "gsheet_name", "worksheet_name",
+    "start_row", "end_row", "company_input_column", "first_output_column", "second_output_column", "third_output_column",
+    "log_callback", "resume", "progress_callback"
+)
+
+
+class ConfigError(Exception):
+    pass
+
+
+def load_config_file(path: str) -> Dict[str, Any]:
+    try:
+        if path.lower().endswith(".toml"):
+            with open(path, "rb") as f:
+                return tomllib.load(f)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"Could not read config file '{path}': {e}") from e
+
+
+def parse_option(option: str) -> Tuple[str, Any]:
+    """Parses KEY=VALUE; VALUE is read as JSON when possible (numbers, booleans, null), else as a string."""
+    if "=" not in option:
+        raise ConfigError(f"Invalid --option '{option}'. Expected KEY=VALUE.")
+    key, raw_value = option.split("=", 1)
+    try:
+        return key.strip(), json.loads(raw_value)
+    except ValueError:
+        return key.strip(), raw_value
+
+
+def build_job(args: argparse.Namespace) -> Dict[str, Any]:
+    job: Dict[str, Any] = load_config_file(args.config) if args.config else {}
+    unknown_settings = set(job) - set(JOB_SETTINGS) - {"options"}
+    if unknown_settings:
+        raise ConfigError(f"Unknown setting(s) in config file: {sorted(unknown_settings)}. Put run_core_logic arguments under 'options'.")
+    options: Dict[str, Any] = dict(job.get("options") or {})
+    for setting in JOB_SETTINGS:
+        value = getattr(args, setting)
+        if value is not None:
+            job[setting] = value
+    for option in args.option or []:
+        key, value = parse_option(option)
+        options[key] = value
+    job["options"] = options
+
+    missing = [setting for setting in ("processor", "prompt", "sheet", "worksheet", "start_row", "end_row", "input_column", "output_columns") if job.get(setting) in (None, "", [])]
+    if missing:
+        raise ConfigError(f"Missing required setting(s): {', '.join(missing)}.")
+    if job["processor"] not in PROCESSORS:
+        raise ConfigError(f"Unknown processor '{job['processor']}'. Expected one of: {', '.join(PROCESSORS)}.")
+    if int(job["start_row"]) > int(job["end_row"]):
+        raise ConfigError(f"Start row ({job['start_row']}) cannot be larger than end row ({job['end_row']}).")
+    if isinstance(job["output_columns"], str):
+        job["output_columns"] = job["output_columns"].split()
+    return job
+
+
+def find_handler(prompt: str, page_id: str, log_callback: Callable[[str], None]):
+    """Looks a handler up by prompt key or display name. Returns (key, handler class, config, prompt path, all handlers)."""
+    handlers_by_key, configs_by_display_name, prompt_files_by_display_name = discover_prompt_handlers(page_id, PROMPTS_FOLDER, log_callback)
+    for prompt_key, handler_class in handlers_by_key.items():
+        display_name = handler_class.get_config().get("display_name")
+        if prompt in (prompt_key, display_name):
+            return prompt_key, handler_class, configs_by_display_name[display_name], prompt_files_by_display_name[display_name], handlers_by_key
+    available = ", ".join(sorted(handlers_by_key)) or "none"
+    raise ConfigError(f"Prompt '{prompt}' is not available for processor page '{page_id}'. Available: {available}.")
+
+
+class ProgressPrinter:
+    """Prints a progress line at most every `interval_seconds` seconds and when the last row completes."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.started_at = time.monotonic()
+        self._last_printed_at = 0.0
+
+    def __call__(self, rows_completed: int, rows_total: int) -> None:
+        now = time.monotonic()
+        if rows_completed < rows_total and now - self._last_printed_at < self.interval_seconds:
+            return
+        self._last_printed_at = now
+        elapsed_minutes = max(now - self.started_at, 1e-6) / 60
+        rows_per_minute = rows_completed / elapsed_minutes
+        percent = rows_completed / rows_total * 100 if rows_total else 100.0
+        eta = f", ETA {(rows_total - rows_completed) / rows_per_minute:.1f} min" if rows_per_minute and rows_completed < rows_total else ""
+        print(f"[progress] {rows_completed}/{rows_total} rows ({percent:.1f}%), {rows_per_minute:.1f} rows/min{eta}", flush=True)
+
+
+def write_metrics_file(path: str, metrics: Dict[str, Any], row_metrics: List[Dict[str, Any]]) -> None:
+    exported = row_metrics_to_csv(row_metrics) if path.lower().endswith(".csv") else metrics_to_json(metrics, row_metrics)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(exported)
+    print(f"⏱️ Metrics for {len(row_metrics)} row(s) written to {path}.", flush=True)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run an analysis job headlessly (no Streamlit).")
+    parser.add_argument("--config", help="JSON or TOML file with the job settings.")
+    parser.add_argument("--processor", choices=sorted(PROCESSORS), help="scrap_llm (scrape websites, then LLM) or llm_only.")
+    parser.add_argument("--prompt", help="Prompt key or display name (e.g. exhibitor_fit).")
+    parser.add_argument("--sheet", help="Google Sheet name.")
+    parser.add_argument("--worksheet", help="Worksheet name.")
+    parser.add_argument("--start-row", dest="start_row", type=int)
+    parser.add_argument("--end-row", dest="end_row", type=int)
+    parser.add_argument("--input-column", dest="input_column")
+    parser.add_argument("--output-columns", dest="output_columns", nargs="+", metavar="COL")
+    parser.add_argument("--resume", action="store_true", default=None, help="Skip rows an earlier run of this job already completed.")
+    parser.add_argument("--option", action="append", metavar="KEY=VALUE", help="Extra run_core_logic argument, e.g. max_workers=8. Repeatable.")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines (default: 10).")
+    parser.add_argument("--metrics-out", dest="metrics_out", metavar="PATH", help="Write per-row stage timings and token counts to PATH (.json or .csv).")
+    parser.add_argument("--quiet", action="store_true", help="Only print progress and the final summary, not every log line.")
+    parser.add_argument("--list-prompts", action="store_true", help="List the prompts available for each processor and exit.")
+    return parser
+
+
+def list_prompts() -> None:
+    for processor_name, (_, page_id) in PROCESSORS.items():
+        handlers_by_key, _, _ = discover_prompt_handlers(page_id, PROMPTS_FOLDER, print)
+        print(f"{processor_name}:")
+        for prompt_key, handler_class in sorted(handlers_by_key.items()):
+            config = handler_class.get_config()
+            print(f"  {prompt_key:<24} {config.get('display_name')} ({config.get('num_outputs')} output(s))")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    # Prompts, .env and the .cache folder are resolved relative to the project, like run_app.sh does.
+    if args.config:
+        args.config = os.path.abspath(args.config)
+    if args.metrics_out:
+        args.metrics_out = os.path.abspath(args.metrics_out)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv()
+    if args.list_prompts:
+        list_prompts()
+        return EXIT_OK
+
+    def log_callback(message: str) -> None:
+        if not args.quiet:
+            print(f"{time.strftime('%H:%M:%S')} {message.strip()}", flush=True)
+
+    try:
+        job = build_job(args)
+        module_name, page_id = PROCESSORS[job["processor"]]
+        prompt_key, handler_class, config, prompt_path, handlers_by_key = find_handler(str(job["prompt"]), page_id, print)
+        processor_module = importlib.import_module(module_name)
+        run_core_logic = processor_module.run_core_logic
+        accepted_options = set(inspect.signature(run_core_logic).parameters)
+        unknown_options = set(job["options"]) - accepted_options
+        if unknown_options:
+            raise ConfigError(f"Unknown option(s) for {job['processor']}: {sorted(unknown_options)}.")
+        reserved_options = set(job["options"]) & set(RESERVED_OPTIONS)
+        if reserved_options:
+            raise ConfigError(f"Option(s) {sorted(reserved_options)} are set by the runner itself; use the matching flags instead.")
+    except ConfigError as e:
+        print(f"❌ Configuration error: {e}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+
+    num_outputs = int(config.get("num_outputs", 1))
+    output_columns = [str(column).upper() for column in job["output_columns"]]
+    if len(output_columns) < num_outputs:
+        print(f"❌ Configuration error: prompt '{prompt_key}' needs {num_outputs} output column(s), got {len(output_columns)}.", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    output_columns = (output_columns + ["", "", ""])[:3]
+
+    # The first SIGINT/SIGTERM asks the processor to stop after the rows in flight (when it
+    # supports cancellation); a second one interrupts immediately.
+    cancel_event = threading.Event()
+    options = dict(job["options"])
+    if "cancel_event" in accepted_options:
+        options.setdefault("cancel_event", cancel_event)
+
+    def handle_stop_signal(signum, frame):
+        if cancel_event.is_set() or "cancel_event" not in accepted_options:
+            raise KeyboardInterrupt()
+        print(f"⏹️ Received signal {signum}. Stopping after the rows in flight (send again to abort).", flush=True)
+        cancel_event.set()
+
+    signal.signal(signal.SIGINT, handle_stop_signal)
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+
+    print(f"▶️ {job['processor']} / {prompt_key}: rows {job['start_row']}-{job['end_row']} of '{job['sheet']}' / '{job['worksheet']}'.", flush=True)
+    started_at = time.monotonic()
+    try:
+        run_summary = run_core_logic(
+            prompt_full_path=prompt_path,
+            prompt_handler_key=prompt_key,
+            available_handlers=handlers_by_key,
+            num_expected_outputs=num_outputs,
+            gsheet_name=job["sheet"],
+            worksheet_name=job["worksheet"],
+            start_row=int(job["start_row"]),
+            end_row=int(job["end_row"]),
+            company_input_column=str(job["input_column"]).upper(),
+            first_output_column=output_columns[0],
+            second_output_column=output_columns[1],
+            third_output_column=output_columns[2],
+            log_callback=log_callback,
+            resume=bool(job.get("resume", False)),
+            progress_callback=ProgressPrinter(args.progress_interval),
+            **options
+        ) or {}
+    except KeyboardInterrupt:
+        print("❌ Interrupted.", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ Configuration error: {e}", file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+    except Exception as e:
+        print(f"❌ Run failed: {type(e).__name__} - {e}", file=sys.stderr)
+        return EXIT_RUN_ERROR
+
+    run_summary["elapsed_seconds"] = round(time.monotonic() - started_at, 1)
+    run_summary["cancelled"] = cancel_event.is_set()
+    row_metrics = run_summary.pop("row_metrics", [])
+    print(f"📋 Summary: {json.dumps(run_summary)}", flush=True)
+    if args.metrics_out:
+        write_metrics_file(args.metrics_out, run_summary.get("metrics", {}), row_metrics)
+    if cancel_event.is_set():
+        return EXIT_INTERRUPTED
+    if run_summary.get("rows_failed") or run_summary.get("unwritten_cells"):
+        return EXIT_ROWS_FAILED
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
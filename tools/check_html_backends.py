@@ -0,0 +1,66 @@
+"""
+Consistency check for the two visible-text backends of core_processors.html_text.
+
+Extracts a set of small sample pages with the standard-library html.parser backend and with the
+optional lxml backend and reports every page whose text differs. The samples cover the markup
+where the two parsers behave differently: self-closing tags (<br/>, <img/>, <meta ... />),
+void tags without a slash, skipped elements, headings and character references.
+
+Examples:
+    python -m tools.check_html_backends
+    python -m tools.check_html_backends --verbose
+
+Exit status: 0 if both backends agree (or lxml is not installed), 1 otherwise.
+"""
+import argparse
+import sys
+from typing import List, Tuple
+
+from core_processors.html_text import extract_visible_text, lxml_available
+
+# (name, html, a fragment the extracted text must contain)
+SAMPLE_PAGES: Tuple[Tuple[str, str, str], ...] = (
+    ("self-closing br", "<p>foo<br/>bar</p>", "foo bar"),
+    ("void br", "<p>foo<br>bar</p>", "foo bar"),
+    ("self-closing img", '<p>foo<img src="logo.png"/>bar</p>', "foo bar"),
+    ("self-closing hr", "<div>foo<hr/>bar</div>", "foo bar"),
+    ("self-closing meta", '<html><head><title>Acme</title><meta name="description" content="Booths and stands"/></head><body><p>We build booths.</p></body></html>', "Description: Booths and stands"),
+    ("void meta", '<html><head><meta property="og:description" content="Stands"></head><body><p>Text</p></body></html>', "Description: Stands"),
+    ("headings", "<body><p>Intro</p><h2>About <br/>us</h2><p>We sell <b>stands</b>.</p></body>", "## About us"),
+    ("skipped elements", "<body><nav>Menu</nav><p>Content<br/>here</p><script>var x = 1;</script><footer>Legal</footer></body>", "Content here"),
+    ("character references", "<p>Fish &amp; Chips&nbsp;Ltd<br/>&#169; 2024</p>", "Fish & Chips"),
+)
+
+
+def compare_backends(verbose: bool = False) -> List[str]:
+    """Returns a description of every sample page whose text differs between the backends or misses its fragment."""
+    problems: List[str] = []
+    for name, html, expected_fragment in SAMPLE_PAGES:
+        texts = {backend: extract_visible_text(html, backend=backend) for backend in ("html.parser", "lxml")}
+        if verbose:
+            print(f"{name}: {texts}")
+        if texts["html.parser"] != texts["lxml"]:
+            problems.append(f"{name}: html.parser {texts['html.parser']!r} != lxml {texts['lxml']!r}")
+        for backend, text in texts.items():
+            if expected_fragment not in text:
+                problems.append(f"{name}: {backend} text {text!r} lacks {expected_fragment!r}")
+    return problems
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--verbose", action="store_true", help="Print the extracted text of every sample page.")
+    args = parser.parse_args(argv)
+
+    if not lxml_available():
+        print("lxml is not installed (`uv sync --extra lxml`); nothing to compare.")
+        return 0
+    problems = compare_backends(verbose=args.verbose)
+    for problem in problems:
+        print(problem)
+    print(f"{len(SAMPLE_PAGES) - len({problem.split(':')[0] for problem in problems})} of {len(SAMPLE_PAGES)} sample pages agree.")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))